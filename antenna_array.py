@@ -0,0 +1,102 @@
+"""Array-backed model of the antenna elements shown in the GUI.
+
+Every per-element property lives in one NumPy array, so resizing to thousands
+of elements, bulk-loading a scenario or snapshotting the array for the engine
+never loops over elements in Python.  Storage grows geometrically and keeps the
+values of elements beyond ``count``, so shrinking and growing the array again
+restores them, like the per-antenna spinboxes used to.
+"""
+import numpy as np
+
+import beam_engine
+
+MAX_ANTENNAS = 4096
+COLUMNS = ("x", "y", "frequency", "phase_deg", "amplitude")
+
+
+class AntennaArray:
+    def __init__(self, count=10, frequency=beam_engine.DEFAULT_FREQUENCY):
+        self.default_frequency = frequency
+        self.count = 0
+        self._data = {name: np.empty(0) for name in COLUMNS}
+        self.resize(count)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self._data["x"])
+
+    def column(self, name):
+        """Return a writable view of the active elements' ``name`` values."""
+        return self._data[name][: self.count]
+
+    @property
+    def x(self):
+        return self.column("x")
+
+    @property
+    def y(self):
+        return self.column("y")
+
+    @property
+    def frequency(self):
+        return self.column("frequency")
+
+    @property
+    def phase_deg(self):
+        return self.column("phase_deg")
+
+    @property
+    def amplitude(self):
+        return self.column("amplitude")
+
+    def resize(self, count):
+        if not 1 <= count <= MAX_ANTENNAS:
+            raise ValueError(f"Antenna count must be between 1 and {MAX_ANTENNAS}, got {count}")
+        if count > self.capacity:
+            old_capacity = self.capacity
+            new_capacity = min(MAX_ANTENNAS, max(count, 2 * old_capacity))
+            defaults = {
+                "x": 0.0,
+                "y": 0.0,
+                "frequency": self.default_frequency,
+                "phase_deg": 0.0,
+                "amplitude": 1.0,
+            }
+            for name in COLUMNS:
+                grown = np.full(new_capacity, defaults[name], dtype=float)
+                grown[:old_capacity] = self._data[name]
+                self._data[name] = grown
+        self.count = count
+
+    def get(self, row, name):
+        return float(self._data[name][row])
+
+    def set(self, row, name, value):
+        self._data[name][row] = value
+
+    def set_column(self, name, values, start=0):
+        """Bulk-assign ``values`` to ``name`` starting at element ``start``."""
+        values = np.asarray(values, dtype=float)
+        end = min(start + len(values), self.capacity)
+        self._data[name][start:end] = values[: end - start]
+
+    def set_positions(self, x_positions, y_positions):
+        self.set_column("x", x_positions)
+        self.set_column("y", y_positions)
+
+    def to_config(self, delay_deg, propagation_speed, grid, backend=None):
+        """Snapshot the active elements into an engine config (copies, safe to hand to a thread)."""
+        return beam_engine.ArrayConfig(
+            x_positions=self.x.copy(),
+            y_positions=self.y.copy(),
+            frequencies=self.frequency.copy(),
+            delay_deg=delay_deg,
+            propagation_speed=propagation_speed,
+            grid=grid,
+            phase_offsets=np.deg2rad(self.phase_deg),
+            amplitudes=self.amplitude.copy(),
+            backend=backend,
+        )
@@ -0,0 +1,102 @@
+"""Qt table model over an ``AntennaArray``.
+
+A ``QTableView`` only asks the model for the rows it is painting, so the cost
+of the per-antenna editor no longer grows with the number of elements.
+"""
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+from antenna_array import COLUMNS
+
+HEADERS = ("X (m)", "Y (m)", "Freq. (Hz)", "Phase (°)", "Amplitude")
+DISPLAY_FORMATS = ("{:.3f}", "{:.3f}", "{:.2f}", "{:.1f}", "{:.3f}")
+POSITION_COLUMNS = ("x", "y")
+
+
+class AntennaTableModel(QAbstractTableModel):
+    antenna_edited = pyqtSignal(int, str)  # row, column name
+
+    def __init__(self, antennas, parent=None):
+        super().__init__(parent)
+        self.antennas = antennas
+        self.positions_editable = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.antennas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.antennas.get(index.row(), COLUMNS[index.column()])
+        if role == Qt.DisplayRole:
+            return DISPLAY_FORMATS[index.column()].format(value)
+        if role == Qt.EditRole:
+            # As text, so the line-edit editor isn't limited to a spinbox's range and decimals
+            return format(value, ".12g")
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        name = COLUMNS[index.column()]
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        if name == "frequency" and value < 1:
+            return False
+        self.antennas.set(index.row(), name, value)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.antenna_edited.emit(index.row(), name)
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return str(section + 1)  # Antenna number
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if not index.isValid():
+            return flags
+        if COLUMNS[index.column()] in POSITION_COLUMNS and not self.positions_editable:
+            return flags
+        return flags | Qt.ItemIsEditable
+
+    def set_positions_editable(self, editable):
+        self.positions_editable = editable
+
+    def resize(self, count):
+        """Change the number of active antennas, notifying views of only the affected rows."""
+        old_count = len(self.antennas)
+        if count > old_count:
+            self.beginInsertRows(QModelIndex(), old_count, count - 1)
+            self.antennas.resize(count)
+            self.endInsertRows()
+        elif count < old_count:
+            self.beginRemoveRows(QModelIndex(), count, old_count - 1)
+            self.antennas.resize(count)
+            self.endRemoveRows()
+
+    def refresh_columns(self, *names):
+        """Tell views that whole columns changed after a bulk update of the array."""
+        if len(self.antennas) == 0:
+            return
+        for name in names:
+            column = COLUMNS.index(name)
+            self.dataChanged.emit(
+                self.index(0, column),
+                self.index(len(self.antennas) - 1, column),
+                [Qt.DisplayRole, Qt.EditRole],
+            )
+
+    def refresh_row(self, row):
+        self.dataChanged.emit(
+            self.index(row, 0), self.index(row, len(COLUMNS) - 1), [Qt.DisplayRole, Qt.EditRole]
+        )
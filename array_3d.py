@@ -0,0 +1,295 @@
+"""Planar and 3-D element layouts and their azimuth × elevation beam patterns.
+
+The simulator's own arrays lie in the x-y plane of the heatmap; here elements
+have an x, y and z coordinate.  Directions are given as azimuth in the x-y plane
+(90° is +y, the heatmap's broadside, as in the beam profile) and elevation above
+it, so the elevation-0 cut of ``pattern_3d`` is ``beam_engine.array_factor``.
+Like the beam profile, elements are weighted by their amplitudes only; the
+``f / f_max`` weighting of ``ArrayConfig.weights`` belongs to the heatmap field.
+
+``pattern_3d`` evaluates any layout on an (elevation, azimuth) grid.  Per chunk of
+directions, the projections of all elements onto all directions are one matrix
+product of the direction cosines with the positions.  Uniform rectangular
+lattices with a single frequency can use ``ura_pattern_fft`` instead, which gets
+the whole pattern in direction-cosine ("sine") space from one zero-padded 2-D FFT
+of the element excitations.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+import beam_engine
+
+NUM_AZIMUTHS = 361
+NUM_ELEVATIONS = 181
+FFT_OVERSAMPLE = 8  # FFT length per lattice dimension, in multiples of the element count
+AXES = "xyz"
+
+
+def direction_cosines(azimuth_angles, elevation_angles):
+    """Unit vectors (..., 3) of the directions of the (elevation, azimuth) grid, in radians."""
+    elevation = np.asarray(elevation_angles, dtype=float)[:, None]
+    azimuth = np.asarray(azimuth_angles, dtype=float)[None, :]
+    return np.stack(
+        np.broadcast_arrays(
+            np.cos(elevation) * np.cos(azimuth),
+            np.cos(elevation) * np.sin(azimuth),
+            np.sin(elevation),
+        ),
+        axis=-1,
+    )
+
+
+@dataclass
+class Array3D:
+    """Element positions (antennas, 3) in m with per-element frequencies, phases and amplitudes."""
+
+    positions: np.ndarray
+    frequencies: np.ndarray
+    phase_offsets: np.ndarray = None  # rad
+    amplitudes: np.ndarray = None
+    propagation_speed: float = beam_engine.DEFAULT_PROPAGATION_SPEED
+
+    def __post_init__(self):
+        self.positions = np.asarray(self.positions, dtype=float).reshape(-1, 3)
+        self.frequencies = np.broadcast_to(
+            np.asarray(self.frequencies, dtype=float), (len(self.positions),)
+        ).copy()
+        if self.phase_offsets is None:
+            self.phase_offsets = np.zeros(len(self.positions))
+        if self.amplitudes is None:
+            self.amplitudes = np.ones(len(self.positions))
+        self.phase_offsets = np.asarray(self.phase_offsets, dtype=float)
+        self.amplitudes = np.asarray(self.amplitudes, dtype=float)
+        if not len(self.phase_offsets) == len(self.amplitudes) == len(self.positions):
+            raise ValueError(
+                f"Expected {len(self.positions)} phase offsets and amplitudes, got "
+                f"{len(self.phase_offsets)} and {len(self.amplitudes)}"
+            )
+
+    @property
+    def num_antennas(self):
+        return len(self.positions)
+
+    @property
+    def wavenumbers(self):
+        return 2 * np.pi * self.frequencies / self.propagation_speed
+
+    @classmethod
+    def from_config(cls, config, z_positions=0.0):
+        """Lift a 2-D ``ArrayConfig`` (steering delay included in the phases) into 3-D."""
+        z_positions = np.broadcast_to(np.asarray(z_positions, dtype=float), (config.num_antennas,))
+        return cls(
+            np.column_stack([config.x_positions, config.y_positions, z_positions]),
+            config.frequencies,
+            config.phases,
+            config.amplitudes,
+            config.propagation_speed,
+        )
+
+    @classmethod
+    def rectangular(
+        cls,
+        columns,
+        rows,
+        spacing_m=None,
+        frequency=beam_engine.DEFAULT_FREQUENCY,
+        propagation_speed=beam_engine.DEFAULT_PROPAGATION_SPEED,
+        plane="xz",
+        amplitudes=None,
+    ):
+        """A ``columns`` × ``rows`` panel centred on the origin in ``plane``.
+
+        The default "xz" plane faces +y, the heatmap's broadside; the default spacing is
+        half a wavelength.
+        """
+        if columns < 1 or rows < 1:
+            raise ValueError(f"A panel needs at least 1 x 1 elements, got {columns} x {rows}")
+        if len(plane) != 2 or not set(plane) <= set(AXES) or plane[0] == plane[1]:
+            raise ValueError(f"plane must name two of the axes {AXES}, got {plane!r}")
+        spacing_m = spacing_m or propagation_speed / frequency / 2
+        spacing = np.broadcast_to(np.asarray(spacing_m, dtype=float), (2,))
+        u = (np.arange(columns) - (columns - 1) / 2) * spacing[0]
+        v = (np.arange(rows) - (rows - 1) / 2) * spacing[1]
+        u, v = np.meshgrid(u, v)  # Row-major: element r * columns + c
+        positions = np.zeros((columns * rows, 3))
+        positions[:, AXES.index(plane[0])] = u.ravel()
+        positions[:, AXES.index(plane[1])] = v.ravel()
+        if amplitudes is not None:
+            amplitudes = np.asarray(amplitudes, dtype=float).reshape(-1)
+        return cls(positions, frequency, amplitudes=amplitudes, propagation_speed=propagation_speed)
+
+    def steered(self, azimuth_deg=90.0, elevation_deg=0.0):
+        """A copy whose phases point the main lobe at the given direction."""
+        direction = direction_cosines([np.deg2rad(azimuth_deg)], [np.deg2rad(elevation_deg)])[0, 0]
+        phases = self.wavenumbers * (self.positions @ direction)
+        return Array3D(self.positions, self.frequencies, phases, self.amplitudes, self.propagation_speed)
+
+
+def pattern_3d(
+    array,
+    azimuth_angles=None,
+    elevation_angles=None,
+    block_bytes=beam_engine.BLOCK_BYTES,
+    dtype=np.float64,
+):
+    """Return azimuths, elevations and the complex pattern (elevations, azimuths).
+
+    ``sum_i w_i exp(j(-k_i p_i·d + phase_i))`` for every direction ``d``; the default
+    grid is 1° steps over azimuth [0°, 360°] and elevation [-90°, 90°].  Directions are
+    processed in chunks whose (directions × antennas) terms fit ``block_bytes``.
+    """
+    if azimuth_angles is None:
+        azimuth_angles = np.linspace(0, 2 * np.pi, NUM_AZIMUTHS)
+    if elevation_angles is None:
+        elevation_angles = np.linspace(-np.pi / 2, np.pi / 2, NUM_ELEVATIONS)
+    azimuth_angles = np.asarray(azimuth_angles, dtype=float)
+    elevation_angles = np.asarray(elevation_angles, dtype=float)
+    directions = direction_cosines(azimuth_angles, elevation_angles).reshape(-1, 3)
+
+    positions = array.positions.astype(dtype)
+    wavenumbers = array.wavenumbers.astype(dtype)
+    phases = array.phase_offsets.astype(dtype)
+    weights = array.amplitudes.astype(dtype)  # Like the beam profile, without frequency weights
+    real = np.empty(len(directions), dtype=dtype)
+    imag = np.empty(len(directions), dtype=dtype)
+    chunk = max(1, block_bytes // (2 * np.dtype(dtype).itemsize * max(array.num_antennas, 1)))
+    for d0 in range(0, len(directions), chunk):
+        # (directions, 3) @ (3, antennas): every projection p_i·d at once
+        phase_term = directions[d0 : d0 + chunk].astype(dtype) @ positions.T
+        phase_term *= -wavenumbers
+        phase_term += phases
+        # Real and imaginary parts as two real matrix-vector products
+        np.matmul(np.cos(phase_term), weights, out=real[d0 : d0 + chunk])
+        np.sin(phase_term, out=phase_term)
+        np.matmul(phase_term, weights, out=imag[d0 : d0 + chunk])
+    pattern = real + 1j * imag
+    return azimuth_angles, elevation_angles, pattern.reshape(len(elevation_angles), len(azimuth_angles))
+
+
+def uniform_lattice(positions, rtol=1e-9):
+    """Describe a uniform rectangular lattice, or return None if ``positions`` aren't one.
+
+    Returns ``(axes, origin, spacing, indices)``: the two lattice axes (e.g. "xz"),
+    the (3,) corner of the lattice, the two spacings and each element's (2,) lattice
+    index.  The lattice must lie in a coordinate plane and be fully populated; a line
+    is a lattice with a single row.
+    """
+    positions = np.asarray(positions, dtype=float)
+    if len(positions) == 0:
+        return None
+    tolerance = rtol * (np.ptp(positions, axis=0).sum() + 1)
+    spans = np.ptp(positions, axis=0)
+    free = [axis for axis in range(3) if spans[axis] > tolerance]
+    if len(free) == 3:
+        return None
+    flat = [axis for axis in range(3) if axis not in free]
+    axes = sorted(free + flat[: 2 - len(free)])
+    origin = positions.min(axis=0)
+    spacing, indices = [], []
+    for axis in axes:
+        offsets = positions[:, axis] - origin[axis]
+        gaps = np.diff(np.unique(offsets))
+        gaps = gaps[gaps > tolerance]
+        step = gaps.min() if len(gaps) else 1.0  # Any spacing describes a single row
+        index = np.round(offsets / step)
+        if np.abs(index * step - offsets).max() > tolerance:
+            return None
+        spacing.append(step)
+        indices.append(index.astype(int))
+    indices = np.column_stack(indices)
+    shape = indices.max(axis=0) + 1
+    if np.prod(shape) != len(positions) or len(np.unique(indices, axis=0)) != len(positions):
+        return None  # Holes or duplicate elements
+    return "".join(AXES[axis] for axis in axes), origin, np.array(spacing), indices
+
+
+@dataclass
+class SineSpacePattern:
+    """Pattern of a planar lattice over direction cosines ``u``, ``v`` along its two axes."""
+
+    axes: str
+    u: np.ndarray
+    v: np.ndarray
+    Beam_Summation: np.ndarray  # (v, u)
+
+    @property
+    def visible(self):
+        """Mask of the samples that are real directions, ``u**2 + v**2 <= 1``."""
+        return self.u[None, :] ** 2 + self.v[:, None] ** 2 <= 1
+
+
+def ura_pattern_fft(array, oversample=FFT_OVERSAMPLE, visible_only=True):
+    """Pattern of a uniform rectangular lattice from one 2-D FFT.
+
+    With ``p_mn = origin + m du e_a + n dv e_b`` the pattern is a 2-D DFT of the
+    excitations ``w_mn exp(j phase_mn)``, sampled at ``u = λ f / du`` for the FFT
+    frequencies ``f``; it repeats with period ``λ / du``, so spacings above λ/2 are
+    tiled to cover ``|u| <= 1``.  The FFT is ``oversample`` times the lattice size per
+    axis, rounded up to a power of two.  Directions are taken in the hemisphere on the
+    positive side of the third axis (+y for an "xz" panel, the heatmap's broadside);
+    samples outside the visible region are NaN when ``visible_only``.  Raises
+    ValueError for other layouts or mixed frequencies.
+    """
+    lattice = uniform_lattice(array.positions)
+    if lattice is None:
+        raise ValueError("ura_pattern_fft needs elements on a uniform rectangular lattice")
+    if np.ptp(array.frequencies) > 0:
+        raise ValueError("ura_pattern_fft needs a single frequency for all elements")
+    axes, origin, spacing, indices = lattice
+    k = array.wavenumbers[0]
+    shape = indices.max(axis=0) + 1
+    excitations = np.zeros((shape[1], shape[0]), dtype=complex)  # (v, u)
+    excitations[indices[:, 1], indices[:, 0]] = array.amplitudes * np.exp(1j * array.phase_offsets)
+
+    sizes = [1 << int(np.ceil(np.log2(max(2, oversample * n)))) for n in shape]
+    spectrum = np.fft.fftshift(np.fft.fft2(excitations, s=(sizes[1], sizes[0])))
+    # exp(-j k m du u) = exp(-2πj m f / N)  =>  u = 2π f / (k du)
+    periods = 2 * np.pi / (k * spacing)
+    sine_axes = []
+    for size, period in zip(sizes, periods):
+        repeats = 2 * int(np.ceil((2 / period - 1) / 2)) + 1 if period < 2 else 1
+        base = np.fft.fftshift(np.fft.fftfreq(size)) * period
+        sine_axes.append(np.concatenate([base + r * period for r in range(-(repeats // 2), repeats // 2 + 1)]))
+    spectrum = np.tile(spectrum, (len(sine_axes[1]) // sizes[1], len(sine_axes[0]) // sizes[0]))
+    keep_u, keep_v = (np.abs(axis) <= 1 for axis in sine_axes)
+    u, v = sine_axes[0][keep_u], sine_axes[1][keep_v]
+    spectrum = spectrum[np.ix_(keep_v, keep_u)]
+
+    # The DFT puts element (0, 0) at the origin; restore the phase of its real position
+    a, b = (AXES.index(axis) for axis in axes)
+    (c,) = {0, 1, 2} - {a, b}
+    w = np.sqrt(np.clip(1 - u[None, :] ** 2 - v[:, None] ** 2, 0, None))
+    spectrum *= np.exp(-1j * k * (origin[a] * u[None, :] + origin[b] * v[:, None] + origin[c] * w))
+    pattern = SineSpacePattern(axes, u, v, spectrum)
+    if visible_only:
+        pattern.Beam_Summation[~pattern.visible] = np.nan
+    return pattern
+
+
+def save_pattern_map(azimuth_angles, elevation_angles, pattern, path, dynamic_range_db=40, dpi=200):
+    """Save an azimuth × elevation map of ``|pattern|`` in dB (0 dB at the peak)."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    magnitude = np.abs(pattern)
+    with np.errstate(divide="ignore"):
+        level_db = 20 * np.log10(magnitude / max(float(np.nanmax(magnitude)), np.finfo(float).tiny))
+    fig = Figure(figsize=(8, 4.5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    image = ax.imshow(
+        level_db,
+        extent=np.rad2deg(
+            [azimuth_angles[0], azimuth_angles[-1], elevation_angles[0], elevation_angles[-1]]
+        ),
+        origin="lower",
+        aspect="auto",
+        cmap="viridis",
+        vmin=-dynamic_range_db,
+        vmax=0,
+    )
+    fig.colorbar(image, ax=ax, label="Level (dB)")
+    ax.set_xlabel("Azimuth (°)")
+    ax.set_ylabel("Elevation (°)")
+    fig.savefig(path, dpi=dpi)
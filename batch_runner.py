@@ -0,0 +1,239 @@
+"""Evaluate scenario files headlessly and write their fields and beam profiles.
+
+Usage:
+    python batch_runner.py scenarios/ -o results --workers 8 --png
+    python batch_runner.py "scenarios/*_scenario.json" --grid-size 1000
+    python batch_runner.py scenarios/ --store results/store --float32
+    python batch_runner.py big_scenario.json -w 1 --threads 32 --grid-size 2000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+import glob
+import logging
+import os
+import sys
+
+import numpy as np
+
+import beam_engine
+from result_cache import ResultCache
+from result_store import METRICS_FILE, ResultStore
+from scenario_io import load_scenario
+
+
+def collect_scenario_files(inputs):
+    """Expand directories (all ``*.json`` inside) and glob patterns into a sorted file list."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, "*.json")))
+        elif glob.has_magic(item):
+            files.update(glob.glob(item))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            raise FileNotFoundError(f"No such scenario file or directory: {item}")
+    return sorted(files)
+
+
+def output_names(files):
+    """Map every scenario file to a unique name for its outputs.
+
+    That is the file name without extension, unless files from different directories
+    share it; those are named by their path below the common directory, with ``__``
+    for the separators (``a/x.json`` -> ``a__x``).
+    """
+    stems = [os.path.splitext(os.path.basename(file_path))[0] for file_path in files]
+    common = os.path.commonpath([os.path.abspath(file_path) for file_path in files]) if files else ""
+    names = {}
+    for file_path, stem in zip(files, stems):
+        if stems.count(stem) > 1:
+            relative = os.path.relpath(os.path.abspath(file_path), common)
+            stem = os.path.splitext(relative)[0].replace(os.sep, "__")
+        names[file_path] = stem
+    if len(set(names.values())) != len(names):
+        raise ValueError(f"Scenario files map to the same output names: {sorted(files)}")
+    return names
+
+
+def evaluate_scenario(file_path, grid_size, cache_dir=None, threads=1, name=None):
+    """Compute one scenario with ``threads`` compute threads; return its parameters and frame.
+
+    ``name`` labels the results, by default the scenario's file name.
+    """
+    scenario = load_scenario(file_path)
+    config = scenario.to_config(beam_engine.GridSpec(size=grid_size))
+    compute = partial(beam_engine.compute_frame, workers=threads)
+    if cache_dir is None:
+        frame = compute(config)
+    else:
+        # Only the disk tier is useful in a one-shot worker process
+        frame = ResultCache(max_bytes=0, disk_dir=cache_dir).get_or_compute(config, compute)
+    parameters = {
+        "scenario": name or scenario.name,
+        "num_antennas": scenario.num_antennas,
+        "distance_m": scenario.distance_m,
+        "delay_deg": scenario.delay_deg,
+        "array_geometry": scenario.array_geometry,
+        "curvature": scenario.curvature,
+        "frequencies": frame.config.frequencies,
+    }
+    return parameters, frame
+
+
+def run_scenario(
+    file_path,
+    output_dir,
+    grid_size,
+    save_arrays=True,
+    save_png=False,
+    cache_dir=None,
+    threads=1,
+    name=None,
+):
+    """Compute one scenario and write ``<name>.npz`` and/or PNGs; return the written paths."""
+    parameters, frame = evaluate_scenario(file_path, grid_size, cache_dir, threads, name)
+
+    written = []
+    base = os.path.join(output_dir, parameters["scenario"])
+    if save_arrays:
+        np.savez(
+            base + ".npz",
+            Waves_Sum=frame.Waves_Sum,
+            azimuth_angles=frame.azimuth_angles,
+            Beam_Summation=frame.Beam_Summation,
+            x_positions=frame.config.x_positions,
+            y_positions=frame.config.y_positions,
+            frequencies=frame.config.frequencies,
+        )
+        written.append(base + ".npz")
+    if save_png:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        from plot_renderer import save_beam_profile, save_heatmap
+
+        save_heatmap(frame, base + "_heatmap.png")
+        save_beam_profile(frame, base + "_profile.png")
+        written += [base + "_heatmap.png", base + "_profile.png"]
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="Scenario JSON files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="results", help="Directory for the results")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Compute threads per worker process (for few scenarios on large grids)",
+    )
+    parser.add_argument("--grid-size", type=int, default=beam_engine.GridSpec().size)
+    parser.add_argument("--png", action="store_true", help="Also write heatmap and profile PNGs")
+    parser.add_argument("--no-arrays", action="store_true", help="Don't write the .npz arrays")
+    parser.add_argument(
+        "--store", help="Stream all results into one chunked result store directory instead"
+    )
+    parser.add_argument(
+        "--float32", action="store_true", help="Store fields as float32 (with --store)"
+    )
+    parser.add_argument(
+        "--cache-dir", help="Reuse results of identical configurations cached in this directory"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    try:
+        files = collect_scenario_files(args.inputs)
+        names = output_names(files)
+    except (FileNotFoundError, ValueError) as e:
+        logging.error(e)
+        return 1
+    if not files:
+        logging.error("No scenario files found")
+        return 1
+    if args.store:
+        return run_into_store(files, names, args)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(
+                run_scenario,
+                file_path,
+                args.output_dir,
+                args.grid_size,
+                not args.no_arrays,
+                args.png,
+                args.cache_dir,
+                args.threads,
+                names[file_path],
+            ): file_path
+            for file_path in files
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                written = future.result()
+            except Exception:
+                failures += 1
+                logging.exception(f"Failed to evaluate {file_path}")
+                continue
+            logging.info(f"{file_path} -> {', '.join(written)}")
+
+    logging.info(f"Evaluated {len(files) - failures}/{len(files)} scenarios")
+    return 1 if failures else 0
+
+
+def run_into_store(files, names, args):
+    grid = beam_engine.GridSpec(size=args.grid_size)
+    store = ResultStore.create(
+        args.store,
+        field_shape=grid.shape,
+        num_angles=beam_engine.NUM_PROFILE_ANGLES,
+        dtype="float32" if args.float32 else "float64",
+    )
+    failures = 0
+    with store, ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [
+            executor.submit(
+                evaluate_scenario,
+                file_path,
+                args.grid_size,
+                args.cache_dir,
+                args.threads,
+                names[file_path],
+            )
+            for file_path in files
+        ]
+        # Appended in file order, not completion order, so entry numbers are the same every run
+        for file_path, future in zip(files, futures):
+            try:
+                parameters, frame = future.result()
+            except Exception:
+                failures += 1
+                logging.exception(f"Failed to evaluate {file_path}")
+                continue
+            number = store.append(parameters, frame.Waves_Sum, frame.Beam_Summation)
+            logging.info(f"{file_path} -> {args.store} entry {number}")
+
+        # Beam metrics of every entry, queryable without reading the fields again
+        metrics_path = os.path.join(args.store, METRICS_FILE)
+        store.metrics_table().save(metrics_path)
+        logging.info(f"Wrote beam metrics to {metrics_path}")
+
+    logging.info(f"Evaluated {len(files) - failures}/{len(files)} scenarios")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
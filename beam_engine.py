@@ -0,0 +1,958 @@
+"""Headless beamforming field computation.
+
+Everything in here works on plain NumPy arrays so it can be imported by batch
+jobs and servers without pulling in PyQt5 or matplotlib.  The GUI in
+``heatmap_window.py`` is a thin client of this module.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+import os
+
+import numpy as np
+
+import compute_backends
+from instrumentation import metrics
+
+DEFAULT_FREQUENCY = 100  # Hz
+DEFAULT_PROPAGATION_SPEED = 100  # m/s
+NUM_PROFILE_ANGLES = 360
+PREVIEW_GRID_SIZE = 100  # Grid used while the user is still dragging a control
+BLOCK_BYTES = 4 * 1024 * 1024  # Working-set size of one (antennas x rows x columns) block
+WORKERS_ENV = "BEAMFORMING_WORKERS"  # Overrides the number of compute threads
+
+
+@dataclass(frozen=True)
+class GridSpec:
+    """Sampling grid of the heatmap: ``size`` points along each axis."""
+
+    size: int = 500
+    x_extent: tuple = (-10.0, 10.0)
+    y_extent: tuple = (0.0, 20.0)
+
+    def __post_init__(self):
+        if self.size < 2:
+            raise ValueError(f"grid size must be at least 2, got {self.size}")
+        object.__setattr__(self, "x_extent", tuple(float(v) for v in self.x_extent))
+        object.__setattr__(self, "y_extent", tuple(float(v) for v in self.y_extent))
+
+    def with_size(self, size):
+        return replace(self, size=int(size))
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def axes(self):
+        with metrics.span("grid_build"):
+            return grid_axes(self)
+
+    def meshgrid(self):
+        return grid_mesh(self)
+
+    @property
+    def imshow_extent(self):
+        return [self.x_extent[0], self.x_extent[1], self.y_extent[0], self.y_extent[1]]
+
+
+@lru_cache(maxsize=8)
+def grid_axes(grid):
+    """Return the (read-only) x and y sample coordinates of ``grid``."""
+    x = np.linspace(grid.x_extent[0], grid.x_extent[1], grid.size)
+    y = np.linspace(grid.y_extent[0], grid.y_extent[1], grid.size)
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
+
+
+@lru_cache(maxsize=2)
+def grid_mesh(grid):
+    """Return the (read-only) X and Y coordinate matrices of ``grid``."""
+    X, Y = np.meshgrid(*grid_axes(grid))
+    X.flags.writeable = False
+    Y.flags.writeable = False
+    return X, Y
+
+
+@dataclass
+class ArrayConfig:
+    """Positions and per-element frequencies of an antenna array plus its steering delay."""
+
+    x_positions: np.ndarray
+    y_positions: np.ndarray
+    frequencies: np.ndarray
+    delay_deg: float = 0.0
+    propagation_speed: float = DEFAULT_PROPAGATION_SPEED
+    grid: GridSpec = field(default_factory=GridSpec)
+    phase_offsets: np.ndarray = None  # Per-element phase added to the steering delay (rad)
+    amplitudes: np.ndarray = None  # Per-element amplitude weights
+    backend: str = None  # compute_backends name; None means $BEAMFORMING_BACKEND or numpy
+
+    def __post_init__(self):
+        self.x_positions = np.asarray(self.x_positions, dtype=float)
+        self.y_positions = np.asarray(self.y_positions, dtype=float)
+        self.frequencies = np.asarray(self.frequencies, dtype=float)
+        if self.phase_offsets is None:
+            self.phase_offsets = np.zeros_like(self.frequencies)
+        if self.amplitudes is None:
+            self.amplitudes = np.ones_like(self.frequencies)
+        self.phase_offsets = np.asarray(self.phase_offsets, dtype=float)
+        self.amplitudes = np.asarray(self.amplitudes, dtype=float)
+        shapes = {
+            a.shape
+            for a in (
+                self.x_positions,
+                self.y_positions,
+                self.frequencies,
+                self.phase_offsets,
+                self.amplitudes,
+            )
+        }
+        if len(shapes) != 1:
+            raise ValueError(
+                "x_positions, y_positions, frequencies, phase_offsets and amplitudes must "
+                f"have the same length, got {self.x_positions.shape}, {self.y_positions.shape}, "
+                f"{self.frequencies.shape}, {self.phase_offsets.shape}, {self.amplitudes.shape}"
+            )
+
+    @property
+    def num_antennas(self):
+        return len(self.x_positions)
+
+    def with_grid(self, grid):
+        return replace(self, grid=grid)
+
+    @property
+    def reference_frequency(self):
+        return float(np.max(self.frequencies))
+
+    @property
+    def wavenumbers(self):
+        return 2 * np.pi * self.frequencies / self.propagation_speed  # k = 2π/λ per element
+
+    @property
+    def phases(self):
+        return -np.arange(self.num_antennas) * np.deg2rad(self.delay_deg) + self.phase_offsets
+
+    @property
+    def weights(self):
+        # Contribution of each element is scaled relative to the highest frequency
+        return self.amplitudes * self.frequencies / self.reference_frequency
+
+    @classmethod
+    def from_layout(
+        cls,
+        num_antennas,
+        distance_m,
+        frequencies,
+        delay_deg=0.0,
+        array_geometry="Linear",
+        curvature=0.0,
+        propagation_speed=DEFAULT_PROPAGATION_SPEED,
+        grid=None,
+    ):
+        """Build a config with the simulator's evenly spaced Linear/Curved layout."""
+        grid = grid or GridSpec()
+        frequencies = np.asarray(frequencies, dtype=float)[:num_antennas]
+        x_positions, y_positions = antenna_layout(
+            num_antennas,
+            distance_m,
+            np.max(frequencies),
+            array_geometry,
+            curvature,
+            propagation_speed,
+            grid.y_extent[1],
+        )
+        return cls(x_positions, y_positions, frequencies, delay_deg, propagation_speed, grid)
+
+
+def antenna_layout(
+    num_antennas,
+    distance_m,
+    frequency,
+    array_geometry="Linear",
+    curvature=0.0,
+    propagation_speed=DEFAULT_PROPAGATION_SPEED,
+    y_max=20.0,
+):
+    """Return x and y element positions for the Linear/Curved geometries."""
+    wavelength = propagation_speed / frequency  # λ = propagation speed / f
+    if distance_m != 0:
+        distance_lambda = (1 / distance_m) * wavelength  # Distance in wavelengths
+    else:
+        distance_lambda = 0
+
+    # Evenly spaced and centered around 0
+    x_positions = np.linspace(
+        -((num_antennas - 1) * distance_lambda) / 2,
+        ((num_antennas - 1) * distance_lambda) / 2,
+        num_antennas,
+    )
+    if array_geometry == "Curved":
+        # baseline Y-offset for all antennas + quadratic term which creates the parabolic curve
+        y_positions = 0.01 * y_max + curvature * x_positions**2
+    else:
+        y_positions = np.zeros_like(x_positions)
+    return x_positions, y_positions
+
+
+def superpose(
+    x_axis,
+    y_axis,
+    x_positions,
+    y_positions,
+    wavenumbers,
+    weights,
+    phases,
+    out=None,
+    block_bytes=BLOCK_BYTES,
+    work=None,
+    workers=1,
+    backend=None,
+):
+    """Sum ``weight * sin(k * R + phase)`` of all antennas on the grid spanned by the axes.
+
+    The squared distance is separable, ``(X - x)**2 + (Y - y)**2 = dx**2 + dy**2``, so each
+    block only needs two small outer terms broadcast together.  The grid is processed in
+    row blocks (and antenna chunks for very large arrays) whose working set fits in
+    ``block_bytes``; every transcendental is evaluated in place in ``work`` and the
+    weighted sum over antennas is a single matrix-vector product per block.
+
+    With ``workers > 1`` the row blocks are spread over that many threads, each writing
+    its rows of ``out`` in place.  The blocks and the arithmetic inside them are the same
+    as in the serial path, so the result is bit-identical for any number of workers.
+
+    ``backend`` (a ``compute_backends`` name or instance) evaluates the element waves of
+    each block; ``out`` is float64 whatever the backend's precision.
+    """
+    if not isinstance(backend, compute_backends.Backend):
+        backend = compute_backends.get_backend(backend)
+    dtype = backend.dtype
+    x_axis = np.asarray(x_axis, dtype=float)
+    y_axis = np.asarray(y_axis, dtype=float)
+    ny, nx = len(y_axis), len(x_axis)
+    if out is None:
+        out = np.empty((ny, nx))
+    out[...] = 0
+    num_antennas = len(x_positions)
+    if num_antennas == 0:
+        return out
+
+    rows, chunk = block_shape(num_antennas, ny, nx, block_bytes)
+    blocks = [(r0, min(r0 + rows, ny)) for r0 in range(0, ny, rows)]
+    workers = max(1, min(workers, len(blocks)))
+    if work is None or work.dtype != dtype or work.size < chunk * rows * nx:
+        work = np.empty(chunk * rows * nx, dtype=dtype)
+
+    # Distances are formed in float64 and only then rounded to the backend's precision
+    dx2 = (np.subtract.outer(np.asarray(x_positions, dtype=float), x_axis) ** 2).astype(dtype)
+    dy2 = (np.subtract.outer(np.asarray(y_positions, dtype=float), y_axis) ** 2).astype(dtype)
+    wavenumbers = np.asarray(wavenumbers, dtype=dtype)
+    weights = np.asarray(weights, dtype=dtype)
+    phases = np.asarray(phases, dtype=dtype)
+
+    def superpose_blocks(worker):
+        # Every worker takes every ``workers``-th block, with its own scratch buffers
+        if backend.fused:
+            for r0, r1 in blocks[worker::workers]:
+                backend.accumulate(dy2[:, r0:r1], dx2, wavenumbers, phases, weights, out[r0:r1])
+            return
+        block_work = work if worker == 0 else np.empty(chunk * rows * nx, dtype=dtype)
+        partial = np.empty(rows * nx) if chunk < num_antennas else None
+        for r0, r1 in blocks[worker::workers]:
+            out_block = out[r0:r1].reshape(-1)
+            for a0 in range(0, num_antennas, chunk):
+                a1 = min(a0 + chunk, num_antennas)
+                c = a1 - a0
+                buf = block_work[: c * (r1 - r0) * nx].reshape(c, r1 - r0, nx)
+                backend.element_waves(
+                    dy2[a0:a1, r0:r1, None],
+                    dx2[a0:a1, None, :],
+                    wavenumbers[a0:a1, None, None],
+                    phases[a0:a1, None, None],
+                    out=buf,
+                )
+                flat = buf.reshape(c, -1)
+                if a0 == 0:
+                    np.matmul(weights[a0:a1], flat, out=out_block)
+                else:
+                    np.matmul(weights[a0:a1], flat, out=partial[: out_block.size])
+                    out_block += partial[: out_block.size]
+
+    run_parallel(superpose_blocks, range(workers), workers)
+    return out
+
+
+def default_workers():
+    """Number of compute threads: ``$BEAMFORMING_WORKERS`` if set, else the CPU count."""
+    value = os.environ.get(WORKERS_ENV)
+    if value:
+        try:
+            workers = int(value)
+        except ValueError:
+            raise ValueError(f"{WORKERS_ENV} must be an integer, got {value!r}") from None
+        if workers < 1:
+            raise ValueError(f"{WORKERS_ENV} must be at least 1, got {workers}")
+        return workers
+    return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def _thread_pool(workers):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="beam-engine")
+
+
+def run_parallel(function, items, workers):
+    """Call ``function`` on every item using up to ``workers`` threads.
+
+    NumPy ufuncs and BLAS release the GIL, so threads working on disjoint slices of
+    shared arrays scale across cores without copying anything between them.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            function(item)
+        return
+    for _ in _thread_pool(workers).map(function, items):
+        pass  # Re-raises the first exception of a worker
+
+
+def block_shape(num_antennas, ny, nx, block_bytes=BLOCK_BYTES):
+    """Return (rows per block, antennas per chunk) so one block fits in ``block_bytes``."""
+    row_bytes = nx * 8
+    rows = block_bytes // max(num_antennas * row_bytes, 1)
+    if rows >= 1:
+        return min(rows, ny), num_antennas
+    return 1, max(1, min(num_antennas, block_bytes // row_bytes))
+
+
+def element_waves(x_axis, y_axis, x_positions, y_positions, wavenumbers, phases, out=None):
+    """Return the unweighted ``sin(k * R + phase)`` of each antenna, shape (antennas, ny, nx)."""
+    x_positions = np.atleast_1d(np.asarray(x_positions, dtype=float))
+    y_positions = np.atleast_1d(np.asarray(y_positions, dtype=float))
+    shape = (len(x_positions), len(y_axis), len(x_axis))
+    if out is None:
+        out = np.empty(shape)
+    out = out.reshape(shape)
+    dx2 = np.subtract.outer(x_positions, x_axis) ** 2
+    dy2 = np.subtract.outer(y_positions, y_axis) ** 2
+    np.add(dy2[:, :, None], dx2[:, None, :], out=out)
+    np.sqrt(out, out=out)
+    out *= np.atleast_1d(wavenumbers)[:, None, None]
+    out += np.atleast_1d(phases)[:, None, None]
+    np.sin(out, out=out)
+    return out
+
+
+def distance_maps(x_axis, y_axis, x_positions, y_positions, out, block_bytes=BLOCK_BYTES, workers=1):
+    """Fill ``out`` (antennas, ny, nx) with the distance ``R`` of every grid point to each antenna."""
+    num_antennas = len(x_positions)
+    ny, nx = len(y_axis), len(x_axis)
+    chunk = max(1, block_bytes // (ny * nx * 8))
+
+    def fill(a0):
+        a1 = min(a0 + chunk, num_antennas)
+        dx2 = np.subtract.outer(x_positions[a0:a1], x_axis) ** 2
+        dy2 = np.subtract.outer(y_positions[a0:a1], y_axis) ** 2
+        R = out[a0:a1] if out.dtype == np.float64 else np.empty((a1 - a0, ny, nx))
+        np.add(dy2[:, :, None], dx2[:, None, :], out=R)
+        np.sqrt(R, out=R)
+        out[a0:a1] = R  # No-op for float64 maps; rounds only the final distances otherwise
+
+    run_parallel(fill, range(0, num_antennas, chunk), workers)
+    return out
+
+
+def distance_waves(distances, wavenumbers, phases, out):
+    """Fill ``out`` with ``sin(k * R + phase)`` from precomputed distance maps ``R``."""
+    np.multiply(distances, np.asarray(wavenumbers)[..., None, None], out=out)
+    out += np.asarray(phases)[..., None, None]
+    np.sin(out, out=out)
+    return out
+
+
+def superpose_distances(
+    distances, wavenumbers, weights, phases, out, block_bytes=BLOCK_BYTES, workers=1
+):
+    """``superpose`` from precomputed distance maps (antennas, ny, nx), in row blocks."""
+    num_antennas, ny, nx = distances.shape
+    rows, chunk = block_shape(num_antennas, ny, nx, block_bytes)
+    blocks = [(r0, min(r0 + rows, ny)) for r0 in range(0, ny, rows)]
+    workers = max(1, min(workers, len(blocks)))
+    wavenumbers, weights, phases = (np.asarray(v, dtype=float) for v in (wavenumbers, weights, phases))
+
+    def superpose_blocks(worker):
+        work = np.empty(chunk * rows * nx)
+        partial = np.empty(rows * nx)
+        for r0, r1 in blocks[worker::workers]:
+            out_block = out[r0:r1].reshape(-1)
+            for a0 in range(0, num_antennas, chunk):
+                a1 = min(a0 + chunk, num_antennas)
+                buf = work[: (a1 - a0) * (r1 - r0) * nx].reshape(a1 - a0, r1 - r0, nx)
+                distance_waves(distances[a0:a1, r0:r1], wavenumbers[a0:a1], phases[a0:a1], out=buf)
+                flat = buf.reshape(a1 - a0, -1)
+                if a0 == 0:
+                    np.matmul(weights[a0:a1], flat, out=out_block)
+                else:
+                    np.matmul(weights[a0:a1], flat, out=partial[: out_block.size])
+                    out_block += partial[: out_block.size]
+
+    run_parallel(superpose_blocks, range(workers), workers)
+    return out
+
+
+def phasor_basis(
+    x_axis,
+    y_axis,
+    x_positions,
+    y_positions,
+    wavenumbers,
+    out,
+    block_bytes=BLOCK_BYTES,
+    workers=1,
+    distances=None,
+):
+    """Fill ``out`` (2 * antennas, ny, nx) with ``cos(k R)`` rows followed by ``sin(k R)`` rows.
+
+    With this basis any element phases and weights give the field as one product,
+    ``w sin(k R + phase) = (w sin(phase)) cos(k R) + (w cos(phase)) sin(k R)``.
+    ``distances`` (antennas, ny, nx), if given, replaces the square-root pass.
+    """
+    num_antennas = len(x_positions)
+    ny, nx = len(y_axis), len(x_axis)
+    chunk = max(1, block_bytes // (ny * nx * 8))
+
+    def fill(a0):
+        a1 = min(a0 + chunk, num_antennas)
+        kR = np.empty((a1 - a0, ny, nx))
+        if distances is None:
+            dx2 = np.subtract.outer(x_positions[a0:a1], x_axis) ** 2
+            dy2 = np.subtract.outer(y_positions[a0:a1], y_axis) ** 2
+            np.add(dy2[:, :, None], dx2[:, None, :], out=kR)
+            np.sqrt(kR, out=kR)
+            kR *= np.asarray(wavenumbers[a0:a1])[:, None, None]
+        else:
+            np.multiply(distances[a0:a1], np.asarray(wavenumbers[a0:a1])[:, None, None], out=kR)
+        np.cos(kR, out=out[a0:a1])
+        np.sin(kR, out=out[num_antennas + a0 : num_antennas + a1])
+
+    run_parallel(fill, range(0, num_antennas, chunk), workers)
+    return out
+
+
+CONTRIBUTION_BYTES = 256 * 1024 * 1024  # Memory budget of the per-antenna contribution cache
+PHASOR_BYTES = 512 * 1024 * 1024  # Memory budget of the phasor basis
+DISTANCE_BYTES = 256 * 1024 * 1024  # Memory budget of the per-antenna distance maps
+MAX_INCREMENTAL_EDITS = 64  # Full recompute after this many edits to bound rounding drift
+
+
+class DistanceTable:
+    """Per-antenna distance maps ``R`` of one grid, kept across frequency and phase edits.
+
+    ``R`` only depends on the antenna positions and the grid, so retuning frequencies,
+    steering or changing amplitudes never needs the square-root pass again.  ``lookup``
+    recomputes only the maps of antennas that moved (a curvature change moves them
+    all) and rebuilds everything for a new grid or antenna count.  Maps are stored in
+    ``dtype``; float32 halves the memory at a relative error of about 6e-8 in ``R``.
+    Nothing is kept while the maps would exceed ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=DISTANCE_BYTES, dtype=np.float64, workers=1):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+        self.distances = None
+        self._grid = None
+        self._x = None
+        self._y = None
+
+    def fits(self, grid, num_antennas):
+        return num_antennas * grid.size**2 * self.dtype.itemsize <= self.max_bytes
+
+    def clear(self):
+        self.distances = None
+        self._grid = self._x = self._y = None
+
+    def lookup(self, grid, x_positions, y_positions, build=True):
+        """Return the (antennas, ny, nx) maps for these positions, or None if they don't fit.
+
+        With ``build=False`` only an existing table of the same grid and antenna count is
+        updated; None is returned instead of building one from scratch.
+        """
+        num_antennas = len(x_positions)
+        if not self.fits(grid, num_antennas):
+            self.clear()
+            return None
+        x_axis, y_axis = grid.axes()
+        if self.distances is None or self._grid != grid or len(self._x) != num_antennas:
+            if not build:
+                return None
+            metrics.count("distance_builds")
+            self.distances = np.empty((num_antennas,) + grid.shape, dtype=self.dtype)
+            distance_maps(x_axis, y_axis, x_positions, y_positions, self.distances, workers=self.workers)
+        else:
+            moved = np.flatnonzero((self._x != x_positions) | (self._y != y_positions))
+            if moved.size == num_antennas:  # E.g. a new spacing or curvature
+                metrics.count("distance_updates", moved.size)
+                distance_maps(x_axis, y_axis, x_positions, y_positions, self.distances, workers=self.workers)
+            elif moved.size:
+                metrics.count("distance_updates", moved.size)
+                maps = np.empty((moved.size,) + grid.shape, dtype=self.dtype)
+                distance_maps(
+                    x_axis, y_axis, x_positions[moved], y_positions[moved], maps, workers=self.workers
+                )
+                self.distances[moved] = maps
+        self._grid = grid
+        self._x = np.array(x_positions, dtype=float)
+        self._y = np.array(y_positions, dtype=float)
+        return self.distances
+
+
+class FieldEngine:
+    """Computes fields into preallocated buffers, reusing them across renders.
+
+    The engine remembers the element parameters of the last field it produced and
+    picks the cheapest way to the next one:
+
+    * Only element phases or weights changed (the steering delay, phase offsets,
+      amplitudes): the field is one matrix-vector product over a cached phasor basis
+      of ``cos(k R)`` and ``sin(k R)`` per element (see ``phasor_basis``), with no
+      transcendental evaluated on the grid.  The basis is built the first time steering
+      changes for a geometry and kept while it fits ``phasor_bytes``; it is stored in
+      ``phasor_dtype`` (default: the precision of the config's backend), float32
+      halving its size.
+    * A few elements changed (an antenna moved or retuned): their old contributions are
+      subtracted and the new ones added, so an edit costs O(grid) instead of
+      O(antennas x grid).  Old contributions come from the phasor basis, the cache of
+      unweighted per-antenna waves (kept while it fits ``contribution_bytes``) or are
+      recomputed from the remembered parameters.
+    * Otherwise the field is recomputed from scratch.
+
+    All three reuse the per-antenna distance maps of a ``DistanceTable`` (kept while
+    they fit ``distance_bytes``, stored in ``distance_dtype``), which only change when
+    antennas move or the grid changes.  Retuning frequencies therefore skips the
+    square-root pass, and the table survives ``invalidate`` and backend switches.
+
+    Full recomputes and basis builds are split over ``workers`` threads (default
+    ``default_workers()``); the field does not depend on the number of workers.  Full
+    recomputes use the compute backend named by the config (see ``compute_backends``);
+    only the float64 reference backend evaluates them from the distance maps.
+    """
+
+    def __init__(
+        self,
+        block_bytes=BLOCK_BYTES,
+        contribution_bytes=CONTRIBUTION_BYTES,
+        phasor_bytes=PHASOR_BYTES,
+        phasor_dtype=None,
+        workers=None,
+        distance_bytes=DISTANCE_BYTES,
+        distance_dtype=np.float64,
+    ):
+        self.block_bytes = block_bytes
+        self.workers = default_workers() if workers is None else workers
+        self.distances = DistanceTable(distance_bytes, distance_dtype, self.workers)
+        self.contribution_bytes = contribution_bytes
+        self.phasor_bytes = phasor_bytes
+        self.phasor_dtype = None if phasor_dtype is None else np.dtype(phasor_dtype)
+        self._out = None
+        self._work = None
+        self._scratch = None
+        self._weighted = None
+        self._contributions = None  # Unweighted waves, valid while they match self._params
+        self._basis = None  # Phasor basis, valid for the geometry in self._params
+        self._basis_out = None
+        self._grid = None
+        self._backend = None
+        self._params = None  # rows: x, y, k, phase, weight
+        self._edits = 0
+
+    def _buffers(self, grid, num_antennas):
+        if self._out is None or self._out.shape != grid.shape:
+            self._out = np.empty(grid.shape)
+            self._scratch = np.empty(grid.shape)
+            self._weighted = np.empty(grid.shape)
+        rows, chunk = block_shape(num_antennas, *grid.shape, self.block_bytes)
+        dtype = self._backend.dtype
+        if self._work is None or self._work.dtype != dtype or self._work.size < rows * chunk * grid.size:
+            self._work = np.empty(rows * chunk * grid.size, dtype=dtype)
+        return self._out, self._work
+
+    def invalidate(self):
+        """Forget the last field so the next ``compute`` starts from scratch."""
+        self._params = None
+        self._contributions = None
+        self._basis = None
+
+    def cached_basis(self, config):
+        """The phasor basis if one is cached for the grid and geometry of ``config``, else None."""
+        if self._basis is None or self._grid != config.grid or self._params.shape[1] != config.num_antennas:
+            return None
+        geometry = np.stack([config.x_positions, config.y_positions, config.wavenumbers])
+        return self._basis if np.array_equal(self._params[:3], geometry) else None
+
+    def compute(self, config):
+        """Return the field of ``config``; the returned array is reused by the next call."""
+        params = np.stack(
+            [
+                config.x_positions,
+                config.y_positions,
+                config.wavenumbers,
+                config.phases,
+                config.weights,
+            ]
+        )
+        backend = compute_backends.get_backend(config.backend)
+        if backend is not self._backend:
+            self.invalidate()
+            self._backend = backend
+        changed = self._changed_elements(config.grid, params)
+        if changed is None:
+            return self._compute_full(config.grid, params)
+        if changed.size == 0:
+            metrics.count("field_unchanged")
+            return self._out
+
+        geometry_changed = np.any(self._params[:3, changed] != params[:3, changed], axis=0)
+        if not geometry_changed.any() and self._basis_fits(config.grid, params.shape[1]):
+            return self._combine_basis(config.grid, params)
+        if changed.size <= max(1, config.num_antennas // 4) and self._edits < MAX_INCREMENTAL_EDITS:
+            metrics.count("field_incremental")
+            distances = self.distances.lookup(config.grid, params[0], params[1], build=False)
+            for index in changed:
+                self._replace_element(config.grid, index, params[:, index], distances)
+            self._params = params
+            self._edits += 1
+            return self._out
+        return self._compute_full(config.grid, params)
+
+    def _changed_elements(self, grid, params):
+        if self._params is None or self._grid != grid or self._params.shape != params.shape:
+            return None
+        return np.flatnonzero(np.any(self._params != params, axis=0))
+
+    def _basis_dtype(self):
+        return self._backend.dtype if self.phasor_dtype is None else self.phasor_dtype
+
+    def _basis_fits(self, grid, num_antennas):
+        return 2 * num_antennas * grid.size**2 * self._basis_dtype().itemsize <= self.phasor_bytes
+
+    def _compute_full(self, grid, params):
+        metrics.count("field_full")
+        out, work = self._buffers(grid, params.shape[1])
+        x_axis, y_axis = grid.axes()
+        x, y, k, phase, weight = params
+        num_antennas = params.shape[1]
+        self._basis = None
+        reference = self._backend.name == compute_backends.DEFAULT_BACKEND
+        distances = self.distances.lookup(grid, x, y) if reference else None
+        if reference and num_antennas * out.nbytes <= self.contribution_bytes:
+            if self._contributions is None or self._contributions.shape != (num_antennas,) + grid.shape:
+                self._contributions = np.empty((num_antennas,) + grid.shape)
+            chunk = -(-num_antennas // self.workers)  # Antennas per worker
+
+            def fill(a0):
+                elements = slice(a0, a0 + chunk)
+                if distances is not None:
+                    distance_waves(
+                        distances[elements], k[elements], phase[elements],
+                        out=self._contributions[elements],
+                    )
+                    return
+                element_waves(
+                    x_axis, y_axis, x[elements], y[elements], k[elements], phase[elements],
+                    out=self._contributions[elements],
+                )
+
+            run_parallel(fill, range(0, num_antennas, chunk), self.workers)
+            np.matmul(weight, self._contributions.reshape(num_antennas, -1), out=out.reshape(-1))
+        elif distances is not None:
+            self._contributions = None
+            superpose_distances(distances, k, weight, phase, out, self.block_bytes, self.workers)
+        else:
+            self._contributions = None
+            superpose(
+                x_axis, y_axis, x, y, k, weight, phase,
+                out=out, block_bytes=self.block_bytes, work=work, workers=self.workers,
+                backend=self._backend,
+            )
+        self._grid = grid
+        self._params = params
+        self._edits = 0
+        return out
+
+    def _combine_basis(self, grid, params):
+        metrics.count("field_phasor")
+        x, y, k, phase, weight = params
+        num_antennas = params.shape[1]
+        if self._basis is None:
+            shape = (2 * num_antennas,) + grid.shape
+            self._basis = np.empty(shape, dtype=self._basis_dtype())
+            phasor_basis(
+                *grid.axes(), x, y, k, self._basis, self.block_bytes, self.workers,
+                distances=self.distances.lookup(grid, x, y),
+            )
+            self._basis_out = np.empty(grid.shape, dtype=self._basis_dtype())
+        coefficients = np.concatenate([weight * np.sin(phase), weight * np.cos(phase)])
+        np.matmul(
+            coefficients.astype(self._basis_dtype()),
+            self._basis.reshape(2 * num_antennas, -1),
+            out=self._basis_out.reshape(-1),
+        )
+        self._out[...] = self._basis_out
+        self._contributions = None  # The phases they were computed with are gone
+        self._params = params
+        self._edits = 0
+        return self._out
+
+    def _basis_wave(self, index, phase, weight, out):
+        # weight * sin(k R + phase) of one element from its basis rows
+        num_antennas = self._params.shape[1]
+        np.multiply(self._basis[index], weight * np.sin(phase), out=out)
+        out += np.multiply(self._basis[num_antennas + index], weight * np.cos(phase), out=self._weighted)
+        return out
+
+    def _replace_element(self, grid, index, new, distances=None):
+        # ``distances`` are the maps of the new positions; an element that did not move
+        # has the same map before and after the edit
+        x_axis, y_axis = grid.axes()
+        old = self._params[:, index]
+        R = None if distances is None else distances[index : index + 1]
+        moved = np.any(old[:2] != new[:2])
+        if self._basis is not None:
+            self._out -= self._basis_wave(index, old[3], old[4], self._scratch)
+            if np.any(old[:3] != new[:3]):
+                num_antennas = self._params.shape[1]
+                single = np.empty((2,) + grid.shape, dtype=self._basis_dtype())
+                phasor_basis(
+                    x_axis, y_axis, new[:1], new[1:2], new[2:3], single, self.block_bytes, distances=R
+                )
+                self._basis[index] = single[0]
+                self._basis[num_antennas + index] = single[1]
+            self._out += self._basis_wave(index, new[3], new[4], self._scratch)
+            return
+
+        if self._contributions is not None:
+            wave = self._contributions[index]
+        else:
+            wave = self._scratch
+            if R is not None and not moved:
+                distance_waves(R[0], old[2], old[3], out=wave)
+            else:
+                element_waves(x_axis, y_axis, *old[:4], out=wave)
+        self._out -= np.multiply(wave, old[4], out=self._weighted)
+        if R is not None:
+            distance_waves(R[0], new[2], new[3], out=wave)
+        else:
+            element_waves(x_axis, y_axis, *new[:4], out=wave)
+        self._out += np.multiply(wave, new[4], out=self._weighted)
+
+
+def compute_field(config, workers=None):
+    """Superimpose the waves of all antennas on the grid (superposition principle).
+
+    ``workers`` threads share the work (default ``default_workers()``).
+    """
+    x_axis, y_axis = config.grid.axes()
+    return superpose(
+        x_axis,
+        y_axis,
+        config.x_positions,
+        config.y_positions,
+        config.wavenumbers,
+        config.weights,
+        config.phases,
+        workers=default_workers() if workers is None else workers,
+        backend=config.backend,
+    )
+
+
+def normalize_field(Waves_Sum):
+    """Log-scale the wave amplitude and normalize it to the [0, 1] range."""
+    Waves_Sum_log = np.log1p(np.abs(Waves_Sum))  # log1p(x)=ln(1+x) to avoid zero values issue
+    span = Waves_Sum_log.max() - Waves_Sum_log.min()
+    if span == 0:
+        return np.zeros_like(Waves_Sum_log)
+    return (Waves_Sum_log - Waves_Sum_log.min()) / span
+
+
+def array_factor(
+    x_positions, y_positions, wavenumbers, phases, azimuth_angles, weights=None, dtype=np.float64
+):
+    """Return ``sum_i w_i exp(j(-k_i r_i cos(angle - theta_i) + phase_i))`` for every angle.
+
+    Element parameters have shape (..., antennas); any leading axes are batch axes and
+    the result has shape (..., angles).  ``r cos(angle - theta)`` is evaluated as the
+    projection ``x cos(angle) + y sin(angle)``.  With ``dtype`` float32 the phases are
+    evaluated in single precision and the result is complex64.
+    """
+    x_positions = np.asarray(x_positions, dtype=dtype)[..., None]
+    y_positions = np.asarray(y_positions, dtype=dtype)[..., None]
+    azimuth_angles = np.asarray(azimuth_angles, dtype=dtype)
+    projection = x_positions * np.cos(azimuth_angles) + y_positions * np.sin(azimuth_angles)
+    phase_term = projection
+    phase_term *= -np.asarray(wavenumbers, dtype=dtype)[..., None]
+    phase_term += np.asarray(phases, dtype=dtype)[..., None]
+    # exp(j*phase) built from cos and sin, about twice as fast as a complex exp
+    terms = np.empty(phase_term.shape, dtype=np.result_type(dtype, np.complex64))
+    np.cos(phase_term, out=terms.real)
+    np.sin(phase_term, out=terms.imag)
+    if weights is not None:
+        terms *= np.asarray(weights)[..., None]
+    return terms.sum(axis=-2)
+
+
+def uniform_line(x_positions, y_positions, rtol=1e-9):
+    """Return ``(x0, y0, dx, dy)`` if element ``i`` sits at ``(x0 + i dx, y0 + i dy)``, else None."""
+    if len(x_positions) == 0:
+        return None
+    x0, y0 = x_positions[0], y_positions[0]
+    if len(x_positions) == 1:
+        return x0, y0, 0.0, 0.0
+    steps = np.arange(len(x_positions))
+    dx = (x_positions[-1] - x0) / steps[-1]
+    dy = (y_positions[-1] - y0) / steps[-1]
+    scale = rtol * (np.ptp(x_positions) + np.ptp(y_positions) + 1)
+    if (
+        np.abs(x_positions - (x0 + steps * dx)).max() > scale
+        or np.abs(y_positions - (y0 + steps * dy)).max() > scale
+    ):
+        return None
+    return x0, y0, dx, dy
+
+
+def linear_array_factor(
+    x_positions, y_positions, wavenumbers, phases, azimuth_angles, weights=None, rtol=1e-9
+):
+    """Array factor of a uniform linear array at any number of angles, or None if not one.
+
+    With equal wavenumbers and elements at ``p0 + i d`` the array factor is the
+    polynomial ``exp(-j k p0·u) sum_i c_i z^i`` in ``z = exp(-j k d·u)``, with
+    ``u = (cos(angle), sin(angle))`` and ``c_i = w_i exp(j phase_i)``.  When the
+    ``c_i`` only differ by a linear phase progression (uniform amplitudes, a steering
+    delay) the sum is the closed-form Dirichlet kernel, O(angles).  Otherwise it is
+    evaluated with Horner's rule: O(antennas x angles) multiply-adds but no
+    transcendentals and no (antennas x angles) temporaries.
+    """
+    line = uniform_line(x_positions, y_positions, rtol)
+    wavenumbers = np.asarray(wavenumbers, dtype=float)
+    if line is None or np.ptp(wavenumbers) > rtol * wavenumbers.max():
+        return None
+    x0, y0, dx, dy = line
+    num_antennas = len(wavenumbers)
+    k = wavenumbers[0]
+    phases = np.asarray(phases, dtype=float)
+    weights = np.ones(num_antennas) if weights is None else np.asarray(weights, dtype=float)
+    cos_angles, sin_angles = np.cos(azimuth_angles), np.sin(azimuth_angles)
+    origin = np.exp(-1j * k * (x0 * cos_angles + y0 * sin_angles))  # Phase of element 0's position
+
+    # Phase step between neighbouring elements: geometric part plus the steering progression
+    progression = (phases[-1] - phases[0]) / (num_antennas - 1) if num_antennas > 1 else 0.0
+    residual = phases - phases[0] - progression * np.arange(num_antennas)
+    residual = np.angle(np.exp(1j * residual))  # Wrapped, a 2π step is no step
+    psi = progression - k * (dx * cos_angles + dy * sin_angles)
+
+    if np.ptp(weights) <= rtol * np.abs(weights).max() and np.abs(residual).max() <= rtol:
+        # sum_{i<N} exp(j i psi) = exp(j (N-1) psi / 2) sin(N psi / 2) / sin(psi / 2)
+        half = psi / 2
+        numerator, denominator = np.sin(num_antennas * half), np.sin(half)
+        singular = np.abs(denominator) < 1e-8
+        ratio = np.empty_like(psi)
+        np.divide(numerator, denominator, out=ratio, where=~singular)
+        # Limit at psi = 2πm (grating lobes and broadside): N cos(N psi / 2) / cos(psi / 2)
+        ratio[singular] = num_antennas * np.cos(num_antennas * half[singular]) / np.cos(half[singular])
+        return weights[0] * np.exp(1j * phases[0]) * origin * np.exp(1j * (num_antennas - 1) * half) * ratio
+
+    coefficients = weights * np.exp(1j * phases)
+    z = np.exp(-1j * k * (dx * cos_angles + dy * sin_angles))
+    total = np.full(len(z), coefficients[-1])
+    for coefficient in coefficients[-2::-1]:
+        total *= z
+        total += coefficient
+    return origin * total
+
+
+def compute_beam_pattern(config, num_angles=NUM_PROFILE_ANGLES, block_bytes=BLOCK_BYTES):
+    """Return azimuth angles and the complex array factor over [0, 2π].
+
+    Uniform linear arrays with a single frequency use ``linear_array_factor``, which
+    handles 10^5+ angles cheaply; other arrays are summed in angle chunks whose
+    (antennas x angles) terms fit in ``block_bytes``.
+    """
+    azimuth_angles = np.linspace(0, 2 * np.pi, num_angles)
+    dtype = compute_backends.get_backend(config.backend).dtype
+    Beam_Summation = linear_array_factor(
+        config.x_positions,
+        config.y_positions,
+        config.wavenumbers,
+        config.phases,
+        azimuth_angles,
+        config.amplitudes,
+    )
+    if Beam_Summation is not None:
+        return azimuth_angles, Beam_Summation.astype(np.result_type(dtype, np.complex64), copy=False)
+
+    Beam_Summation = np.empty(num_angles, dtype=np.result_type(dtype, np.complex64))
+    chunk = max(1, block_bytes // (16 * max(config.num_antennas, 1)))
+    for a0 in range(0, num_angles, chunk):
+        Beam_Summation[a0 : a0 + chunk] = array_factor(
+            config.x_positions,
+            config.y_positions,
+            config.wavenumbers,
+            config.phases,
+            azimuth_angles[a0 : a0 + chunk],
+            config.amplitudes,
+            dtype=dtype,
+        )
+    return azimuth_angles, Beam_Summation
+
+
+@dataclass
+class Frame:
+    """Everything the GUI draws for one configuration."""
+
+    config: ArrayConfig
+    Waves_Sum: np.ndarray
+    Waves_Sum_normalized: np.ndarray
+    azimuth_angles: np.ndarray
+    Beam_Summation: np.ndarray
+    animation: object = None  # wave_animation.WaveAnimation, on full-resolution frames while animating
+
+
+def compute_frame(config, field_engine=None, workers=None):
+    """Compute the heatmap and beam profile of ``config``.
+
+    The returned arrays are owned by the frame, so it can be handed to another thread
+    while ``field_engine`` goes on to the next configuration.
+    """
+    with metrics.span("superposition"):
+        if field_engine is None:
+            Waves_Sum = compute_field(config, workers)
+        else:
+            Waves_Sum = field_engine.compute(config).copy()
+    with metrics.span("normalization"):
+        Waves_Sum_normalized = normalize_field(Waves_Sum)
+    with metrics.span("beam_pattern"):
+        azimuth_angles, Beam_Summation = compute_beam_pattern(config)
+    return Frame(config, Waves_Sum, Waves_Sum_normalized, azimuth_angles, Beam_Summation)
+
+
+def validate_backend(backend=None, config=None):
+    """Check ``backend`` against the float64 reference; return the relative error.
+
+    The error is the largest field difference relative to ``sum(|weights|)``, the
+    largest possible field, and must be within the backend's stated ``tolerance``.
+    """
+    backend = compute_backends.get_backend(backend)
+    if config is None:
+        config = ArrayConfig.from_layout(
+            16, 2, np.linspace(80, 120, 16), delay_deg=30, grid=GridSpec(size=200)
+        )
+    reference = compute_field(replace(config, backend=compute_backends.DEFAULT_BACKEND))
+    result = compute_field(replace(config, backend=backend.name))
+    error = np.abs(result - reference).max() / np.abs(config.weights).sum()
+    if error > backend.tolerance:
+        raise ValueError(
+            f"Backend {backend.name!r} is off by {error:.3g}, more than its tolerance {backend.tolerance:g}"
+        )
+    return error
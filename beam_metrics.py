@@ -0,0 +1,182 @@
+"""Numeric beam-pattern metrics and a queryable table of them.
+
+``beam_metrics`` extracts the main-lobe direction, half-power and first-null
+beamwidths, peak sidelobe level and a directivity estimate from any batch of
+array factors sampled on a uniform angle grid, with no Python loop over
+patterns.  ``MetricsTable`` keeps the results as columns next to the scenario
+parameters they came from, so questions like "every config with SLL < -20 dB"
+are a boolean mask instead of another pass over the fields.
+"""
+import numpy as np
+
+METRIC_COLUMNS = ("peak_deg", "peak_magnitude", "hpbw_deg", "fnbw_deg", "sll_db", "directivity_db")
+METRIC_BYTES = 64 * 1024 * 1024  # Working-set budget of one batch of patterns
+VISIBLE_SECTOR = (0.0, np.pi)  # The half-plane in front of the array, as the profile plot shows it
+
+
+def beam_metrics(azimuth_angles, Beam_Summation, sector=VISIBLE_SECTOR, block_bytes=METRIC_BYTES):
+    """Return a dict of metric arrays with the batch shape of ``Beam_Summation`` (..., angles).
+
+    * ``peak_deg``, ``peak_magnitude``: direction and magnitude of the strongest sample.
+    * ``hpbw_deg``: width of the main lobe at half power (-3 dB), interpolated between samples.
+    * ``fnbw_deg``: width between the first minima on either side of the peak.
+    * ``sll_db``: strongest sample outside the main lobe relative to the peak (-inf if none).
+    * ``directivity_db``: peak power over the mean power across the sampled angles.
+
+    Only the angles within ``sector`` (radians, inclusive) are analysed; by default the
+    half-plane in front of the array, since a linear array's pattern is mirrored behind
+    it.  The angles must be uniformly spaced.  With ``sector=None`` a pattern over the
+    full circle (the last angle repeating the first, as ``compute_beam_pattern`` returns
+    it) is treated as periodic; otherwise a width whose edge falls outside the analysed
+    range is NaN.
+    """
+    azimuth_angles = np.asarray(azimuth_angles, dtype=float)
+    if sector is not None:
+        tolerance = 1e-9 * (abs(sector[0]) + abs(sector[1]) + 1)
+        inside = np.flatnonzero(
+            (azimuth_angles >= sector[0] - tolerance) & (azimuth_angles <= sector[1] + tolerance)
+        )
+        if len(inside) < 2:
+            raise ValueError(f"Fewer than two azimuth angles fall into the sector {sector}")
+        azimuth_angles = azimuth_angles[inside[0] : inside[-1] + 1]
+        Beam_Summation = Beam_Summation[..., inside[0] : inside[-1] + 1]
+    step = azimuth_angles[1] - azimuth_angles[0]
+    if not np.allclose(np.diff(azimuth_angles), step, rtol=1e-6, atol=0):
+        raise ValueError("beam_metrics needs uniformly spaced azimuth angles")
+    periodic = np.isclose(azimuth_angles[-1] - azimuth_angles[0], 2 * np.pi)
+    if periodic:
+        azimuth_angles = azimuth_angles[:-1]
+        Beam_Summation = Beam_Summation[..., :-1]
+
+    batch_shape = Beam_Summation.shape[:-1]
+    power = np.abs(Beam_Summation.reshape(-1, len(azimuth_angles))) ** 2
+    results = {name: np.empty(len(power)) for name in METRIC_COLUMNS}
+    rows = max(1, block_bytes // (8 * 8 * power.shape[1]))  # About 8 temporaries per sample
+    for r0 in range(0, len(power), rows):
+        block = _block_metrics(power[r0 : r0 + rows], azimuth_angles, step, periodic)
+        for name in METRIC_COLUMNS:
+            results[name][r0 : r0 + rows] = block[name]
+    return {name: values.reshape(batch_shape) for name, values in results.items()}
+
+
+def _block_metrics(power, azimuth_angles, step, periodic):
+    num_patterns, num_angles = power.shape
+    rows = np.arange(num_patterns)[:, None]
+    peak = np.argmax(power, axis=1)
+    peak_power = power[rows[:, 0], peak]
+
+    # Re-index every pattern around its peak: column ``half + o`` is angle ``peak + o``
+    half = num_angles // 2
+    offsets = np.arange(-half, num_angles - half)
+    index = peak[:, None] + offsets
+    if periodic:
+        centered = power[rows, index % num_angles]
+    else:
+        inside = (index >= 0) & (index < num_angles)
+        centered = np.where(inside, power[rows, np.clip(index, 0, num_angles - 1)], np.nan)
+    right = centered[:, half:]  # Peak first, walking up in angle
+    left = centered[:, half::-1]  # Peak first, walking down in angle
+
+    half_power = peak_power[:, None] / 2
+    hpbw = _crossing(right, half_power) + _crossing(left, half_power)
+    right_null, left_null = _first_minimum(right), _first_minimum(left)
+    fnbw = right_null + left_null
+
+    # Everything outside [peak - left_null, peak + right_null] is sidelobe
+    column = np.arange(num_angles)[None, :]
+    main_lobe = (column >= half - np.nan_to_num(left_null, nan=half)[:, None]) & (
+        column <= half + np.nan_to_num(right_null, nan=num_angles)[:, None]
+    )
+    sidelobes = np.where(main_lobe | np.isnan(centered), 0.0, centered).max(axis=1)
+    with np.errstate(divide="ignore"):
+        sll_db = 10 * np.log10(sidelobes / peak_power)
+        directivity_db = 10 * np.log10(peak_power / power.mean(axis=1))
+
+    return {
+        "peak_deg": np.rad2deg(azimuth_angles[peak]),
+        "peak_magnitude": np.sqrt(peak_power),
+        "hpbw_deg": np.rad2deg(hpbw * step),
+        "fnbw_deg": np.rad2deg(fnbw * step),
+        "sll_db": sll_db,
+        "directivity_db": directivity_db,
+    }
+
+
+def _crossing(side, level):
+    # Fractional number of samples from the peak to the first value below ``level``
+    below = side < level
+    found = below.any(axis=1)
+    first = np.argmax(below, axis=1)
+    rows = np.arange(len(side))
+    before = side[rows, np.maximum(first - 1, 0)]
+    after = side[rows, first]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = (before - level[:, 0]) / (before - after)
+    return np.where(found & (first > 0), first - 1 + fraction, np.nan)
+
+
+def _first_minimum(side):
+    # Samples from the peak to the first local minimum, NaN if the side never rises again
+    rising = np.diff(side, axis=1) > 0
+    found = rising.any(axis=1)
+    return np.where(found, np.argmax(rising, axis=1), np.nan)
+
+
+class MetricsTable:
+    """Columns of scenario parameters and beam metrics, one row per configuration.
+
+    ``table["sll_db"]`` is a column; ``table.where(mask)`` and ``table.find(**values)``
+    return the matching rows as a new table, e.g.
+    ``table.where(table["sll_db"] < -20).find(num_antennas=16)``.
+    """
+
+    def __init__(self, columns):
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns must have the same length, got {sorted(lengths)}")
+        self.columns = columns
+
+    @classmethod
+    def from_patterns(cls, parameters, azimuth_angles, Beam_Summation, sector=VISIBLE_SECTOR):
+        """Compute the metrics of a (configs, angles) batch labelled by parameter columns."""
+        metrics = beam_metrics(azimuth_angles, Beam_Summation, sector)
+        return cls({**parameters, **metrics})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path):
+        np.savez(path, **self.columns)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def names(self):
+        return tuple(self.columns)
+
+    def where(self, mask):
+        """Return the rows selected by a boolean mask (or an array of row numbers)."""
+        return MetricsTable({name: values[mask] for name, values in self.columns.items()})
+
+    def find(self, **values):
+        """Return the rows whose columns equal all given values."""
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in values.items():
+            mask &= self.columns[name] == value
+        return self.where(mask)
+
+    def sort(self, name, descending=False):
+        order = np.argsort(self.columns[name], kind="stable")
+        return self.where(order[::-1] if descending else order)
+
+    def rows(self):
+        """Iterate over the rows as dicts of Python scalars."""
+        for i in range(len(self)):
+            yield {name: values[i].item() for name, values in self.columns.items()}
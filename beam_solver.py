@@ -0,0 +1,260 @@
+"""Solve for element phases and amplitudes that focus or steer the array.
+
+Usage:
+    python beam_solver.py scenarios/tumor_ablation_scenario.json --focus 2 12 -o focused.json
+    python beam_solver.py scenarios/5g_scenario.json --steer 60 --null-deg 100 --phase-only
+
+Element ``i`` contributes ``c_i a_mi`` to the field at constraint ``m``, where
+``c_i = A_i exp(j phase_i)`` is its excitation and ``a_mi`` its response: the
+frequency weight ``f_i / f_max`` times ``exp(j k_i R_mi)`` at a focus point (the
+heatmap's near field) or ``exp(-j k_i p_i·u)`` in a far-field direction ``u``
+(the beam profile, which has no frequency weights).  Depending on the constraints:
+
+* One target and no nulls: conjugate phases ``phase_i = -arg(a_i)`` line all
+  contributions up at the target, keeping the amplitudes.
+* Several targets or nulls: the minimum-norm excitation with unit response at
+  every target and zero response at every null, one least-squares solve.
+* With ``phase_only`` and several targets or nulls, the amplitudes are kept and
+  the phases are found by gradient descent on all constraints at once, started
+  from the phases of the minimum-norm solution.
+
+The response matrix is (constraints × antennas), so solving for hundreds of
+elements takes milliseconds.  ``Solution.to_scenario`` turns the result into a
+scenario the GUI loads with its per-element phases and amplitudes.
+"""
+import argparse
+from dataclasses import dataclass, replace
+import logging
+import os
+import sys
+
+import numpy as np
+
+REFERENCE_PHASE = np.pi / 2  # Phase at the targets, where the heatmap's sin(...) snapshot peaks
+NULL_WEIGHT = 100.0  # Weight of the null constraints against the targets in the phase-only loss
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-9  # Relative loss change at which the gradient descent stops
+
+
+def element_responses(config, points=None, azimuth_angles=None):
+    """Per-element responses (constraints, antennas) at focus points and in far-field directions.
+
+    ``points`` is (M, 2) in metres, ``azimuth_angles`` in radians; point rows come first.
+    Point rows carry the frequency weights of the heatmap, direction rows match
+    ``beam_engine.compute_beam_pattern``, which has none.
+    """
+    scale = config.frequencies / config.reference_frequency
+    rows = []
+    if points is not None and len(points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        distances = np.hypot(
+            points[:, :1] - config.x_positions, points[:, 1:] - config.y_positions
+        )
+        rows.append(scale * np.exp(1j * config.wavenumbers * distances))
+    if azimuth_angles is not None and len(azimuth_angles):
+        azimuth_angles = np.asarray(azimuth_angles, dtype=float)[:, None]
+        projection = config.x_positions * np.cos(azimuth_angles) + config.y_positions * np.sin(
+            azimuth_angles
+        )
+        rows.append(np.exp(-1j * config.wavenumbers * projection))
+    if not rows:
+        return np.empty((0, config.num_antennas), dtype=complex)
+    return np.concatenate(rows)
+
+
+@dataclass
+class Solution:
+    """Solved excitation: phases in radians (wrapped to (-π, π]) and amplitudes (max 1)."""
+
+    phase_offsets: np.ndarray
+    amplitudes: np.ndarray
+    method: str  # "conjugate", "min_norm" or "gradient"
+    target_response: np.ndarray  # Complex field at the targets, relative to its coherent maximum
+    null_response: np.ndarray  # Complex field at the nulls, relative to its coherent maximum
+    iterations: int = 0
+
+    @property
+    def phase_deg(self):
+        return np.rad2deg(self.phase_offsets)
+
+    @property
+    def null_depth_db(self):
+        """Strongest null relative to the weakest target, in dB (-inf without nulls)."""
+        if len(self.null_response) == 0:
+            return -np.inf
+        with np.errstate(divide="ignore"):
+            return 20 * np.log10(
+                np.abs(self.null_response).max() / np.abs(self.target_response).min()
+            )
+
+    def apply(self, config):
+        """``config`` driven by this excitation; the steering delay is part of the phases."""
+        return replace(
+            config, delay_deg=0.0, phase_offsets=self.phase_offsets, amplitudes=self.amplitudes
+        )
+
+    def to_scenario(self, scenario, name=None):
+        """``scenario`` with this excitation, ready for ``scenario_io.save_scenario``."""
+        return replace(
+            scenario,
+            delay_deg=0,
+            phase_deg=self.phase_deg.tolist(),
+            amplitudes=self.amplitudes.tolist(),
+            name=scenario.name if name is None else name,
+        )
+
+
+def solve(
+    config,
+    focus_points=None,
+    steer_deg=None,
+    null_points=None,
+    null_deg=None,
+    phase_only=False,
+    null_weight=NULL_WEIGHT,
+    max_iterations=MAX_ITERATIONS,
+    tolerance=TOLERANCE,
+):
+    """Solve for an excitation that puts the field's maxima at the targets and zeros at the nulls.
+
+    Targets are focus points (M, 2) in metres and/or steering azimuths in degrees (90° is
+    broadside); nulls likewise.  The config's positions and frequencies are used, its
+    phases are replaced; with ``phase_only`` its amplitudes are kept.
+    """
+    targets = element_responses(config, focus_points, _radians(steer_deg))
+    nulls = element_responses(config, null_points, _radians(null_deg))
+    if len(targets) == 0:
+        raise ValueError("Give at least one focus point or steering direction")
+    amplitudes = config.amplitudes.copy()
+    iterations = 0
+
+    if len(targets) == 1 and len(nulls) == 0:
+        method = "conjugate"
+        phase_offsets = REFERENCE_PHASE - np.angle(targets[0])
+    else:
+        # Minimum-norm (or least-squares, if over-constrained) solution of A c = g
+        responses = np.concatenate([targets, nulls])
+        goal = np.zeros(len(responses), dtype=complex)
+        goal[: len(targets)] = np.exp(1j * REFERENCE_PHASE)
+        excitation = np.linalg.lstsq(responses, goal, rcond=None)[0]
+        phase_offsets = np.angle(excitation)
+        if phase_only:
+            method = "gradient"
+            phase_offsets, iterations = _descend(
+                targets * amplitudes,
+                nulls * amplitudes,
+                phase_offsets,
+                null_weight,
+                max_iterations,
+                tolerance,
+            )
+        else:
+            method = "min_norm"
+            magnitude = np.abs(excitation)
+            amplitudes = magnitude / magnitude.max() if magnitude.max() > 0 else np.ones_like(magnitude)
+
+    phase_offsets = np.angle(np.exp(1j * phase_offsets))
+    excitation = amplitudes * np.exp(1j * phase_offsets)
+    # sum |a_mi| A_i, the field of constraint m if every contribution lined up
+    return Solution(
+        phase_offsets,
+        amplitudes,
+        method,
+        targets @ excitation / (np.abs(targets) @ amplitudes),
+        nulls @ excitation / (np.abs(nulls) @ amplitudes),
+        iterations,
+    )
+
+
+def _radians(angles_deg):
+    return None if angles_deg is None else np.deg2rad(np.atleast_1d(angles_deg))
+
+
+def _descend(targets, nulls, phases, null_weight, max_iterations, tolerance):
+    # Minimise -mean_t log|F_t|^2 + null_weight sum_n |F_n|^2 (both relative to the
+    # coherent sum) over the phases.  The log balances the targets against each other.
+    # d|F_m|^2 / d phase_i = -2 Im(conj(F_m) a_mi exp(j phase_i)), for all m and i at once.
+    responses = np.concatenate([targets, nulls])
+    num_targets = len(targets)
+    total = np.abs(targets).sum(axis=1).max()
+
+    def evaluate(phases):
+        terms = responses * np.exp(1j * phases)
+        field = terms.sum(axis=1) / total
+        power = np.abs(field) ** 2
+        target_power = np.maximum(power[:num_targets], np.finfo(float).tiny)
+        loss = -np.log(target_power).mean() + null_weight * power[num_targets:].sum()
+        coefficients = np.concatenate(
+            [-1 / (num_targets * target_power), np.full(len(nulls), null_weight)]
+        )
+        gradient = -2 * np.imag((coefficients * field.conj()) @ terms) / total
+        return loss, gradient
+
+    loss, gradient = evaluate(phases)
+    step = 1.0
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        # Backtracking line search on the steepest-descent direction (Armijo condition)
+        slope = gradient @ gradient
+        if slope == 0:
+            break
+        while step > 1e-12:
+            candidate = phases - step * gradient
+            new_loss, new_gradient = evaluate(candidate)
+            if new_loss <= loss - 1e-4 * step * slope:
+                break
+            step /= 2
+        else:
+            break
+        converged = abs(loss - new_loss) <= tolerance * max(abs(loss), 1.0)
+        phases, loss, gradient = candidate, new_loss, new_gradient
+        step *= 2
+        if converged:
+            break
+    return phases, iteration
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", help="Scenario JSON file for the array layout")
+    parser.add_argument("-o", "--output", help="Output scenario (default: <scenario>_solved.json)")
+    parser.add_argument(
+        "--focus", type=float, nargs=2, action="append", metavar=("X", "Y"), help="Focus point (m)"
+    )
+    parser.add_argument("--steer", type=float, action="append", help="Steering azimuth (°)")
+    parser.add_argument(
+        "--null-point", type=float, nargs=2, action="append", metavar=("X", "Y"), help="Null point (m)"
+    )
+    parser.add_argument("--null-deg", type=float, action="append", help="Null azimuth (°)")
+    parser.add_argument(
+        "--phase-only", action="store_true", help="Keep the scenario's amplitudes, solve phases only"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from scenario_io import load_scenario, save_scenario
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    scenario = load_scenario(args.scenario)
+    solution = solve(
+        scenario.to_config(),
+        args.focus,
+        args.steer,
+        args.null_point,
+        args.null_deg,
+        phase_only=args.phase_only,
+    )
+    logging.info(
+        f"{solution.method}: target response {np.abs(solution.target_response).round(3)}, "
+        f"null depth {solution.null_depth_db:.1f} dB after {solution.iterations} iterations"
+    )
+    output = args.output or os.path.splitext(args.scenario)[0] + "_solved.json"
+    save_scenario(solution.to_scenario(scenario), output)
+    logging.info(f"Wrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""Benchmark the heatmap and beam-profile pipeline and compare runs across commits.
+
+Usage:
+    python benchmark.py                          # writes results/benchmark-<commit>.json
+    python benchmark.py --quick -o new.json --compare results/benchmark-abc1234.json
+    python benchmark.py -k field --compare old.json --threshold 0.1
+"""
+import argparse
+import atexit
+from datetime import datetime, timezone
+import glob
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import beam_engine
+import compute_backends
+from scenario_io import Scenario, load_scenario, save_scenario
+
+RESULT_VERSION = 1
+MIN_ROUNDS = 3
+MIN_TIME = 0.5  # s spent per case; slow cases stop after MIN_ROUNDS
+REGRESSION_THRESHOLD = 0.2  # Slowdown of the median that fails --compare
+
+BENCHMARKS = []  # (group, case generator)
+
+
+def benchmark(group):
+    """Register a generator of ``(name, parameters, function)`` cases under ``group``."""
+
+    def register(cases):
+        BENCHMARKS.append((group, cases))
+        return cases
+
+    return register
+
+
+def measure(function, min_rounds=MIN_ROUNDS, min_time=MIN_TIME):
+    """Time ``function()`` after one warm-up call; return timing statistics in seconds."""
+    function()
+    times = []
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t0)
+        if len(times) >= min_rounds and time.perf_counter() - start >= min_time:
+            break
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": len(times),
+    }
+
+
+def linear_config(num_antennas, grid_size, delay_deg=30):
+    return beam_engine.ArrayConfig.from_layout(
+        num_antennas,
+        2,
+        np.full(num_antennas, beam_engine.DEFAULT_FREQUENCY),
+        delay_deg,
+        grid=beam_engine.GridSpec(size=grid_size),
+    )
+
+
+@benchmark("field")
+def field_cases(quick):
+    antenna_counts = (8, 64) if quick else (1, 8, 32, 128, 512)
+    grid_sizes = (100, 250) if quick else (100, 250, 500, 1000, 2000)
+    for num_antennas in antenna_counts:
+        config = linear_config(num_antennas, 250)
+        yield (
+            f"field[antennas={num_antennas},grid=250]",
+            {"antennas": num_antennas, "grid": 250},
+            lambda config=config: beam_engine.compute_field(config),
+        )
+    for grid_size in grid_sizes:
+        config = linear_config(32, grid_size)
+        yield (
+            f"field[antennas=32,grid={grid_size}]",
+            {"antennas": 32, "grid": grid_size},
+            lambda config=config: beam_engine.compute_field(config),
+        )
+
+
+@benchmark("field_engine")
+def field_engine_cases(quick):
+    # What dragging the delay slider costs once the engine has seen the geometry
+    for num_antennas in (8, 64) if quick else (8, 64, 256):
+        configs = [linear_config(num_antennas, 500, delay) for delay in (10, 20)]
+        engine = beam_engine.FieldEngine()
+        state = {"turn": 0}
+
+        def steer(engine=engine, configs=configs, state=state):
+            state["turn"] ^= 1
+            engine.compute(configs[state["turn"]])
+
+        yield (
+            f"field_engine_steer[antennas={num_antennas},grid=500]",
+            {"antennas": num_antennas, "grid": 500},
+            steer,
+        )
+
+    # Retuning every element but the highest frequency keeps the layout, and so the
+    # engine's distance maps
+    for num_antennas in (8, 64) if quick else (8, 64, 256):
+        configs = []
+        for offset in (0, 5):
+            frequencies = np.full(num_antennas, beam_engine.DEFAULT_FREQUENCY + offset, dtype=float)
+            frequencies[0] = 2 * beam_engine.DEFAULT_FREQUENCY
+            configs.append(
+                beam_engine.ArrayConfig.from_layout(
+                    num_antennas, 2, frequencies, 30, grid=beam_engine.GridSpec(size=500)
+                )
+            )
+        engine = beam_engine.FieldEngine()
+        state = {"turn": 0}
+
+        def retune(engine=engine, configs=configs, state=state):
+            state["turn"] ^= 1
+            engine.compute(configs[state["turn"]])
+
+        yield (
+            f"field_engine_retune[antennas={num_antennas},grid=500]",
+            {"antennas": num_antennas, "grid": 500},
+            retune,
+        )
+
+
+@benchmark("beam_profile")
+def beam_profile_cases(quick):
+    config = linear_config(32, 2)
+    for num_angles in (360, 3600) if quick else (360, 3600, 36000, 360000):
+        yield (
+            f"beam_profile[antennas=32,angles={num_angles}]",
+            {"antennas": 32, "angles": num_angles},
+            lambda num_angles=num_angles: beam_engine.compute_beam_pattern(config, num_angles),
+        )
+
+
+@benchmark("wideband")
+def wideband_cases(quick):
+    from wideband import Pulse, wideband_field
+
+    config = linear_config(16, 250)
+    for num_bins in (32,) if quick else (32, 128, 512):
+        pulse = Pulse(beam_engine.DEFAULT_FREQUENCY, beam_engine.DEFAULT_FREQUENCY / 2, num_bins)
+        yield (
+            f"wideband[antennas=16,grid=250,bins={num_bins}]",
+            {"antennas": 16, "grid": 250, "bins": num_bins},
+            lambda pulse=pulse: wideband_field(config, pulse),
+        )
+
+
+@benchmark("pattern_3d")
+def pattern_3d_cases(quick):
+    from array_3d import Array3D, pattern_3d, ura_pattern_fft
+
+    for size in (8,) if quick else (8, 16, 32):
+        panel = Array3D.rectangular(size, size).steered(60, 20)
+        yield (
+            f"pattern_3d[panel={size}x{size},angles=361x181]",
+            {"antennas": size * size, "angles": 361 * 181},
+            lambda panel=panel: pattern_3d(panel),
+        )
+        yield (
+            f"ura_pattern_fft[panel={size}x{size}]",
+            {"antennas": size * size},
+            lambda panel=panel: ura_pattern_fft(panel),
+        )
+
+
+@benchmark("redraw")
+def redraw_cases(quick):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+    except ImportError:
+        logging.warning("PyQt5 is not installed, skipping the redraw benchmarks")
+        return
+    from plot_renderer import BeamProfilePlot, HeatmapPlot
+
+    app = QApplication.instance() or QApplication([])
+    for grid_size in (250,) if quick else (250, 500, 1000):
+        frame = beam_engine.compute_frame(linear_config(10, grid_size))
+        # Same figure sizes as the main window
+        heatmap_canvas = FigureCanvas(Figure(figsize=(8, 6)))
+        heatmap_canvas.resize(800, 600)
+        heatmap_plot = HeatmapPlot(heatmap_canvas.figure, blit=True)
+
+        def full_redraw(plot=heatmap_plot, canvas=heatmap_canvas, frame=frame):
+            plot.update(frame)
+            canvas.draw()
+
+        def blit_redraw(plot=heatmap_plot, frame=frame):
+            plot.update(frame)
+            app.processEvents()
+
+        parameters = {"grid": grid_size}
+        yield f"heatmap_canvas_draw[grid={grid_size}]", parameters, full_redraw
+        yield f"heatmap_canvas_blit[grid={grid_size}]", parameters, blit_redraw
+
+    frame = beam_engine.compute_frame(linear_config(10, 100))
+    profile_canvas = FigureCanvas(Figure(figsize=(8, 5)))
+    profile_canvas.resize(800, 500)
+    profile_plot = BeamProfilePlot(profile_canvas.figure)
+
+    def profile_redraw():
+        profile_plot.update(frame)
+        profile_canvas.draw()
+
+    yield "profile_canvas_draw", {"angles": beam_engine.NUM_PROFILE_ANGLES}, profile_redraw
+
+
+@benchmark("scenario_load")
+def scenario_load_cases(quick):
+    scenario_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+    for file_path in sorted(glob.glob(os.path.join(scenario_dir, "*.json"))):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        yield (
+            f"scenario_load[{name}]",
+            {"scenario": name},
+            lambda file_path=file_path: load_scenario(file_path).to_config(),
+        )
+
+    # A version 2 scenario of the GUI's largest array, its element table in a sidecar
+    directory = tempfile.mkdtemp(prefix="scenario_load-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    file_path = os.path.join(directory, "elements_4096.json")
+    x_positions = np.linspace(-10, 10, 4096)
+    scenario = Scenario(
+        4096, 2, x_positions=x_positions, y_positions=np.zeros(4096), phase_deg=np.zeros(4096)
+    )
+    save_scenario(scenario, file_path, sidecar=True)
+    yield (
+        "scenario_load[elements_4096_sidecar]",
+        {"scenario": "elements_4096_sidecar", "antennas": 4096},
+        lambda: load_scenario(file_path).to_config(),
+    )
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def environment():
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": beam_engine.default_workers(),
+        "backend": compute_backends.backend_name(),
+    }
+
+
+def run_benchmarks(keyword=None, quick=False):
+    results = {}
+    for group, cases in BENCHMARKS:
+        for name, parameters, function in cases(quick):
+            if keyword and keyword not in name:
+                continue
+            stats = measure(function)
+            results[name] = {"group": group, "parameters": parameters, **stats}
+            logging.info(
+                f"{name}: median {stats['median'] * 1e3:.3f} ms over {stats['rounds']} rounds"
+            )
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print median ratios against ``baseline`` and return the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<48} {old['median'] * 1e3:9.3f}ms {result['median'] * 1e3:9.3f}ms "
+            f"{ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    parser.add_argument("-k", "--keyword", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="Run a smaller set of cases")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Median slowdown that counts as a regression (0.2 = 20%%)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    report = {
+        "version": RESULT_VERSION,
+        "environment": environment(),
+        "results": run_benchmarks(args.keyword, args.quick),
+    }
+    output = args.output or os.path.join(
+        "results", f"benchmark-{report['environment']['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    logging.info(f"Wrote {len(report['results'])} results to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        if baseline.get("version") != RESULT_VERSION:
+            raise ValueError(f"Unsupported benchmark result version {baseline.get('version')!r}")
+        regressions = compare(report["results"], baseline["results"], args.threshold)
+        if regressions:
+            logging.error(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Interchangeable kernels for the field and beam-pattern math.
+
+``beam_engine`` drives the tiling, threading and weighting; a backend only
+decides how the per-block element waves ``sin(k * sqrt(dy**2 + dx**2) + phase)``
+are evaluated and in which precision:
+
+* ``numpy``: the float64 reference.
+* ``numpy32``: the same expressions in float32, half the memory traffic.
+* ``numexpr``: sqrt, scale, shift and sin fused into one pass over the block
+  (needs the optional ``numexpr`` package).
+* ``numba``: a JIT-compiled loop that accumulates the weighted sum per grid point
+  without any temporaries (needs the optional ``numba`` package).
+
+Optional backends are detected on first use.  The backend is picked with the
+``backend`` field of ``ArrayConfig`` or the ``BEAMFORMING_BACKEND`` environment
+variable; ``auto`` takes the first installed of numba, numexpr and numpy.  Which
+one is fastest depends on the machine (NumPy's own sin is SIMD-vectorized), so
+``beam_engine.validate_backend`` and the timings of a real grid are worth a look.
+"""
+import abc
+import os
+
+import numpy as np
+
+BACKEND_ENV = "BEAMFORMING_BACKEND"
+DEFAULT_BACKEND = "numpy"
+AUTO_PREFERENCE = ("numba", "numexpr", "numpy")
+
+
+class Backend:
+    """float64 NumPy reference backend; subclasses override ``element_waves``.
+
+    Backends that compute whole weighted blocks derive from ``FusedBackend`` instead.
+    """
+
+    name = "numpy"
+    dtype = np.dtype(np.float64)
+    # Allowed max |field - reference| relative to the largest possible field, sum(|weights|)
+    tolerance = 0.0
+    fused = False  # True for ``FusedBackend``s, which the engine calls ``accumulate`` on
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def element_waves(self, dy2, dx2, wavenumbers, phases, out):
+        """Fill ``out`` (antennas, rows, nx) with ``sin(k * sqrt(dy2 + dx2) + phase)``.
+
+        ``dy2`` is (antennas, rows, 1), ``dx2`` (antennas, 1, nx) and the wavenumbers and
+        phases (antennas, 1, 1), all of the backend's dtype.
+        """
+        np.add(dy2, dx2, out=out)
+        np.sqrt(out, out=out)
+        out *= wavenumbers
+        out += phases
+        np.sin(out, out=out)
+        return out
+
+
+class FusedBackend(Backend, abc.ABC):
+    """Backend that evaluates and sums the element waves of a row block in one kernel."""
+
+    fused = True
+
+    @abc.abstractmethod
+    def accumulate(self, dy2, dx2, wavenumbers, phases, weights, out):
+        """Write ``sum_i w_i sin(k_i R_i + phase_i)`` of a row block into ``out`` (rows, nx).
+
+        ``dy2`` is (antennas, rows) and ``dx2`` (antennas, nx); the rest are (antennas,).
+        """
+
+
+class Float32Backend(Backend):
+    name = "numpy32"
+    dtype = np.dtype(np.float32)
+    tolerance = 1e-4
+
+
+class NumexprBackend(Backend):
+    name = "numexpr"
+    tolerance = 1e-12
+
+    @classmethod
+    def available(cls):
+        try:
+            import numexpr  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self):
+        import numexpr
+
+        self._numexpr = numexpr
+
+    def element_waves(self, dy2, dx2, wavenumbers, phases, out):
+        return self._numexpr.evaluate(
+            "sin(k * sqrt(dy2 + dx2) + phase)",
+            local_dict={"dy2": dy2, "dx2": dx2, "k": wavenumbers, "phase": phases},
+            out=out,
+        )
+
+
+class NumbaBackend(FusedBackend):
+    name = "numba"
+    tolerance = 1e-12
+
+    @classmethod
+    def available(cls):
+        try:
+            import numba  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self):
+        import numba
+
+        @numba.njit(nogil=True, cache=True)
+        def accumulate(dy2, dx2, wavenumbers, phases, weights, out):
+            num_antennas, rows = dy2.shape
+            nx = dx2.shape[1]
+            for r in range(rows):
+                for c in range(nx):
+                    total = 0.0
+                    for a in range(num_antennas):
+                        R = np.sqrt(dy2[a, r] + dx2[a, c])
+                        total += weights[a] * np.sin(wavenumbers[a] * R + phases[a])
+                    out[r, c] = total
+
+        self._accumulate = accumulate
+
+    def accumulate(self, dy2, dx2, wavenumbers, phases, weights, out):
+        # Releases the GIL, so the engine's row tiles still run in parallel
+        self._accumulate(dy2, dx2, wavenumbers, phases, weights, out)
+        return out
+
+
+BACKENDS = {backend.name: backend for backend in (Backend, Float32Backend, NumexprBackend, NumbaBackend)}
+_instances = {}
+
+
+def available_backends():
+    """Names of the backends usable in this environment, reference first."""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def backend_name(name=None):
+    """Resolve ``name``, ``$BEAMFORMING_BACKEND`` or ``auto`` to a concrete backend name."""
+    name = name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    if name == "auto":
+        return next(n for n in AUTO_PREFERENCE if BACKENDS[n].available())
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown compute backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if not BACKENDS[name].available():
+        raise ValueError(f"Compute backend {name!r} needs the {name} package, which is not installed")
+    return name
+
+
+def get_backend(name=None):
+    """Return the shared instance of backend ``name`` (see ``backend_name``)."""
+    name = backend_name(name)
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
@@ -0,0 +1,506 @@
+"""Local compute server: one process computes frames for many GUI and script clients.
+
+Usage:
+    python compute_server.py                                  # http://127.0.0.1:8765
+    python compute_server.py --listen unix:///tmp/beamforming.sock --cache-dir cache
+
+Clients POST a scenario (the ``scenarios/*.json`` schema, optionally with a
+``grid`` object and a ``backend``) or an explicit element list to ``/frame``.
+Requests that arrive within ``BATCH_WINDOW_MS`` of each other are evaluated as
+one batch on a single thread: identical configurations are computed once, and
+the rest run ordered by grid and geometry through shared ``FieldEngine``s, so
+requests that only differ in steering reuse the phasor basis.  All clients
+share one ``ResultCache``.
+
+Frames are sent in a binary framing (see ``encode_frame``) whose arrays are
+written straight from their buffers and read back as views of one receive
+buffer, so neither side copies or serializes the arrays.  ``ComputeClient`` is
+the matching client; the GUI renders through it when ``$BEAMFORMING_SERVER``
+is set.
+"""
+import argparse
+from collections import OrderedDict
+from concurrent.futures import Future
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import beam_engine
+import compute_backends
+from instrumentation import metrics
+from result_cache import ResultCache, config_key
+from scenario_io import check_element_values, scenario_from_dict
+
+SERVER_ENV = "BEAMFORMING_SERVER"  # URL of a compute server the GUI renders through
+DEFAULT_URL = "http://127.0.0.1:8765"
+BATCH_WINDOW_MS = 5  # Requests arriving this soon after the first one join its batch
+MAX_BATCH = 64
+MAX_FIELD_ENGINES = 4  # Grids whose FieldEngine (distance maps, phasor basis) is kept
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+MAX_GRID_SIZE = 4000  # Largest grid a request may ask for, the GUI's highest resolution
+CLIENT_TIMEOUT = 300  # s; a large grid on a busy server can take a while
+
+FRAME_MAGIC = b"BFRM"
+FRAME_VERSION = 1
+FRAME_PREFIX = struct.Struct("<4sHHI")  # magic, version, reserved, header length
+FRAME_ALIGNMENT = 64  # Every array starts at a multiple of this in the body
+FRAME_CONTENT_TYPE = "application/x-beamforming-frame"
+FRAME_ARRAYS = ("Waves_Sum", "Waves_Sum_normalized", "azimuth_angles", "Beam_Summation")
+
+
+def config_to_payload(config):
+    """JSON-serializable request for exactly ``config``, element by element."""
+    return {
+        "elements": {
+            "x": config.x_positions.tolist(),
+            "y": config.y_positions.tolist(),
+            "frequency": config.frequencies.tolist(),
+            "phase_offset": config.phase_offsets.tolist(),
+            "amplitude": config.amplitudes.tolist(),
+        },
+        "delay_deg": float(config.delay_deg),
+        "propagation_speed": float(config.propagation_speed),
+        "grid": {
+            "size": config.grid.size,
+            "x_extent": list(config.grid.x_extent),
+            "y_extent": list(config.grid.y_extent),
+        },
+        "backend": config.backend,
+    }
+
+
+def payload_to_config(payload):
+    """Build an ``ArrayConfig`` from a request: a scenario or an ``elements`` object."""
+    if not isinstance(payload, dict):
+        raise ValueError("A request must be a JSON object")
+    try:
+        grid = beam_engine.GridSpec(**payload.get("grid", {}))
+    except TypeError as e:
+        raise ValueError(f"Invalid grid: {e}") from e
+    if grid.size > MAX_GRID_SIZE:
+        raise ValueError(f"grid size must be at most {MAX_GRID_SIZE}, got {grid.size}")
+    if not np.isfinite(np.concatenate([grid.x_extent, grid.y_extent])).all():
+        raise ValueError("Grid extents must be finite")
+    propagation_speed = float(payload.get("propagation_speed", beam_engine.DEFAULT_PROPAGATION_SPEED))
+    if not np.isfinite(propagation_speed) or propagation_speed <= 0:
+        raise ValueError(f"propagation_speed must be positive, got {propagation_speed}")
+    elements = payload.get("elements")
+    if elements is None or "format_version" in payload:  # Version 2 scenarios have elements too
+        config = scenario_from_dict(payload).to_config(grid, propagation_speed)
+    else:
+        try:
+            config = beam_engine.ArrayConfig(
+                x_positions=elements["x"],
+                y_positions=elements["y"],
+                frequencies=elements["frequency"],
+                delay_deg=float(payload.get("delay_deg", 0.0)),
+                propagation_speed=propagation_speed,
+                grid=grid,
+                phase_offsets=elements.get("phase_offset"),
+                amplitudes=elements.get("amplitude"),
+            )
+            check_element_values(
+                {
+                    "x": config.x_positions,
+                    "y": config.y_positions,
+                    "frequency": config.frequencies,
+                    "phase_offset": config.phase_offsets,
+                    "amplitude": config.amplitudes,
+                }
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid elements: {e}") from e
+    if not np.isfinite(config.delay_deg):
+        raise ValueError(f"delay_deg must be finite, got {config.delay_deg}")
+    config.backend = payload.get("backend")
+    return config
+
+
+def _padding(offset):
+    return -offset % FRAME_ALIGNMENT
+
+
+def encode_frame(frame, **info):
+    """Return the buffers of ``frame`` in the binary framing and their total length.
+
+    The body is ``FRAME_PREFIX``, a JSON header (config payload, array dtypes, shapes
+    and offsets, plus ``info``) and padding, then the raw arrays.  Array offsets count
+    from the end of the padded header and are multiples of ``FRAME_ALIGNMENT``.  The
+    arrays are returned as memoryviews, not copies.
+    """
+    arrays = [np.ascontiguousarray(getattr(frame, name)) for name in FRAME_ARRAYS]
+    header = {"config": config_to_payload(frame.config), "arrays": [], **info}
+    offset = 0
+    buffers = []
+    for name, array in zip(FRAME_ARRAYS, arrays):
+        header["arrays"].append(
+            {"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        )
+        buffers.append(memoryview(array).cast("B"))
+        buffers.append(bytes(_padding(array.nbytes)))
+        offset += array.nbytes + _padding(array.nbytes)
+
+    header_bytes = json.dumps(header).encode()
+    header_end = FRAME_PREFIX.size + len(header_bytes)
+    prefix = FRAME_PREFIX.pack(FRAME_MAGIC, FRAME_VERSION, 0, len(header_bytes))
+    buffers[:0] = [prefix, header_bytes, bytes(_padding(header_end))]
+    return buffers, header_end + _padding(header_end) + offset
+
+
+def decode_frame(body):
+    """Return ``(frame, header)`` with the arrays as read-only views into ``body`` (uint8)."""
+    magic, version, _, header_length = FRAME_PREFIX.unpack_from(body)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"Not a version {FRAME_VERSION} beamforming frame")
+    header_end = FRAME_PREFIX.size + header_length
+    header = json.loads(bytes(body[FRAME_PREFIX.size : header_end]))
+    data_start = header_end + _padding(header_end)
+    arrays = {}
+    for spec in header["arrays"]:
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        array = np.frombuffer(body, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        array = array.reshape(spec["shape"])
+        array.flags.writeable = False
+        arrays[spec["name"]] = array
+    config = payload_to_config(header["config"])
+    return beam_engine.Frame(config, *(arrays[name] for name in FRAME_ARRAYS)), header
+
+
+class RequestBatcher:
+    """Evaluates submitted configs on one thread, a batch at a time.
+
+    ``submit`` returns a ``Future`` of ``(frame, cached)``.  The batch thread waits
+    ``window_ms`` after the first request of a batch for more to arrive, evaluates
+    each distinct configuration once and resolves every future asking for it.
+    """
+
+    def __init__(self, cache=None, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH, workers=None):
+        self.cache = ResultCache() if cache is None else cache
+        self.window = window_ms / 1e3
+        self.max_batch = max_batch
+        self.workers = workers
+        self.requests = 0
+        self.batches = 0
+        self.computed = 0
+        self._queue = queue.SimpleQueue()
+        self._engines = OrderedDict()  # GridSpec -> FieldEngine, least recently used first
+        self._thread = threading.Thread(target=self._run, name="beam-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, config):
+        future = Future()
+        self._queue.put((config, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"requests": self.requests, "batches": self.batches, "computed": self.computed}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Collect whatever else arrives within the window
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(item)
+            self._evaluate(batch)
+
+    def _engine(self, grid):
+        engine = self._engines.pop(grid, None)
+        if engine is None:
+            engine = beam_engine.FieldEngine(workers=self.workers)
+            if len(self._engines) >= MAX_FIELD_ENGINES:
+                self._engines.popitem(last=False)
+        self._engines[grid] = engine
+        return engine
+
+    def _evaluate(self, batch):
+        self.batches += 1
+        self.requests += len(batch)
+        metrics.count("server_batches")
+        metrics.count("server_requests", len(batch))
+        requests = {}  # key -> (config, futures)
+        for config, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                key = config_key(config)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            requests.setdefault(key, (config, []))[1].append(future)
+
+        def order(config):
+            # Same grid and geometry next to each other, so the engines see only steering changes
+            grid = config.grid
+            return (
+                grid.size,
+                grid.x_extent,
+                grid.y_extent,
+                config.x_positions.tobytes(),
+                config.y_positions.tobytes(),
+                config.frequencies.tobytes(),
+            )
+
+        with metrics.span("server_batch"):
+            for config, futures in sorted(requests.values(), key=lambda item: order(item[0])):
+                try:
+                    frame = self.cache.get(config)
+                    cached = frame is not None
+                    if not cached:
+                        frame = beam_engine.compute_frame(config, self._engine(config.grid))
+                        self.cache.put(frame)
+                        self.computed += 1
+                except Exception as e:
+                    logging.exception("Computing a requested frame failed")
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                for future in futures:
+                    future.set_result((frame, cached))
+
+
+class ComputeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients reuse one connection
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"No such endpoint {self.path}"})
+            return
+        self.send_json(
+            200,
+            {
+                "status": "ok",
+                "backends": compute_backends.available_backends(),
+                "default_backend": compute_backends.backend_name(),
+                "batcher": self.server.batcher.stats(),
+                "cache": self.server.batcher.cache.stats(),
+                "metrics": metrics.snapshot(),
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/frame":
+            self.send_json(404, {"error": f"No such endpoint {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_BYTES:
+            self.send_json(413, {"error": f"Request body over {MAX_REQUEST_BYTES} bytes"})
+            self.close_connection = True
+            return
+        try:
+            config = payload_to_config(json.loads(self.rfile.read(length)))
+            compute_backends.backend_name(config.backend)  # Unknown backends are the client's error
+        except ValueError as e:  # Also covers malformed JSON
+            self.send_json(400, {"error": str(e)})
+            return
+        try:
+            frame, cached = self.server.batcher.submit(config).result()
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        buffers, length = encode_frame(frame, cached=cached)
+        self.send_response(200)
+        self.send_header("Content-Type", FRAME_CONTENT_TYPE)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        for buffer in buffers:
+            self.wfile.write(buffer)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ComputeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher):
+        super().__init__(address, ComputeRequestHandler)
+        self.batcher = batcher
+
+
+class UnixComputeServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, batcher):
+        if os.path.exists(path):
+            os.unlink(path)  # Left over from a server that did not shut down cleanly
+        super().__init__(path, ComputeRequestHandler)
+        self.batcher = batcher
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def parse_url(url):
+    """Return ``("unix", path)`` or ``("tcp", (host, port))`` for a server URL."""
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return "unix", parts.path
+    if parts.scheme == "http":
+        return "tcp", (parts.hostname or "127.0.0.1", parts.port or 80)
+    raise ValueError(f"Compute server URLs start with http:// or unix://, got {url!r}")
+
+
+def create_server(url=DEFAULT_URL, batcher=None):
+    batcher = RequestBatcher() if batcher is None else batcher
+    kind, address = parse_url(url)
+    if kind == "unix":
+        return UnixComputeServer(address, batcher)
+    return ComputeServer(address, batcher)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ComputeClient:
+    """Blocking client of a compute server over one kept-alive connection (not thread-safe)."""
+
+    def __init__(self, url=None, timeout=CLIENT_TIMEOUT):
+        self.url = url or os.environ.get(SERVER_ENV) or DEFAULT_URL
+        kind, address = parse_url(self.url)
+        if kind == "unix":
+            self._connection = _UnixHTTPConnection(address, timeout)
+        else:
+            self._connection = http.client.HTTPConnection(*address, timeout=timeout)
+
+    def close(self):
+        self._connection.close()
+
+    def health(self):
+        return json.loads(self._request("GET", "/health").read())
+
+    def frame(self, config):
+        """Compute ``config`` on the server; the frame's arrays are read-only."""
+        return self._frame(config_to_payload(config))[0]
+
+    def scenario_frame(self, scenario, grid=None, backend=None):
+        """Compute a scenario (a dict in the ``scenarios/*.json`` schema).
+
+        Returns ``(frame, header)``; ``header["cached"]`` tells if the server had it.
+        """
+        payload = dict(scenario)
+        if grid is not None:
+            payload["grid"] = {"size": grid.size, "x_extent": grid.x_extent, "y_extent": grid.y_extent}
+        if backend is not None:
+            payload["backend"] = backend
+        return self._frame(payload)
+
+    def _frame(self, payload):
+        response = self._request("POST", "/frame", json.dumps(payload).encode())
+        # One receive buffer; the arrays of the frame are views into it
+        body = np.empty(int(response.getheader("Content-Length")), dtype=np.uint8)
+        view = memoryview(body)
+        received = 0
+        while received < len(body):
+            count = response.readinto(view[received:])
+            if not count:
+                raise ConnectionError("Compute server closed the connection mid-frame")
+            received += count
+        return decode_frame(body)
+
+    def _request(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            try:
+                self._connection.request(method, path, body, headers)
+                response = self._connection.getresponse()
+                break
+            except ConnectionError:
+                # The server closed an idle kept-alive connection; reconnect once
+                self._connection.close()
+                if attempt:
+                    raise
+        if response.status != 200:
+            message = json.loads(response.read()).get("error", response.reason)
+            if response.status == 400:
+                raise ValueError(message)
+            raise RuntimeError(f"Compute server error {response.status}: {message}")
+        return response
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--listen", default=DEFAULT_URL, help="http://host:port or unix:///path/to/socket"
+    )
+    parser.add_argument("--cache-dir", help="Share computed frames through this disk cache too")
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=BATCH_WINDOW_MS,
+        help="How long a batch waits for more requests",
+    )
+    parser.add_argument("--threads", type=int, help="Compute threads (default: all cores)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    metrics.enabled = True  # Reported by /health
+    batcher = RequestBatcher(
+        ResultCache(disk_dir=args.cache_dir), window_ms=args.batch_window_ms, workers=args.threads
+    )
+    server = create_server(args.listen, batcher)
+    logging.info(f"Serving beamforming frames on {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
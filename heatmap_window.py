@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import (
@@ -18,20 +17,55 @@ from PyQt5.QtWidgets import (
     QSlider,
     QLabel,
     QFrame,
+    QCheckBox,
+    QFileDialog,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QMessageBox,
+    QProgressDialog,
 )
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QElapsedTimer, Qt, QTimer
+from dataclasses import replace
 import sys
 import logging
-import json
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", filename='logging.log', filemode='w'
-)
+import beam_engine
+import compute_backends
+from antenna_array import MAX_ANTENNAS, AntennaArray
+from antenna_table_model import AntennaTableModel
+from beam_metrics import beam_metrics
+from compute_server import SERVER_ENV
+from instrumentation import METRICS_ENV, METRICS_FILE_ENV, metrics, start_queue_logging
+from plot_renderer import BeamProfilePlot, HeatmapPlot, save_heatmap
+from render_scheduler import AnimationExport, RenderScheduler
+from result_cache import config_key
+from scenario_io import load_scenario
+from wave_animation import ANIMATION_FPS, PERIODS_PER_SECOND
+
+# Configure logging; records are written by a background thread so slider events never wait on the file
+log_handler = logging.FileHandler("logging.log", mode="w")
+log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+start_queue_logging(log_handler)
 logger = logging.getLogger()
 
+METRICS_REFRESH_MS = 500  # Update interval of the status-bar overlay
+
+
+class TimedFigureCanvas(FigureCanvas):
+    """Figure canvas recording every full redraw as the span ``span_name``."""
+
+    def __init__(self, figure, span_name):
+        super().__init__(figure)
+        self.span_name = span_name
+
+    def draw(self):
+        # draw_idle ends up here too, so this is the real cost of a repaint
+        with metrics.span(self.span_name):
+            super().draw()
+
 class HeatMapWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -47,14 +81,37 @@ class HeatMapWindow(QMainWindow):
         self.propagation_speed = 100  # Default: Speed of light in m/s
         self.array_geometry = "Linear"  # Default array geometry
         self.curvature = 0.0  # Default curvature for curved array
-        self.antenna_frequencies = [
-            self.frequency
-        ] * self.num_antennas  # Default frequency for all antennas
-        self.antenna_positions = [
-            -2.25,-1.75,-1.25,-0.75,-0.25,0.25,0.75,1.25,1.75,2.25
-        ]
-        self.y_positions = [0.00] * self.num_antennas  # Initialize y positions
-        self.manual_position_update = False  # Flag to track manual position updates
+        # Positions, frequencies, phases and amplitudes of all antennas
+        self.antennas = AntennaArray(self.num_antennas, self.frequency)
+        self.antenna_model = AntennaTableModel(self.antennas)
+        self.antenna_model.antenna_edited.connect(self.update_antenna)
+        self.selected_antenna = None
+        # Positions come from the antenna table or a scenario file instead of the layout, until
+        # the geometry, spacing or curvature changes
+        self.custom_positions = False
+        self.grid_spec = beam_engine.GridSpec()  # Heatmap sampling grid
+        try:
+            self.backend = compute_backends.backend_name()  # $BEAMFORMING_BACKEND or numpy
+        except ValueError:
+            logging.exception("Falling back to the NumPy compute backend")
+            self.backend = compute_backends.DEFAULT_BACKEND
+        # Computes frames off the GUI thread, or fetches them from $BEAMFORMING_SERVER
+        server = os.environ.get(SERVER_ENV) or None
+        if server is not None:
+            logging.info(f"Rendering on the compute server at {server}")
+        self.render_scheduler = RenderScheduler(self, server=server)
+        self.render_scheduler.frame_ready.connect(self.show_frame)
+        self.render_scheduler.render_failed.connect(self.show_render_error)
+        self.current_frame = None  # Newest frame shown
+        self.pending_heatmap_export = None  # Path saved to once the full-resolution frame arrives
+
+        # Wave animation: the render worker attaches it to full-resolution frames
+        self.animation = None
+        self.animation_field = None
+        self.animation_clock = QElapsedTimer()
+        self.animation_timer = QTimer(self)
+        self.animation_timer.timeout.connect(self.advance_animation)
+        self.animation_export = None  # Running AnimationExport
 
         self.initUI()
 
@@ -72,25 +129,32 @@ class HeatMapWindow(QMainWindow):
         heatmap_layout = QHBoxLayout()
         heatmap_frame.setLayout(heatmap_layout)
         self.heatmap_fig = Figure()
-        self.heatmap_canvas = FigureCanvas(self.heatmap_fig)
+        self.heatmap_canvas = TimedFigureCanvas(self.heatmap_fig, "heatmap_draw")
         heatmap_layout.addWidget(self.heatmap_canvas)
 
         profile_frame = QFrame()
         profile_frame.setObjectName("profile_frame")
         profile_frame.setMinimumWidth(800)
-        profile_layout = QHBoxLayout()
+        profile_layout = QVBoxLayout()
         profile_layout.setContentsMargins(0, 0, 0, 0)  
         profile_layout.setSpacing(0)  
         profile_frame.setLayout(profile_layout)
 
         self.profile_fig = Figure()
-        self.profile_canvas = FigureCanvas(self.profile_fig)
+        self.profile_canvas = TimedFigureCanvas(self.profile_fig, "profile_draw")
         self.profile_canvas.setContentsMargins(
             0, 0, 0, 0
         )
         profile_layout.addWidget(self.profile_canvas)
+        self.beam_metrics_label = QLabel()  # Main-lobe direction, beamwidths and sidelobe level
+        self.beam_metrics_label.setAlignment(Qt.AlignCenter)
+        profile_layout.addWidget(self.beam_metrics_label)
         self.profile_fig.subplots_adjust(left=0.1, right=0.9, top=1.5, bottom=-0.5)
 
+        # Axes and artists are created once and only get new data per frame
+        self.heatmap_plot = HeatmapPlot(self.heatmap_fig, blit=True)
+        self.profile_plot = BeamProfilePlot(self.profile_fig)
+
         # Form layout for inputs
         from_frame = QFrame()
         from_frame.setObjectName("form_frame")
@@ -111,22 +175,19 @@ class HeatMapWindow(QMainWindow):
         self.ultrasound_button = QPushButton("Ultrasound")
         self.ultrasound_button.clicked.connect(lambda value: self.load_data_from_json(ultrasound_file_path))
 
+        # Any scenario file, e.g. one written by beam_solver.py
+        self.open_scenario_button = QPushButton("Open...")
+        self.open_scenario_button.clicked.connect(self.open_scenario)
+
         H_layout_buttons = QHBoxLayout()
         H_layout_buttons.addWidget(self._5g_button)
         H_layout_buttons.addWidget(self.tumor_button)
         H_layout_buttons.addWidget(self.ultrasound_button)
+        H_layout_buttons.addWidget(self.open_scenario_button)
 
         self.form_layout.addRow(H_layout_buttons)        
 
-        # Add antenna selector
-        self.antenna_selector = QComboBox()
-        self.antenna_selector.addItems(
-            [f"Antenna {i+1}" for i in range(self.num_antennas)]
-        )
-        self.antenna_selector.currentIndexChanged.connect(self.update_selected_antenna)
-        self.add_labeled_row("Select Antenna:", self.antenna_selector)
-
-        # Add position controls (x and y sliders)
+        # Add position controls (x and y sliders) for the antenna selected in the table
         self.x_position_slider = QDoubleSpinBox()
         self.x_position_slider.setRange(-10, 10)
         self.x_position_slider.setSingleStep(0.1)
@@ -148,33 +209,28 @@ class HeatMapWindow(QMainWindow):
             Qt.Orientation.Horizontal
         )  # Horizontal slider
         self.num_antennas_slider.setMinimum(1)
-        self.num_antennas_slider.setMaximum(10)
+        self.num_antennas_slider.setMaximum(MAX_ANTENNAS)
         self.num_antennas_slider.setValue(self.num_antennas)  
-        self.num_antennas_slider.setTickInterval(1)  
+        self.num_antennas_slider.setTickInterval(256)  
         self.num_antennas_slider.setTickPosition(
             QSlider.TicksBelow
         )  
 
-        # Label to display the current value of the slider
-        self.num_antennas_label = QLabel(
-            f"{self.num_antennas}"
-        )  
-        self.num_antennas_label.setObjectName("label_with_border")
-        self.num_antennas_label.setMinimumWidth(50)
-        self.num_antennas_label.setAlignment(Qt.AlignCenter)
+        # Spinbox showing the current value of the slider, for typing exact counts
+        self.num_antennas_spinbox = QSpinBox()
+        self.num_antennas_spinbox.setObjectName("label_with_border")
+        self.num_antennas_spinbox.setRange(1, MAX_ANTENNAS)
+        self.num_antennas_spinbox.setValue(self.num_antennas)
+        self.num_antennas_spinbox.setMinimumWidth(70)
+        self.num_antennas_spinbox.setAlignment(Qt.AlignCenter)
 
-        self.num_antennas_slider.valueChanged.connect(
-            lambda value: self.num_antennas_label.setText(f"{value}")
-        )
-        self.num_antennas_slider.valueChanged.connect(
-            self.generate_heatmap_and_profile
-        )  # Update heatmap and profile dynamically
-        self.num_antennas_slider.valueChanged.connect(lambda value: self.enable_disable_frequencies())
-        self.num_antennas_slider.valueChanged.connect(lambda value: self.disable_antenna_selector_item())
+        self.num_antennas_slider.valueChanged.connect(self.num_antennas_spinbox.setValue)
+        self.num_antennas_spinbox.valueChanged.connect(self.num_antennas_slider.setValue)
+        self.num_antennas_slider.valueChanged.connect(self.update_num_antennas)
 
         num_antennas_layout = QHBoxLayout()
         num_antennas_layout.addWidget(self.num_antennas_slider)
-        num_antennas_layout.addWidget(self.num_antennas_label)
+        num_antennas_layout.addWidget(self.num_antennas_spinbox)
         self.add_labeled_row("Number of Antennas:", num_antennas_layout)
 
         # Distance between antennas
@@ -197,6 +253,7 @@ class HeatMapWindow(QMainWindow):
         self.distance_slider.valueChanged.connect(
             lambda value: self.distance_label.setText(f"λ/{value}")
         )
+        self.distance_slider.valueChanged.connect(self.reset_antenna_positions)
         self.distance_slider.valueChanged.connect(
             self.generate_heatmap_and_profile
         )  # Update heatmap and profile dynamically
@@ -271,44 +328,84 @@ class HeatMapWindow(QMainWindow):
         self.curvature_slider.setValue(0)
         self.curvature_slider.setTickInterval(10)
         self.curvature_slider.valueChanged.connect(self.update_curvature)
+        self.curvature_slider.valueChanged.connect(self.reset_antenna_positions)
         self.curvature_slider.valueChanged.connect(
             self.generate_heatmap_and_profile
         )  # Update heatmap and profile dynamically
         self.curvature_slider.setDisabled(True)
         self.add_labeled_row("Curvature (0 = Flat): ", self.curvature_slider)
 
-        # Frequency controls for each antenna
-        self.frequency_controls = []
-        frequency_frame = QFrame()
-        frequency_frame.setObjectName("frequency_frame")
-        frequency_layout = QVBoxLayout(frequency_frame)
-        frequency_layout.setSpacing(10)
-
-        for i in range(self.num_antennas):
-            H_layout = QHBoxLayout()
-            spinbox = QDoubleSpinBox()
-            spinbox.setValue(self.frequency)  # Default frequency
-            spinbox.setSingleStep(1)
-            spinbox.setMaximum(1e20)
-            spinbox.setMinimum(1)
-            spinbox.valueChanged.connect(
-                lambda value, idx=i: self.update_antenna_frequency(idx, value)
-            )
-            self.frequency_controls.append(spinbox)
-            frequency_label = QLabel(f"Frequency of Antenna {i+1} (Hz):")
-            frequency_label.setObjectName("frequency_label")
-            frequency_label.setMaximumWidth(250)
-            H_layout.addWidget(frequency_label)
-            H_layout.addWidget(spinbox)
-            frequency_layout.addLayout(H_layout)
+        # Heatmap resolution; while a control is being dragged a coarse preview is shown
+        self.resolution_spinbox = QSpinBox()
+        self.resolution_spinbox.setRange(50, 4000)
+        self.resolution_spinbox.setSingleStep(100)
+        self.resolution_spinbox.setValue(self.grid_spec.size)
+        self.resolution_spinbox.valueChanged.connect(self.update_resolution)
+
+        self.progressive_checkbox = QCheckBox("Progressive")
+        self.progressive_checkbox.setChecked(self.render_scheduler.progressive)
+        self.progressive_checkbox.toggled.connect(self.toggle_progressive_rendering)
+
+        resolution_layout = QHBoxLayout()
+        resolution_layout.addWidget(self.resolution_spinbox)
+        resolution_layout.addWidget(self.progressive_checkbox)
+        self.add_labeled_row("Heatmap Resolution: ", resolution_layout)
+
+        # Field kernels; optional backends are only listed when their package is installed
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItems(compute_backends.available_backends())
+        self.backend_combo.setCurrentText(self.backend)
+        self.backend_combo.currentTextChanged.connect(self.update_backend)
+        self.add_labeled_row("Compute Backend: ", self.backend_combo)
+
+        self.animate_checkbox = QCheckBox("Animate")
+        self.animate_checkbox.toggled.connect(self.toggle_animation)
+        self.fps_spinbox = QSpinBox()
+        self.fps_spinbox.setRange(1, 60)
+        self.fps_spinbox.setValue(ANIMATION_FPS)
+        self.fps_spinbox.setSuffix(" fps")
+        self.fps_spinbox.valueChanged.connect(self.update_animation_fps)
+        animation_layout = QHBoxLayout()
+        animation_layout.addWidget(self.animate_checkbox)
+        animation_layout.addWidget(self.fps_spinbox)
+        self.add_labeled_row("Wave Animation: ", animation_layout)
+
+        # Per-antenna editor; the table view only creates and paints the visible rows
+        antenna_frame = QFrame()
+        antenna_frame.setObjectName("frequency_frame")
+        antenna_layout = QVBoxLayout(antenna_frame)
+        antennas_label = QLabel("Antennas:")
+        antennas_label.setObjectName("frequency_label")
+        antenna_layout.addWidget(antennas_label)
+        self.antenna_table = QTableView()
+        self.antenna_table.setModel(self.antenna_model)
+        self.antenna_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.antenna_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.antenna_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Fixed row heights keep scrolling independent of the number of rows
+        self.antenna_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.antenna_table.verticalHeader().setDefaultSectionSize(24)
+        self.antenna_table.setMinimumHeight(250)
+        self.antenna_table.selectionModel().currentRowChanged.connect(
+            lambda current, previous: self.update_selected_antenna(current.row())
+        )
+        antenna_layout.addWidget(self.antenna_table)
 
-        self.form_layout.addRow("Frequencies:", frequency_frame)
+        self.form_layout.addRow(antenna_frame)  # Spans both columns to fit all five table columns
 
         # Generate button
         generate_button = QPushButton("Update Heatmap and Beam Profile")
         generate_button.clicked.connect(self.generate_heatmap_and_profile)
         self.form_layout.addWidget(generate_button)
 
+        export_button = QPushButton("Export Heatmap")
+        export_button.clicked.connect(self.export_heatmap)
+        self.form_layout.addWidget(export_button)
+
+        self.export_animation_button = QPushButton("Export Animation")
+        self.export_animation_button.clicked.connect(self.export_animation)
+        self.form_layout.addWidget(self.export_animation_button)
+
         layout.addWidget(from_frame)
 
         # Add canvases to the layout
@@ -318,54 +415,52 @@ class HeatMapWindow(QMainWindow):
 
         layout.addLayout(canvases_layout)
 
+        self.setup_metrics_overlay()
+
         # Generate initial heatmap and beam profile
         self.generate_heatmap_and_profile()
 
-    def disable_antenna_selector_item(self): 
-        model = self.antenna_selector.model()
-
-        for index in range(len(self.frequency_controls)):
-            item = model.item(index)
-            if index < self.num_antennas_slider.value(): 
-                item.setEnabled(True)
-            else:
-                item.setEnabled(False)
-
-    def enable_disable_frequencies(self):
-        for i in range(len(self.frequency_controls)):
-            if i < self.num_antennas_slider.value():
-                self.frequency_controls[i].setDisabled(False)
-            else:
-                self.frequency_controls[i].setDisabled(True)
+    def update_num_antennas(self, value):
+        logging.info(f"Updating number of antennas to {value}")
+        self.antenna_model.resize(value)
+        if self.selected_antenna is not None and self.selected_antenna >= value:
+            self.update_selected_antenna(-1)
+        self.generate_heatmap_and_profile()
 
     def load_data_from_json(self, file_path):
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        distance = data["distance_m"]
-        delay = data["delay_deg"]
-        num_antennas = data["num_antennas"]
-        array_geometry = data["array_geometry"]
-        curvature = data["curvature"]
-
-        frequencies = data.get("frequencies", [])
-        for i, frequency in enumerate(frequencies):
-                self.frequency_controls[i].setValue(frequency)
-
-        if file_path == 'scenarios/tumor_ablation_scenario.json':
-            self.curvature_slider.setDisabled(False)
-
-        else: 
-            self.curvature_slider.setDisabled(True)
-        
-        self.array_geometry_combo.setCurrentText(array_geometry)
-        self.curvature_slider.setValue(curvature)
-        self.num_antennas_slider.setValue(num_antennas)
-        self.distance_slider.setValue(distance)
-        self.delay_slider.setValue(delay)
+        scenario = load_scenario(file_path)
+
+        self.num_antennas_slider.setValue(scenario.num_antennas)
+        self.antennas.set_column("frequency", scenario.antenna_frequencies)
+        self.antennas.set_column("phase_deg", scenario.antenna_phase_deg)
+        self.antennas.set_column("amplitude", scenario.antenna_amplitudes)
+        self.antenna_model.refresh_columns("frequency", "phase_deg", "amplitude")
+
+        self.array_geometry_combo.setCurrentText(scenario.array_geometry)
+        self.curvature_slider.setDisabled(scenario.array_geometry != "Curved")
+        self.curvature_slider.setValue(int(scenario.curvature))
+        self.distance_slider.setValue(int(scenario.distance_m))
+        self.delay_slider.setValue(int(scenario.delay_deg))
+
+        if scenario.explicit_positions:
+            # Kept like manual edits in the antenna table, instead of the layout
+            self.antennas.set_positions(scenario.x_positions, scenario.y_positions)
+            self.antenna_model.refresh_columns("x", "y")
+            self.custom_positions = True
+        else:
+            self.reset_antenna_positions()
 
         self.generate_heatmap_and_profile()
 
+    def open_scenario(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Scenario", "scenarios", "JSON Files (*.json)"
+        )
+        if not file_path:
+            return
+        logging.info(f"Opening scenario {file_path}")
+        self.load_data_from_json(file_path)
+
     def add_labeled_row(self, label_text, widget):
         logging.info(f"Adding labeled row: {label_text}")
         label_frame = QFrame()
@@ -382,250 +477,323 @@ class HeatMapWindow(QMainWindow):
         )
         self.form_layout.addRow(label_frame, widget)
     
+    def set_position_controls(self, x, y):
+        # Set silently; these only mirror the model here
+        for spinbox, value in ((self.x_position_slider, x), (self.y_position_slider, y)):
+            spinbox.blockSignals(True)
+            spinbox.setValue(value)
+            spinbox.blockSignals(False)
+
     def reset_antenna_positions(self):
         logging.info("Resetting antenna positions")
-        self.antenna_positions = [
-            -2.25,-1.75,-1.25,-0.75,-0.25,0.25,0.75,1.25,1.75,2.25
-        ]
-        self.y_positions = [0.00] * self.num_antennas
-        self.x_position_slider.setValue(0.00)
-        self.y_position_slider.setValue(0.00)
+        self.custom_positions = False  # The next render lays the antennas out again
+        self.set_position_controls(0.00, 0.00)
 
-    def update_selected_antenna(self):
+    def update_selected_antenna(self, index):
         logging.info("Updating selected antenna")
-        self.x_position_slider.setDisabled(False) # enable the x position spinbox
-        self.y_position_slider.setDisabled(False) # enable the y position spinbox
-        index = self.antenna_selector.currentIndex()
-        self.x_position_slider.setValue(self.antenna_positions[index])
-        self.y_position_slider.setValue(self.y_positions[index])
+        if index < 0:
+            self.selected_antenna = None
+            self.x_position_slider.setDisabled(True)
+            self.y_position_slider.setDisabled(True)
+            return
+        self.selected_antenna = index
+        editable = self.antenna_model.positions_editable
+        self.x_position_slider.setDisabled(not editable) # enable the x position spinbox
+        self.y_position_slider.setDisabled(not editable) # enable the y position spinbox
+        self.set_position_controls(self.antennas.x[index], self.antennas.y[index])
 
     def update_antenna_position(self):
         logging.info("Updating antenna position")
-        index = self.antenna_selector.currentIndex()
-        self.antenna_positions[index] = self.x_position_slider.value()
-        self.y_positions[index] = self.y_position_slider.value()
-        print(f"the y positions are now: {self.y_positions}")
-        self.manual_position_update = True  # Indicate manual update
+        index = self.selected_antenna
+        if index is None:
+            return
+        self.antennas.set(index, "x", self.x_position_slider.value())
+        self.antennas.set(index, "y", self.y_position_slider.value())
+        self.antenna_model.refresh_row(index)
+        self.custom_positions = True
         self.generate_heatmap_and_profile()
 
-    def update_antenna_frequency(self, index, value):
-        logging.info(f"Updating frequency of antenna {index + 1} to {value} Hz")
-        self.antenna_frequencies[index] = value
+    def update_antenna(self, index, column):
+        # An edit in the antenna table; only this element changed, so the engine
+        # updates the field incrementally
+        logging.info(f"Updating {column} of antenna {index + 1}")
+        if column in ("x", "y"):
+            self.custom_positions = True
+            if index == self.selected_antenna:
+                self.set_position_controls(self.antennas.x[index], self.antennas.y[index])
+        self.generate_heatmap_and_profile()
 
     def toggle_curvature_slider(self, value):
         logging.info(f"Toggling curvature slider: {value}")
         if value == "Curved":
             self.curvature_slider.setDisabled(False)
-            self.antenna_selector.setDisabled(True)
+            self.antenna_model.set_positions_editable(False)
             self.x_position_slider.setDisabled(True)
             self.y_position_slider.setDisabled(True)
             self.reset_antenna_positions()
         else:
             self.curvature_slider.setDisabled(True)
-            self.antenna_selector.setDisabled(False)
-            self.x_position_slider.setDisabled(False)
-            self.y_position_slider.setDisabled(False)
+            self.antenna_model.set_positions_editable(True)
+            self.x_position_slider.setDisabled(self.selected_antenna is None)
+            self.y_position_slider.setDisabled(self.selected_antenna is None)
             self.curvature = 0.0  # Reset curvature
             self.curvature_slider.setValue(0)  # Reset slider value
+            self.reset_antenna_positions()
 
     def update_curvature(self, value):
         logging.info(f"Updating curvature to {value}")
         self.curvature = value / 100  # Normalize curvature value
 
-    def plot_heatmap(self):
-        logging.info("Plotting heatmap")
-        # Clear the previous figure
-        self.heatmap_fig.clear()
-
-        ax = self.heatmap_fig.add_subplot(
-            111
-        )  # 111 means a single subplot in a 1x1 grid.
-
-        # Retrieve user inputs
-        num_antennas = self.num_antennas_slider.value()
-        distance_m = self.distance_slider.value()
-        delay_deg = self.delay_slider.value()
-        # frequency = self.frequency_spinbox.value()
-        frequency = max(self.antenna_frequencies)
-        speed = self.propagation_speed
-        array_geometry = self.array_geometry_combo.currentText()
-
-        # Calculate wave properties
-        wavelength = speed / frequency  # λ = propagation speed / f
-        if distance_m != 0:
-            distance_lambda = (1 / distance_m) * wavelength  # Distance in wavelengths
-        else:
-            distance_lambda = 0
-        k = 2 * np.pi / wavelength  # Wavenumber (2π/λ)
-        delay_rad = np.deg2rad(delay_deg)  # Convert delay from degrees to radians
-
-        # Generate grid for the heatmap
-        size = 500  # Grid size:  number of points along each axis (500x500 grid)
-        extent = 10  # Coordinate range (-extent to extent): the grid covers coordinates from -10 to 10
-        x = np.linspace(
-            -extent, extent, size
-        )  # Generates 500 equally spaced points between -10 and 10
-        y = np.linspace(0, 20, size)
-        self.X, self.Y = np.meshgrid(
-            x, y
-        )  # Creates two 2D arrays (self.X and self.Y) representing the x and y coordinates at each grid point
-
-        if not self.manual_position_update:
-            # Determine antenna x positions, evenly spaced and centered around 0
-            self.antenna_positions = np.linspace(
-                -((num_antennas - 1) * distance_lambda) / 2,
-                ((num_antennas - 1) * distance_lambda) / 2,
-                num_antennas,
+    def build_array_config(self):
+        # Snapshot the widget values into an engine config
+        if not self.custom_positions:
+            x_positions, y_positions = beam_engine.antenna_layout(
+                len(self.antennas),
+                self.distance_slider.value(),
+                np.max(self.antennas.frequency),
+                self.array_geometry_combo.currentText(),
+                self.curvature,
+                self.propagation_speed,
+                self.grid_spec.y_extent[1],
             )
-
-            if array_geometry == "Curved":
-                curvature = self.curvature
-                self.y_positions = 0.01 * np.max(self.Y) + curvature * (
-                    self.antenna_positions**2
-                )  # baseline Y-offset for all antennas + quadratic term which creates the parabolic curve
-            # elif array_geometry == "Downward Curved":
-            #     curvature = self.curvature
-            #     center_x_value = 0.00
-            #     self.y_positions = 0.01 * np.max(self.Y) - curvature * ((center_x_value - self.antenna_positions)**2)
-            else:
-                self.y_positions = np.full_like(
-                    self.antenna_positions, 0
-                )  # If linear, set all y positions to 0
-        else:
-            # Reset the flag after using the manually updated positions
-            self.manual_position_update = False
-
-        # Superimpose waves from all antennas (superposition principle)
-        self.Waves_Sum = np.zeros_like(
-            self.X
-        )  # a 2D array that contains the calculated wave amplitude values for each point on the grid
-
-
-        max_frequency = max(self.antenna_frequencies)
-
-        # Update the loop in the plot_heatmap method to use the individual frequencies:
-        for i, (x_pos, y_pos) in enumerate(
-            zip(self.antenna_positions, self.y_positions)
-        ):
-            frequency = self.antenna_frequencies[i]
-            wavelength = self.propagation_speed / frequency
-            k = 2 * np.pi / wavelength
-
-            # Normalize contribution based on frequency relative to max frequency
-            frequency_scaling = frequency / max_frequency
-
-            R = np.sqrt((self.X - x_pos) ** 2 + (self.Y - y_pos) ** 2)
-            phase_delay = -i * delay_rad
-
-            # self.Waves_Sum += np.sin(k * R + phase_delay) # Waves_Sum ->previously called Z<-
-            self.Waves_Sum += frequency_scaling * np.sin(k * R + phase_delay)
-
-
-        # Calculate wave amplitude with scaling
-        Waves_Sum = np.abs(self.Waves_Sum)  # Take absolute value
-        
-        # Apply logarithmic scaling
-        Waves_Sum_log = np.log1p(Waves_Sum) # log1p(x)=ln(1+x) to avoid zero values issue
-        
-        # Normalize to [0, 1] range
-        Waves_Sum_normalized = (Waves_Sum_log - Waves_Sum_log.min()) / (Waves_Sum_log.max() - Waves_Sum_log.min())
-
-        # Plot heatmap
-        heatmap = ax.imshow(
-            Waves_Sum_normalized, cmap="coolwarm", extent=[-extent, extent, 0, 20], origin="lower", vmin=-1, 
-        vmax=1 #, interpolation="gaussian"
-        )  # Displays the wave pattern (self.Waves_Sum) as a grayscale image.
-        self.heatmap_fig.colorbar(
-            heatmap, ax=ax, label="Intensity"
-        )  # Adds a color bar to show the scale.
-
-        # Plot antenna positions
-        ax.scatter(
-            self.antenna_positions,
-            self.y_positions,
-            color="blue",
-            s=50,
-            label="Antenna",
+            self.antennas.set_positions(x_positions, y_positions)
+            self.antenna_model.refresh_columns("x", "y")
+            if self.selected_antenna is not None:
+                index = self.selected_antenna
+                self.set_position_controls(self.antennas.x[index], self.antennas.y[index])
+
+        return self.antennas.to_config(
+            self.delay_slider.value(), self.propagation_speed, self.grid_spec, self.backend
         )
 
-        # Add labels and title
-        ax.legend()
-        self.heatmap_canvas.draw()
-
-    def plot_beam_profile(self):
-        logging.info("Plotting beam profile")
-        # Retrieve user inputs
-        num_antennas = self.num_antennas_slider.value()
-        distance_m = self.distance_slider.value()
-        delay_deg = self.delay_slider.value()
-        delay_rad = np.deg2rad(delay_deg)
-        # frequency = self.frequency_spinbox.value()
-        frequency = max(self.antenna_frequencies)
-        speed = self.propagation_speed
-        # distance_lambda = (1 / distance_m) * wavelength
-
-        self.profile_fig.clear()
-
-        # Calculate wave properties
-        wavelength = speed / frequency  # λ = propagation speed / f
-        # if distance_m != 0:
-        #     distance_lambda = (1 / distance_m) * wavelength  # Distance in wavelengths
-        # else:
-        #     distance_lambda = 0
-        k = 2 * np.pi / wavelength  # Wavenumber (2π/λ)
-        delay_rad = np.deg2rad(delay_deg)  # Convert delay from degrees to radians
-
-        # Create arrays to store individual antenna parameters
-        frequencies = self.antenna_frequencies
-        x_positions = self.antenna_positions  # Array for x positions
-        y_positions = self.y_positions  # Array for y positions
-        phases = np.zeros(num_antennas)  # Array for phase delays
-
-        for i, (x_pos, y_pos) in enumerate(
-            zip(self.antenna_positions, self.y_positions)
-        ):
-            phases[i] = -i * delay_rad
-
-        # Calculate beam pattern
-        azimuth_angles = np.linspace(0, 2 * np.pi, 360)
-        Beam_Summation = np.zeros_like(azimuth_angles, dtype=complex) # -> AF previously <-
-
-        for i in range(num_antennas):
-            # Convert Cartesian positions to polar coordinates
-            r = np.sqrt(x_positions[i] ** 2 + y_positions[i] ** 2)
-            theta = np.arctan2(y_positions[i], x_positions[i])
-            # Calculate phase term including both position components and frequency
-            phase_term = (
-                -k * (frequencies[i] / frequency) * r * np.cos(azimuth_angles - theta)
-                + phases[i]
-            )
-
-            Beam_Summation += np.exp(1j * phase_term)
+    def update_resolution(self, value):
+        logging.info(f"Updating heatmap resolution to {value}")
+        self.grid_spec = self.grid_spec.with_size(value)
+        self.generate_heatmap_and_profile()
 
-        # Plot the gain pattern on a polar graph
-        ax = self.profile_fig.add_subplot(111, polar=True)
-        ax.plot(azimuth_angles, np.abs(Beam_Summation))
-        # plt.show()
+    def update_backend(self, name):
+        try:
+            error = beam_engine.validate_backend(name)
+        except ValueError:
+            logging.exception(f"Not switching to compute backend {name}")
+            self.backend_combo.blockSignals(True)
+            self.backend_combo.setCurrentText(self.backend)  # Back to the working backend
+            self.backend_combo.blockSignals(False)
+            return
+        logging.info(f"Switching to compute backend {name} (relative error {error:.2g})")
+        self.backend = name
+        self.generate_heatmap_and_profile()
 
-        ax.set_yticklabels([])
+    def toggle_progressive_rendering(self, checked):
+        self.render_scheduler.progressive = checked
 
-        # Configure the polar plot to show only half the circle (0 to 180 degrees or 0 to π radians)
-        ax.set_theta_offset(0)  # Start at 0°
-        ax.set_theta_direction(1)  # Clockwise direction
-        ax.set_xlim([0, np.pi])  # Limit the visible angle range to 0 to π (half-circle)
+    def export_heatmap(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Heatmap", "heatmap.png", "PNG Images (*.png)"
+        )
+        if not file_path:
+            return
+        logging.info(f"Exporting heatmap to {file_path}")
+        self.pending_heatmap_export = file_path
+        if self.is_full_frame(self.current_frame):
+            self.save_pending_heatmap(self.current_frame)
+        else:
+            # Rendered by the render worker at the selected resolution, not the on-screen preview
+            self.render_scheduler.render_full()
+
+    def is_full_frame(self, frame):
+        config = self.current_config
+        return (
+            frame is not None
+            and frame.config.grid == config.grid
+            and config_key(frame.config) == config_key(config)
+        )
 
-        # Remove the upper half-circle and set the limits to the bottom half only
-        ax.set_ylim(
-            0, np.max(np.abs(Beam_Summation))
-        )  # Optionally adjust the radial limits if needed
+    def save_pending_heatmap(self, frame):
+        file_path, self.pending_heatmap_export = self.pending_heatmap_export, None
+        try:
+            save_heatmap(frame, file_path)
+        except OSError as e:
+            logging.exception("Heatmap export failed")
+            QMessageBox.warning(self, "Export Heatmap", f"Could not save {file_path}:\n{e}")
+
+    def toggle_animation(self, checked):
+        if checked:
+            self.animation_clock.start()
+            self.update_animation_fps(self.fps_spinbox.value())
+            self.animation_timer.start()
+        else:
+            self.animation_timer.stop()
+            self.animation = None  # Frees the complex field
+            if self.current_frame is not None:
+                self.current_frame = replace(self.current_frame, animation=None)
+                self.plot_heatmap(self.current_frame)
+        self.render_scheduler.set_animation(checked)
+
+    def update_animation_fps(self, fps):
+        self.animation_timer.setInterval(round(1000 / fps))
+
+    def advance_animation(self):
+        # Preview frames carry no animation and stay static until the full frame arrives
+        if self.animation is None:
+            return
+        if self.animation_field is None or self.animation_field.shape != self.animation.grid.shape:
+            self.animation_field = np.empty(self.animation.grid.shape)
+        # Slowed down to PERIODS_PER_SECOND, the waves are far too fast to follow in real time
+        elapsed = self.animation_clock.elapsed() / 1000
+        t = elapsed * PERIODS_PER_SECOND * self.animation.period
+        with metrics.span("animation_frame"):
+            field = self.animation.normalized_frame(t, out=self.animation_field)
+        self.heatmap_plot.show_field(field)
+
+    def export_animation(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Animation",
+            "animation.npy",
+            "NumPy frames (*.npy);;MP4 video, needs ffmpeg (*.mp4)",
+        )
+        if not file_path:
+            return
+        fps = self.fps_spinbox.value()
+        num_frames = round(fps / PERIODS_PER_SECOND)  # One period of the highest frequency
+        logging.info(f"Exporting {num_frames} animation frames to {file_path}")
+        # Written on its own thread; the window stays usable and shows the progress
+        self.export_progress = QProgressDialog(
+            f"Exporting {num_frames} frames to {os.path.basename(file_path)}", None, 0, num_frames, self
+        )
+        self.export_progress.setWindowTitle("Export Animation")
+        self.export_progress.setMinimumDuration(0)
+        self.export_animation_button.setEnabled(False)
+        self.animation_export = AnimationExport(self.current_config, file_path, num_frames, fps)
+        self.animation_export.progress.connect(self.show_export_progress)
+        self.animation_export.finished.connect(self.animation_export_done)
+        self.animation_export.failed.connect(self.animation_export_failed)
+        self.animation_export.start()
+
+    def show_export_progress(self, frames_written, num_frames):
+        self.export_progress.setValue(frames_written)
+
+    def animation_export_done(self, file_path):
+        logging.info(f"Exported the animation to {file_path}")
+        self.close_animation_export()
+
+    def animation_export_failed(self, message):
+        file_path = self.animation_export.path
+        self.close_animation_export()
+        QMessageBox.warning(self, "Export Animation", f"Could not export {file_path}:\n{message}")
+
+    def close_animation_export(self):
+        self.animation_export.wait()
+        self.animation_export = None
+        self.export_progress.close()
+        self.export_animation_button.setEnabled(True)
+
+    def plot_heatmap(self, frame):
+        logging.info("Plotting heatmap")
+        self.Waves_Sum = frame.Waves_Sum
+        self.heatmap_plot.update(frame)
 
-        # Add labels and title
-        # ax.set_title("Beam Profile)")
-        # ax.legend()
-        self.profile_canvas.draw()
+    def plot_beam_profile(self, frame):
+        logging.info("Plotting beam profile")
+        self.profile_plot.update(frame)
+        values = beam_metrics(frame.azimuth_angles, frame.Beam_Summation)
+        self.beam_metrics_label.setText(
+            f"Peak {values['peak_deg']:.1f}° | HPBW {values['hpbw_deg']:.1f}° | "
+            f"FNBW {values['fnbw_deg']:.1f}° | SLL {values['sll_db']:.1f} dB | "
+            f"D {values['directivity_db']:.1f} dB"
+        )
 
     def generate_heatmap_and_profile(self):
         logging.info("Generating heatmap and profile")
-        self.plot_heatmap()
-        self.plot_beam_profile()
+        # Rendering happens on the scheduler's worker thread; show_frame draws the result
+        self.current_config = self.build_array_config()
+        self.render_scheduler.request(self.current_config)
+
+    def show_frame(self, frame):
+        if not self.animation_timer.isActive():
+            frame = replace(frame, animation=None)  # Queued before the animation was stopped
+        self.current_frame = frame
+        self.animation = frame.animation
+        self.plot_heatmap(frame)
+        self.plot_beam_profile(frame)
+        if self.animation_timer.isActive():
+            self.advance_animation()  # Replaces the static image right away
+        if self.pending_heatmap_export is not None and self.is_full_frame(frame):
+            self.save_pending_heatmap(frame)
+        if self.render_error_label.isVisible():
+            self.render_error_label.hide()
+            self.metrics_label.show()
+            self.statusBar().setVisible(metrics.enabled)
+
+    def show_render_error(self, message):
+        # The heatmap and profile still show the last frame that rendered
+        self.render_error_label.setText(f"Rendering failed, showing the previous frame: {message}")
+        self.render_error_label.show()
+        self.metrics_label.hide()
+        self.statusBar().setVisible(True)
+        if self.pending_heatmap_export is not None:
+            file_path, self.pending_heatmap_export = self.pending_heatmap_export, None
+            QMessageBox.warning(self, "Export Heatmap", f"Could not render {file_path}:\n{message}")
+
+    def setup_metrics_overlay(self):
+        # Live stage timings and counters in the status bar; BEAMFORMING_METRICS=0 turns them off
+        metrics.enabled = os.environ.get(METRICS_ENV, "1") != "0"
+        self.metrics_label = QLabel()
+        self.statusBar().addPermanentWidget(self.metrics_label, 1)
+        save_metrics_button = QPushButton("Save Metrics")
+        save_metrics_button.clicked.connect(self.save_metrics)
+        self.statusBar().addPermanentWidget(save_metrics_button)
+        self.statusBar().setVisible(metrics.enabled)
+        # Shown in place of the timings while the newest render has failed
+        self.render_error_label = QLabel()
+        self.render_error_label.setStyleSheet("color: red")
+        self.render_error_label.hide()
+        self.statusBar().insertPermanentWidget(0, self.render_error_label, 1)
+
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(METRICS_REFRESH_MS)
+        self.metrics_timer.timeout.connect(self.update_metrics_overlay)
+        if metrics.enabled:
+            self.metrics_timer.start()
+
+    def update_metrics_overlay(self):
+        snapshot = metrics.snapshot()
+        spans, counters = snapshot["spans"], snapshot["counters"]
+        timings = [
+            f"{label} {spans[name]['median_ms']:.1f} ms"
+            for name, label in (
+                ("render", "render"),
+                ("superposition", "field"),
+                ("normalization", "normalize"),
+                ("beam_pattern", "profile"),
+                ("imshow", "imshow"),
+                ("animation_frame", "animation"),
+                ("heatmap_blit", "blit"),
+                ("heatmap_draw", "heatmap draw"),
+                ("profile_draw", "profile draw"),
+            )
+            if name in spans
+        ]
+        totals = (
+            f"{counters.get('renders', 0)} renders, "
+            f"{counters.get('dropped_frames', 0)} dropped, "
+            f"cache {counters.get('cache_hits', 0)} hits / {counters.get('cache_misses', 0)} misses"
+        )
+        self.metrics_label.setText("  |  ".join(timings + [totals]))
 
+    def save_metrics(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Metrics", "metrics.json", "JSON Files (*.json)"
+        )
+        if file_path:
+            metrics.dump(file_path)
+
+    def closeEvent(self, event):
+        self.render_scheduler.shutdown()
+        if self.animation_export is not None:
+            self.animation_export.wait()  # Leaves a complete file behind
+        metrics_file = os.environ.get(METRICS_FILE_ENV)
+        if metrics_file:
+            metrics.dump(metrics_file)
+        super().closeEvent(event)
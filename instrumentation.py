@@ -0,0 +1,143 @@
+"""Timing spans and counters for the render pipeline, plus non-blocking logging.
+
+``metrics.span("superposition")`` times a block and ``metrics.count("renders")``
+bumps a counter.  Both return immediately while ``metrics.enabled`` is False (a
+disabled span is a shared no-op context manager), so the calls stay in the hot
+paths; the GUI enables them for its status-bar overlay.  ``metrics.snapshot()``
+and ``metrics.dump(path)`` expose everything in machine-readable form.
+"""
+from collections import deque
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import threading
+import time
+
+METRICS_ENV = "BEAMFORMING_METRICS"  # "0" turns the GUI's instrumentation off
+METRICS_FILE_ENV = "BEAMFORMING_METRICS_FILE"  # The GUI dumps its metrics here on exit
+RECENT_SPANS = 64  # Durations kept per span for the rolling median
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SPANS)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "mean_ms": self.total / self.count * 1e3,
+            "median_ms": statistics.median(self.recent) * 1e3,  # Of the last RECENT_SPANS
+            "last_ms": self.recent[-1] * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class Instrumentation:
+    """Thread-safe collection of span timings and counters."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        """Context manager timing its block as span ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats()
+            stats.add(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "spans": {name: stats.as_dict() for name, stats in self._spans.items()},
+                "counters": dict(self._counters),
+            }
+
+    def dump(self, path):
+        """Write ``snapshot()`` as JSON (atomically, so readers never see a partial file)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+        os.replace(tmp_path, path)
+
+
+metrics = Instrumentation()
+
+
+def start_queue_logging(handler, level=logging.INFO):
+    """Route the root logger through a queue to ``handler`` on a background thread.
+
+    Log calls then only enqueue the record, so formatting and file writes no longer
+    happen on the thread that logs.  The listener is flushed and stopped at exit.
+    """
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,128 @@
+"""Persistent matplotlib artists for the heatmap and beam profile.
+
+The axes, image, colorbar, scatter and polar line are created once; each new
+frame only swaps their data.  Only matplotlib is needed here (no Qt), so the
+same plots can be drawn on an off-screen Agg figure by headless tools.
+"""
+import numpy as np
+
+from instrumentation import metrics
+
+
+class HeatmapPlot:
+    """Heatmap image with colorbar and antenna markers.
+
+    With ``blit=True`` the image, markers and legend are animated artists: the static
+    parts (axes, colorbar) are cached after every full draw and each frame only
+    repaints the axes area.  Blitting needs an interactive canvas, so figures that are
+    saved to files should use the default ``blit=False``.
+    """
+
+    def __init__(self, fig, blit=False):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.blit = blit and getattr(self.canvas, "supports_blit", False)
+        self._background = None
+
+        self.ax = fig.add_subplot(111)  # 111 means a single subplot in a 1x1 grid.
+        self.image = self.ax.imshow(
+            np.zeros((2, 2)),
+            cmap="coolwarm",
+            extent=[-10, 10, 0, 20],
+            origin="lower",
+            vmin=-1,
+            vmax=1,
+            animated=self.blit,
+        )
+        self.colorbar = fig.colorbar(self.image, ax=self.ax, label="Intensity")
+        self.scatter = self.ax.scatter(
+            [], [], color="blue", s=50, label="Antenna", animated=self.blit
+        )
+        # Fixed location, "best" would be computed against the empty placeholder data
+        self.legend = self.ax.legend(loc="upper right")
+        self.legend.set_animated(self.blit)  # Otherwise the blitted image covers it
+
+        if self.blit:
+            self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def update(self, frame):
+        config = frame.config
+        with metrics.span("imshow"):
+            self.image.set_data(frame.Waves_Sum_normalized)
+            extent = config.grid.imshow_extent
+            if list(self.image.get_extent()) != extent:
+                self.image.set_extent(extent)
+                self._background = None
+            self.scatter.set_offsets(np.column_stack([config.x_positions, config.y_positions]))
+        self.draw()
+
+    def show_field(self, field):
+        """Show ``field`` on the current grid and antennas, e.g. an animation frame."""
+        with metrics.span("imshow"):
+            self.image.set_data(field)
+        self.draw()
+
+    def draw(self):
+        if not self.blit or self._background is None:
+            # The draw_event handler captures the background and blits the artists
+            self.canvas.draw_idle()
+            return
+        with metrics.span("heatmap_blit"):
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.ax.bbox)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        self.ax.draw_artist(self.image)
+        self.ax.draw_artist(self.scatter)
+        self.ax.draw_artist(self.legend)
+
+
+class BeamProfilePlot:
+    """Half-circle polar plot of the array factor magnitude."""
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.ax = fig.add_subplot(111, polar=True)
+        (self.line,) = self.ax.plot([], [])
+
+        self.ax.set_yticklabels([])
+
+        # Configure the polar plot to show only half the circle (0 to 180 degrees or 0 to π radians)
+        self.ax.set_theta_offset(0)  # Start at 0°
+        self.ax.set_theta_direction(1)  # Clockwise direction
+        self.ax.set_xlim([0, np.pi])  # Limit the visible angle range to 0 to π (half-circle)
+
+    def update(self, frame):
+        magnitude = np.abs(frame.Beam_Summation)
+        self.line.set_data(frame.azimuth_angles, magnitude)
+        # The radial grid rescales with the peak, so the whole axes is redrawn
+        self.ax.set_ylim(0, max(float(np.max(magnitude)), np.finfo(float).tiny))
+        self.canvas.draw_idle()
+
+
+def save_heatmap(frame, path, dpi=200):
+    """Draw ``frame`` on an off-screen figure and save it, e.g. for high-resolution exports."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    HeatmapPlot(fig).update(frame)
+    fig.savefig(path, dpi=dpi)
+
+
+def save_beam_profile(frame, path, dpi=200):
+    """Draw the beam profile of ``frame`` on an off-screen figure and save it."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 5))
+    FigureCanvasAgg(fig)
+    BeamProfilePlot(fig).update(frame)
+    fig.savefig(path, dpi=dpi)
@@ -0,0 +1,273 @@
+"""Off-GUI-thread rendering of heatmap frames.
+
+Slider drags emit a ``valueChanged`` per mouse move.  Rendering each one
+synchronously on the GUI thread queues dozens of full recomputes, so the
+scheduler below coalesces requests, runs the engine in a worker QThread and
+hands only finished frames back to the GUI.
+"""
+from dataclasses import replace
+import logging
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+
+import beam_engine
+from compute_server import ComputeClient
+from instrumentation import metrics
+from result_cache import ResultCache, config_key
+from wave_animation import WaveAnimation, export_animation
+
+DEBOUNCE_MS = 15  # Requests arriving within this window are merged into one render
+SETTLE_MS = 250  # Quiet time after the last request before the full-resolution render
+MAX_FIELD_ENGINES = 2  # Preview and full-resolution grids each keep their own engine
+
+
+class RenderWorker(QObject):
+    finished = pyqtSignal(object, int)
+    failed = pyqtSignal(str, int)
+
+    def __init__(self, cache=None, server=None):
+        super().__init__()
+        self.field_engines = {}  # GridSpec -> FieldEngine, only ever touched from the worker thread
+        self.cache = cache
+        self.server = server  # Compute server URL; frames are computed there instead
+        self._client = None  # Created on the worker thread, which is the only one using it
+        self._animation = None  # Last WaveAnimation built, reused for an equal config
+        self._animation_key = None
+
+    def field_engine(self, grid):
+        # One engine per grid, so alternating preview and full renders keep their caches
+        engine = self.field_engines.pop(grid, None)
+        if engine is None:
+            engine = beam_engine.FieldEngine()
+            if len(self.field_engines) >= MAX_FIELD_ENGINES:
+                del self.field_engines[next(iter(self.field_engines))]
+        self.field_engines[grid] = engine
+        return engine
+
+    @pyqtSlot(object, int, bool)
+    def render(self, config, generation, animate):
+        try:
+            with metrics.span("render"):
+                frame = self._render(config)
+            if animate:
+                with metrics.span("animation_build"):
+                    # Attached to a copy, so cached frames don't hold on to the amplitudes
+                    frame = replace(frame, animation=self._wave_animation(config))
+        except Exception as e:
+            logging.exception("Rendering failed")
+            metrics.count("render_failures")
+            self.failed.emit(str(e), generation)
+            return
+        self.finished.emit(frame, generation)
+
+    def _render(self, config):
+        if self.cache is None:
+            return self._compute(config)
+        return self.cache.get_or_compute(config, self._compute)
+
+    @pyqtSlot()
+    def release_animation(self):
+        self._animation = self._animation_key = None
+
+    def _wave_animation(self, config):
+        key = config_key(config)
+        if key != self._animation_key:
+            self._animation = None  # Freed before the next one is built
+            engine = None if self.server is not None else self.field_engines.get(config.grid)
+            self._animation = WaveAnimation(config, field_engine=engine)
+            self._animation_key = key
+        return self._animation
+
+    def _compute(self, config):
+        if self.server is None:
+            return beam_engine.compute_frame(config, self.field_engine(config.grid))
+        if self._client is None:
+            self._client = ComputeClient(self.server)
+        return self._client.frame(config)
+
+
+class RenderScheduler(QObject):
+    """Runs at most one render at a time and always renders the newest request next.
+
+    ``request`` only records the config; requests that are superseded before the
+    worker picks them up are dropped without being computed.  Finished frames are
+    published through ``frame_ready`` on the GUI thread, unless a newer frame has
+    already been published; a render that fails is reported through ``render_failed``
+    in the same way.
+
+    In progressive mode every request is first rendered on a coarse
+    ``preview_size`` grid, and the requested grid is only rendered once no new
+    request has arrived for ``settle_ms``.
+
+    While ``animate`` is set (see ``set_animation``), full-resolution frames carry a
+    ``WaveAnimation`` built on the worker thread; preview frames never do.
+
+    With a ``server`` URL the worker fetches frames from that compute server (see
+    ``compute_server``) instead of computing them itself.
+    """
+
+    frame_ready = pyqtSignal(object)
+    render_failed = pyqtSignal(str)
+    _render_requested = pyqtSignal(object, int, bool)
+    _animation_stopped = pyqtSignal()
+
+    def __init__(
+        self,
+        parent=None,
+        debounce_ms=DEBOUNCE_MS,
+        progressive=True,
+        preview_size=beam_engine.PREVIEW_GRID_SIZE,
+        settle_ms=SETTLE_MS,
+        cache=None,
+        server=None,
+    ):
+        super().__init__(parent)
+        self.progressive = progressive
+        self.cache = ResultCache() if cache is None else cache  # Shared with the worker thread
+        self.preview_size = preview_size
+        self.generation = 0  # Increases with every render that is queued
+        self.published_generation = 0
+        self.dropped_frames = 0
+        self.animate = False
+        self._pending = None
+        self._latest = None  # Full-resolution config of the newest request
+        self._busy = False
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self._dispatch)
+
+        self._settle = QTimer(self)
+        self._settle.setSingleShot(True)
+        self._settle.setInterval(settle_ms)
+        self._settle.timeout.connect(self._refine)
+
+        self._thread = QThread(self)
+        self._worker = RenderWorker(self.cache, server)
+        self._worker.moveToThread(self._thread)
+        self._render_requested.connect(self._worker.render)
+        self._animation_stopped.connect(self._worker.release_animation)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.failed.connect(self._on_failed)
+        self._thread.start()
+
+    @property
+    def idle(self):
+        return (
+            not self._busy
+            and self._pending is None
+            and not self._debounce.isActive()
+            and not self._settle.isActive()
+        )
+
+    def request(self, config):
+        self._latest = config
+        metrics.count("render_requests")
+        if self.progressive and config.grid.size > self.preview_size:
+            self._queue(config.with_grid(config.grid.with_size(self.preview_size)))
+            self._settle.start()
+        else:
+            self._settle.stop()
+            self._queue(config, self.animate)
+        self._debounce.start()
+
+    def render_full(self):
+        """Render the newest request at full resolution now, without waiting for ``settle_ms``."""
+        if self._latest is not None:
+            self._settle.stop()
+            self._refine()
+
+    def set_animation(self, enabled):
+        """Attach animations to full-resolution frames; enabling re-renders the newest one."""
+        self.animate = enabled
+        if enabled:
+            self.render_full()
+        else:
+            self._animation_stopped.emit()
+
+    def shutdown(self):
+        self._debounce.stop()
+        self._settle.stop()
+        self._pending = None
+        self._thread.quit()
+        self._thread.wait()
+
+    def _queue(self, config, animate=False):
+        self.generation += 1
+        if self._pending is not None:
+            self.dropped_frames += 1  # Superseded before it was started
+            metrics.count("dropped_frames")
+        self._pending = (config, self.generation, animate)
+
+    def _refine(self):
+        if self._latest is not None:
+            self._queue(self._latest, self.animate)
+            self._dispatch()
+
+    def _dispatch(self):
+        if self._busy or self._pending is None:
+            return  # Picked up again when the running render finishes
+        config, generation, animate = self._pending
+        self._pending = None
+        self._busy = True
+        metrics.count("renders")
+        self._render_requested.emit(config, generation, animate)
+
+    def _on_finished(self, frame, generation):
+        self._busy = False
+        if generation > self.published_generation:
+            self.published_generation = generation
+            metrics.count("frames_published")
+            self.frame_ready.emit(frame)
+        else:
+            self.dropped_frames += 1
+            metrics.count("dropped_frames")
+        self._dispatch()
+
+    def _on_failed(self, message, generation):
+        self._busy = False
+        if generation > self.published_generation:
+            # The frame on screen is now older than the request that failed
+            self.published_generation = generation
+            self.render_failed.emit(message)
+        self._dispatch()
+
+
+class AnimationExport(QObject):
+    """Runs ``wave_animation.export_animation`` on its own thread.
+
+    ``progress`` reports the frames written so far and the total; exactly one of
+    ``finished`` (with the path) and ``failed`` (with the error) is emitted at the end.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, config, path, num_frames, fps):
+        super().__init__()
+        self.path = path
+        self._args = (config, path, num_frames, fps)
+        self._thread = QThread()
+        self.moveToThread(self._thread)
+        self._thread.started.connect(self._run)
+
+    def start(self):
+        self._thread.start()
+
+    def wait(self):
+        self._thread.wait()
+
+    @pyqtSlot()
+    def _run(self):
+        try:
+            with metrics.span("animation_export"):
+                export_animation(*self._args, progress=self.progress.emit)
+        except (OSError, ValueError) as e:  # E.g. a full disk, a bad path or no ffmpeg
+            logging.exception("Animation export failed")
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(self.path)
+        finally:
+            self._thread.quit()
@@ -0,0 +1,214 @@
+"""Memoization of computed frames keyed on the full array configuration.
+
+Switching between presets or returning a slider to an earlier value asks for
+a field that was already computed.  ``ResultCache`` keeps recent frames in a
+memory-bounded LRU and, optionally, in an on-disk tier of ``.npz`` files that
+survives restarts and can be shared between processes.
+"""
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+
+import beam_engine
+import compute_backends
+from instrumentation import metrics
+
+KEY_VERSION = 3  # Bump when the computation changes, so stale disk entries are ignored
+CACHE_BYTES = 256 * 1024 * 1024
+DISK_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def config_key(config, num_angles=beam_engine.NUM_PROFILE_ANGLES):
+    """Return a canonical hash of everything a frame of ``config`` depends on."""
+    digest = hashlib.sha1()
+    digest.update(f"v{KEY_VERSION}|{num_angles}|".encode())
+    for values in (
+        config.x_positions,
+        config.y_positions,
+        config.frequencies,
+        config.phase_offsets,
+        config.amplitudes,
+    ):
+        # + 0.0 turns -0.0 into 0.0 so both hash alike
+        digest.update(np.ascontiguousarray(values, dtype="<f8") + 0.0)
+        digest.update(b"|")
+    grid = config.grid
+    digest.update(
+        repr(
+            (
+                float(config.delay_deg) + 0.0,
+                float(config.propagation_speed),
+                compute_backends.backend_name(config.backend),
+                grid.size,
+                grid.x_extent,
+                grid.y_extent,
+            )
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+def _frame_arrays(frame):
+    return (frame.Waves_Sum, frame.Waves_Sum_normalized, frame.azimuth_angles, frame.Beam_Summation)
+
+
+def _frame_nbytes(frame):
+    return sum(array.nbytes for array in _frame_arrays(frame))
+
+
+class ResultCache:
+    """Thread-safe LRU of frames bounded by ``max_bytes``, with an optional disk tier.
+
+    Cached arrays are made read-only since the same frame is handed to every caller
+    that asks for an equal configuration.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES, disk_dir=None, max_disk_bytes=DISK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._frames = OrderedDict()  # key -> frame, least recently used first
+        self._lock = threading.Lock()
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._frames),
+            "nbytes": self.nbytes,
+        }
+
+    def get(self, config):
+        key = config_key(config)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                metrics.count("cache_hits")
+                return frame
+        frame = self._load(key, config)
+        with self._lock:
+            if frame is None:
+                self.misses += 1
+                metrics.count("cache_misses")
+                return None
+            self.disk_hits += 1
+            metrics.count("cache_disk_hits")
+            self._insert(key, frame)
+        return frame
+
+    def put(self, frame):
+        key = config_key(frame.config)
+        for array in _frame_arrays(frame):
+            array.flags.writeable = False
+        with self._lock:
+            self._insert(key, frame)
+        self._save(key, frame)
+
+    def get_or_compute(self, config, compute=beam_engine.compute_frame):
+        frame = self.get(config)
+        if frame is None:
+            frame = compute(config)
+            self.put(frame)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def _insert(self, key, frame):
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return
+        nbytes = _frame_nbytes(frame)
+        if nbytes > self.max_bytes:
+            return  # Would evict everything else and still not fit
+        self._frames[key] = frame
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self.nbytes -= _frame_nbytes(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".npz")
+
+    def _load(self, key, config):
+        if self.disk_dir is None:
+            return None
+        file_path = self._disk_path(key)
+        try:
+            with np.load(file_path) as data:
+                frame = beam_engine.Frame(
+                    config,
+                    data["Waves_Sum"],
+                    data["Waves_Sum_normalized"],
+                    data["azimuth_angles"],
+                    data["Beam_Summation"],
+                )
+            os.utime(file_path)  # Keeps the disk tier in least-recently-used order
+        except (OSError, KeyError, ValueError):
+            return None
+        for array in _frame_arrays(frame):
+            array.flags.writeable = False
+        return frame
+
+    def _save(self, key, frame):
+        if self.disk_dir is None:
+            return
+        file_path = self._disk_path(key)
+        if os.path.exists(file_path):
+            return
+        # Written under a temporary name so concurrent readers never see a partial file
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                np.savez(
+                    file,
+                    Waves_Sum=frame.Waves_Sum,
+                    Waves_Sum_normalized=frame.Waves_Sum_normalized,
+                    azimuth_angles=frame.azimuth_angles,
+                    Beam_Summation=frame.Beam_Summation,
+                )
+            os.replace(tmp_path, file_path)
+        except OSError:
+            logging.exception(f"Could not write cache entry {file_path}")
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                continue
+            total -= size
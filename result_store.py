@@ -0,0 +1,239 @@
+"""Chunked, memory-mapped on-disk storage for fields and beam patterns.
+
+A store is a directory holding ``index.json`` and fixed-size ``.npy`` chunk
+files.  ``index.json`` lists every entry with the scenario parameters it was
+computed from, so readers can find entries without touching the arrays, and
+the chunks are opened with ``np.load(mmap_mode="r")`` so slicing a result only
+reads the pages it needs.  Writers stream entries in one at a time, which keeps
+sweeps over thousands of high-resolution fields out of RAM.
+
+Layout::
+
+    store/
+        index.json
+        fields_00000.npy      (chunk_size, ny, nx)
+        patterns_00000.npy    (chunk_size, angles)
+"""
+import json
+import os
+
+import numpy as np
+
+import beam_engine
+from beam_metrics import METRIC_COLUMNS, VISIBLE_SECTOR, MetricsTable, beam_metrics
+
+STORE_VERSION = 1
+INDEX_FILE = "index.json"
+METRICS_FILE = "metrics.npz"  # Optional MetricsTable of the stored patterns
+DEFAULT_CHUNK_SIZE = 64
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ResultStore:
+    """Append-only writer and lazy reader of a result directory.
+
+    Create one with ``ResultStore.create`` (``dtype="float32"`` halves the size of the
+    field chunks and the complex patterns are then stored as complex64) or open an
+    existing one with ``ResultStore.open``.  Chunk files are allocated at their full
+    ``chunk_size`` up front; the unwritten tail of the last chunk stays sparse on disk.
+    """
+
+    def __init__(self, path, index, writable=False):
+        self.path = path
+        self.index = index
+        self.writable = writable
+        self._chunks = {}  # (kind, chunk number) -> memmap
+
+    @classmethod
+    def create(
+        cls,
+        path,
+        field_shape=None,
+        num_angles=None,
+        dtype="float64",
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+        if field_shape is None and num_angles is None:
+            raise ValueError("A store needs a field_shape, num_angles or both")
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(f"dtype must be float32 or float64, got {dtype}")
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileExistsError(f"{path} already contains a result store")
+        index = {
+            "version": STORE_VERSION,
+            "dtype": dtype.name,
+            "pattern_dtype": np.result_type(dtype, np.complex64).name,
+            "field_shape": list(field_shape) if field_shape is not None else None,
+            "num_angles": num_angles,
+            "chunk_size": chunk_size,
+            "entries": [],
+        }
+        store = cls(path, index, writable=True)
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        with open(os.path.join(path, INDEX_FILE), "r") as file:
+            index = json.load(file)
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported result store version {index.get('version')!r}")
+        return cls(path, index, writable=mode != "r")
+
+    def __len__(self):
+        return len(self.index["entries"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def entries(self):
+        return self.index["entries"]
+
+    def _chunk_file(self, kind, chunk):
+        return os.path.join(self.path, f"{kind}_{chunk:05d}.npy")
+
+    def _chunk(self, kind, chunk, create=False):
+        key = (kind, chunk)
+        if key not in self._chunks:
+            file_path = self._chunk_file(kind, chunk)
+            if create and not os.path.exists(file_path):
+                if kind == "fields":
+                    shape = (self.index["chunk_size"], *self.index["field_shape"])
+                    dtype = self.index["dtype"]
+                else:
+                    shape = (self.index["chunk_size"], self.index["num_angles"])
+                    dtype = self.index["pattern_dtype"]
+                self._chunks[key] = np.lib.format.open_memmap(
+                    file_path, mode="w+", dtype=dtype, shape=shape
+                )
+            else:
+                self._chunks[key] = np.load(file_path, mmap_mode="r+" if self.writable else "r")
+        return self._chunks[key]
+
+    def append(self, parameters, Waves_Sum=None, Beam_Summation=None):
+        """Write one result and return its entry number."""
+        if not self.writable:
+            raise PermissionError("Result store was opened read-only")
+        number = len(self)
+        chunk, offset = divmod(number, self.index["chunk_size"])
+        if self.index["field_shape"] is not None:
+            if Waves_Sum is None or list(np.shape(Waves_Sum)) != self.index["field_shape"]:
+                raise ValueError(f"Expected a field of shape {tuple(self.index['field_shape'])}")
+            self._chunk("fields", chunk, create=True)[offset] = Waves_Sum
+        if self.index["num_angles"] is not None:
+            if Beam_Summation is None or len(Beam_Summation) != self.index["num_angles"]:
+                raise ValueError(f"Expected a beam pattern of {self.index['num_angles']} angles")
+            self._chunk("patterns", chunk, create=True)[offset] = Beam_Summation
+
+        self.entries.append({"parameters": parameters, "chunk": chunk, "offset": offset})
+        if offset == self.index["chunk_size"] - 1:
+            self._close_chunk(chunk)
+        return number
+
+    def _close_chunk(self, chunk):
+        for kind in ("fields", "patterns"):
+            memmap = self._chunks.pop((kind, chunk), None)
+            if memmap is not None:
+                memmap.flush()
+        self.flush()
+
+    def flush(self):
+        """Write the index, atomically, so a partially written store stays readable."""
+        for memmap in self._chunks.values():
+            if self.writable:
+                memmap.flush()
+        tmp_path = os.path.join(self.path, INDEX_FILE + ".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self.index, file, default=_to_json)
+        os.replace(tmp_path, os.path.join(self.path, INDEX_FILE))
+
+    def close(self):
+        if self.writable:
+            self.flush()
+        self._chunks.clear()
+
+    def field(self, number):
+        """Return entry ``number``'s field as a memory-mapped view (no copy)."""
+        entry = self.entries[number]
+        return self._chunk("fields", entry["chunk"])[entry["offset"]]
+
+    def beam_pattern(self, number):
+        entry = self.entries[number]
+        return self._chunk("patterns", entry["chunk"])[entry["offset"]]
+
+    def parameters(self, number):
+        return self.entries[number]["parameters"]
+
+    def metrics_table(self, sector=VISIBLE_SECTOR):
+        """Return the beam metrics of all stored patterns as a ``MetricsTable``.
+
+        Patterns are read chunk by chunk from the memory maps; only the parameters that
+        are scalars in every entry become columns, next to an ``entry`` column.
+        """
+        if self.index["num_angles"] is None:
+            raise ValueError("This store holds no beam patterns")
+        azimuth_angles = np.linspace(0, 2 * np.pi, self.index["num_angles"])  # As computed
+        names = [
+            name
+            for name in (self.entries[0]["parameters"] if self.entries else {})
+            if all(np.ndim(entry["parameters"].get(name)) == 0 for entry in self.entries)
+            and all(entry["parameters"].get(name) is not None for entry in self.entries)
+        ]
+        columns = {"entry": np.arange(len(self))}
+        for name in names:
+            columns[name] = np.array([entry["parameters"][name] for entry in self.entries])
+
+        metrics = {name: np.empty(len(self)) for name in METRIC_COLUMNS}
+        for chunk in sorted({entry["chunk"] for entry in self.entries}):
+            numbers = [n for n, entry in enumerate(self.entries) if entry["chunk"] == chunk]
+            offsets = [self.entries[n]["offset"] for n in numbers]
+            patterns = self._chunk("patterns", chunk)[offsets]
+            for name, values in beam_metrics(azimuth_angles, patterns, sector).items():
+                metrics[name][numbers] = values
+        return MetricsTable({**columns, **metrics})
+
+    def find(self, **parameters):
+        """Return the entry numbers whose parameters match all given values."""
+        return [
+            number
+            for number, entry in enumerate(self.entries)
+            if all(entry["parameters"].get(key) == value for key, value in parameters.items())
+        ]
+
+
+def compute_to_store(items, path, dtype="float64", chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream fields and beam patterns of ``(parameters, ArrayConfig)`` pairs into a new store.
+
+    All configs must share one grid.  Only one field is held in memory at a time.
+    """
+    field_engine = beam_engine.FieldEngine()
+    store = None
+    try:
+        for parameters, config in items:
+            if store is None:
+                store = ResultStore.create(
+                    path,
+                    field_shape=config.grid.shape,
+                    num_angles=beam_engine.NUM_PROFILE_ANGLES,
+                    dtype=dtype,
+                    chunk_size=chunk_size,
+                )
+            _, Beam_Summation = beam_engine.compute_beam_pattern(config)
+            store.append(parameters, field_engine.compute(config), Beam_Summation)
+    finally:
+        if store is not None:
+            store.close()
+    return store
@@ -0,0 +1,314 @@
+"""Reading and writing scenario files into a model, independent of the GUI.
+
+Version 1 files (the bundled ``scenarios/*.json``) hold the layout scalars and a
+``frequencies`` list.  Version 2 files add ``"format_version": 2`` and an
+``elements`` table with any of the columns in ``ELEMENT_COLUMNS``, inline as
+lists or in a structured ``.npy`` sidecar next to the JSON that is memory-mapped
+on load (an ``.npz`` with one array per column is read as well):
+
+    {"format_version": 2, "num_antennas": 4096, "distance_m": 2, "delay_deg": 0,
+     "array_geometry": "Linear", "curvature": 0, "elements": {"file": "panel.elements.npy"}}
+
+Missing columns take their defaults.  With ``x`` and ``y`` the element positions
+are explicit instead of the Linear/Curved layout.  Keys outside ``SCHEMA`` are
+ignored, so the compute server can send its own next to a scenario.
+"""
+from dataclasses import dataclass, field, replace
+from numbers import Real
+import json
+import os
+
+import numpy as np
+
+import beam_engine
+
+ARRAY_GEOMETRIES = ("Linear", "Curved")
+CURVATURE_SCALE = 100  # Scenario curvature is stored in curvature-slider units (0-100)
+FORMAT_VERSION = 2
+ELEMENT_COLUMNS = ("x", "y", "z", "frequency", "phase_deg", "amplitude")
+INLINE_ELEMENTS = 64  # Longer element tables are saved to a sidecar by default
+SIDECAR_SUFFIX = ".elements.npy"
+V1_COLUMNS = {"frequencies": "frequency", "phase_deg": "phase_deg", "amplitudes": "amplitude"}
+
+# Key: (type, required).  Version 1 files may also carry per-element lists.
+SCHEMA = {
+    "format_version": (int, False),
+    "num_antennas": (int, True),
+    "distance_m": (Real, True),
+    "delay_deg": (Real, True),
+    "array_geometry": (str, True),
+    "curvature": (Real, True),
+    "frequencies": (list, False),
+    "phase_deg": (list, False),
+    "amplitudes": (list, False),
+    "elements": (dict, False),
+}
+
+
+@dataclass
+class Scenario:
+    num_antennas: int
+    distance_m: float
+    delay_deg: float = 0
+    array_geometry: str = "Linear"
+    curvature: float = 0  # In slider units, see CURVATURE_SCALE
+    # Per-element values as lists or element-table columns; shorter ones are padded with defaults
+    frequencies: list = field(default_factory=list)
+    phase_deg: list = field(default_factory=list)  # Per-element phase offsets in degrees
+    amplitudes: list = field(default_factory=list)
+    x_positions: np.ndarray = None  # Explicit element positions (m); None uses the layout
+    y_positions: np.ndarray = None
+    z_positions: np.ndarray = None  # Out of the heatmap plane, for array_3d
+    name: str = ""
+
+    def __post_init__(self):
+        if self.num_antennas < 1:
+            raise ValueError(f"num_antennas must be at least 1, got {self.num_antennas}")
+        if self.array_geometry not in ARRAY_GEOMETRIES:
+            raise ValueError(
+                f"array_geometry must be one of {ARRAY_GEOMETRIES}, got {self.array_geometry!r}"
+            )
+        if (self.x_positions is None) != (self.y_positions is None):
+            raise ValueError("x_positions and y_positions must be given together")
+        for name in ("x_positions", "y_positions", "z_positions"):
+            values = getattr(self, name)
+            if values is not None and len(values) != self.num_antennas:
+                raise ValueError(f"Expected {self.num_antennas} {name}, got {len(values)}")
+
+    def _per_antenna(self, values, default):
+        # Antennas without an explicit value use the simulator default
+        column = np.full(self.num_antennas, float(default))
+        given = np.asarray(values[: self.num_antennas], dtype=float)
+        column[: len(given)] = given
+        return column
+
+    @property
+    def antenna_frequencies(self):
+        return self._per_antenna(self.frequencies, beam_engine.DEFAULT_FREQUENCY)
+
+    @property
+    def antenna_phase_deg(self):
+        return self._per_antenna(self.phase_deg, 0.0)
+
+    @property
+    def antenna_amplitudes(self):
+        return self._per_antenna(self.amplitudes, 1.0)
+
+    @property
+    def explicit_positions(self):
+        return self.x_positions is not None
+
+    def element_columns(self):
+        """The element table as saved: frequencies plus every column that was given."""
+        columns = {"frequency": self.antenna_frequencies}
+        if len(self.phase_deg):
+            columns["phase_deg"] = self.antenna_phase_deg
+        if len(self.amplitudes):
+            columns["amplitude"] = self.antenna_amplitudes
+        if self.explicit_positions:
+            columns["x"] = np.asarray(self.x_positions, dtype=float)
+            columns["y"] = np.asarray(self.y_positions, dtype=float)
+        if self.z_positions is not None:
+            columns["z"] = np.asarray(self.z_positions, dtype=float)
+        return {name: columns[name] for name in ELEMENT_COLUMNS if name in columns}
+
+    def to_config(self, grid=None, propagation_speed=beam_engine.DEFAULT_PROPAGATION_SPEED):
+        if self.explicit_positions:
+            return beam_engine.ArrayConfig(
+                self.x_positions,
+                self.y_positions,
+                self.antenna_frequencies,
+                self.delay_deg,
+                propagation_speed,
+                grid or beam_engine.GridSpec(),
+                phase_offsets=np.deg2rad(self.antenna_phase_deg),
+                amplitudes=self.antenna_amplitudes,
+            )
+        config = beam_engine.ArrayConfig.from_layout(
+            self.num_antennas,
+            self.distance_m,
+            self.antenna_frequencies,
+            delay_deg=self.delay_deg,
+            array_geometry=self.array_geometry,
+            curvature=self.curvature / CURVATURE_SCALE,
+            propagation_speed=propagation_speed,
+            grid=grid,
+        )
+        if not len(self.phase_deg) and not len(self.amplitudes):
+            return config
+        return replace(
+            config,
+            phase_offsets=np.deg2rad(self.antenna_phase_deg),
+            amplitudes=self.antenna_amplitudes,
+        )
+
+
+def load_scenario(file_path):
+    """Load a version 1 or 2 scenario file; sidecar element tables are memory-mapped."""
+    with open(file_path, "r") as file:
+        data = json.load(file)
+
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return scenario_from_dict(
+        data,
+        name,
+        source=f"scenario file {file_path}",
+        base_dir=os.path.dirname(os.path.abspath(file_path)),
+    )
+
+
+def scenario_from_dict(data, name="", source="scenario", base_dir=None):
+    """Build a ``Scenario`` from the parsed JSON of a scenario file.
+
+    Element sidecars are resolved relative to ``base_dir``; without it (e.g. for a
+    scenario posted to the compute server) only inline element tables are accepted.
+    """
+    try:
+        validate_scenario_dict(data)
+        num_antennas = data["num_antennas"]
+        if "elements" in data:
+            columns = read_element_table(data["elements"], base_dir)
+            _check_lengths(columns, num_antennas)
+        else:
+            # Version 1 per-element lists; may be shorter or longer than num_antennas
+            columns = {
+                column: [float(value) for value in data[key]]
+                for key, column in V1_COLUMNS.items()
+                if key in data
+            }
+        check_element_values(columns)
+        return Scenario(
+            num_antennas=num_antennas,
+            distance_m=data["distance_m"],
+            delay_deg=data["delay_deg"],
+            array_geometry=data["array_geometry"],
+            curvature=data["curvature"],
+            frequencies=columns.get("frequency", []),
+            phase_deg=columns.get("phase_deg", []),
+            amplitudes=columns.get("amplitude", []),
+            x_positions=columns.get("x"),
+            y_positions=columns.get("y"),
+            z_positions=columns.get("z"),
+            name=name,
+        )
+    except (KeyError, TypeError, ValueError, OSError) as e:
+        raise ValueError(f"Invalid {source}: {e}") from e
+
+
+def validate_scenario_dict(data):
+    """Check the keys and value types of a scenario object against ``SCHEMA``."""
+    if not isinstance(data, dict):
+        raise ValueError("A scenario must be a JSON object")
+    for key, (kind, required) in SCHEMA.items():
+        if key not in data:
+            if required:
+                raise ValueError(f"Missing key {key!r}")
+            continue
+        value = data[key]
+        if isinstance(value, bool) or not isinstance(value, kind):
+            raise ValueError(f"{key} must be of type {kind.__name__}, got {value!r}")
+    version = data.get("format_version", 1)
+    if not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported format_version {version}, this version reads 1 to {FORMAT_VERSION}"
+        )
+    if "elements" in data and version < 2:
+        raise ValueError("An elements table needs format_version 2")
+    if version >= 2 and any(key in data for key in ("frequencies", "phase_deg", "amplitudes")):
+        raise ValueError("Version 2 scenarios keep per-element values in the elements table")
+
+
+def read_element_table(elements, base_dir=None):
+    """Return the columns of an inline or sidecar element table as float arrays."""
+    if "file" not in elements:
+        unknown = set(elements) - set(ELEMENT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown element columns {sorted(unknown)}, expected {ELEMENT_COLUMNS}")
+        return {name: np.asarray(values, dtype=float) for name, values in elements.items()}
+    if set(elements) != {"file"}:
+        raise ValueError("An element sidecar reference must only hold 'file'")
+    if base_dir is None:
+        raise ValueError("Element sidecars can only be read from scenario files")
+    path = os.path.join(base_dir, elements["file"])
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=False) as data:
+            table = {name: data[name] for name in data.files}
+    else:
+        table = np.load(path, mmap_mode="r", allow_pickle=False)
+        if table.dtype.names is None:
+            raise ValueError(f"{path} must hold a structured array with the element columns")
+        table = {name: table[name] for name in table.dtype.names}
+    unknown = set(table) - set(ELEMENT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown element columns {sorted(unknown)} in {path}")
+    for name, values in table.items():
+        if values.dtype.kind != "f":
+            raise ValueError(f"Element column {name!r} in {path} must be floating point")
+    return table
+
+
+def _check_lengths(columns, num_antennas):
+    for name, values in columns.items():
+        if values.ndim != 1 or len(values) != num_antennas:
+            raise ValueError(
+                f"Element column {name!r} must have num_antennas={num_antennas} values, "
+                f"got shape {values.shape}"
+            )
+
+
+def check_element_values(columns):
+    """Raise ``ValueError`` unless every column is finite and frequencies are positive.
+
+    Shared by version 1 lists, version 2 columns and compute server element requests.
+    """
+    for name, values in columns.items():
+        if not np.isfinite(values).all():
+            raise ValueError(f"Element column {name!r} has non-finite values")
+    if "frequency" in columns and not (np.asarray(columns["frequency"]) > 0).all():
+        raise ValueError("Element frequencies must be positive")
+
+
+def scenario_to_dict(scenario, sidecar=None):
+    """The version 2 JSON object of ``scenario``.
+
+    The element table is inlined, or referenced as the file name ``sidecar``.
+    """
+    data = {
+        "format_version": FORMAT_VERSION,
+        "num_antennas": int(scenario.num_antennas),
+        "distance_m": float(scenario.distance_m),
+        "delay_deg": float(scenario.delay_deg),
+        "array_geometry": scenario.array_geometry,
+        "curvature": float(scenario.curvature),
+    }
+    if sidecar is None:
+        data["elements"] = {
+            name: values.tolist() for name, values in scenario.element_columns().items()
+        }
+    else:
+        data["elements"] = {"file": sidecar}
+    return data
+
+
+def save_scenario(scenario, file_path, sidecar=None):
+    """Write ``scenario`` as a version 2 file; return the paths written.
+
+    The element table goes to ``<file>.elements.npy`` next to it when ``sidecar``
+    is true, or by default when it has more than ``INLINE_ELEMENTS`` rows.
+    """
+    if sidecar is None:
+        sidecar = scenario.num_antennas > INLINE_ELEMENTS
+    written = [file_path]
+    sidecar_name = None
+    if sidecar:
+        columns = scenario.element_columns()
+        table = np.empty(scenario.num_antennas, dtype=[(name, "<f8") for name in columns])
+        for name, values in columns.items():
+            table[name] = values
+        sidecar_path = os.path.splitext(file_path)[0] + SIDECAR_SUFFIX
+        np.save(sidecar_path, table)
+        sidecar_name = os.path.basename(sidecar_path)
+        written.append(sidecar_path)
+    with open(file_path, "w") as file:
+        json.dump(scenario_to_dict(scenario, sidecar_name), file, indent=4)
+    return written
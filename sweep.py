@@ -0,0 +1,169 @@
+"""Beam-pattern parameter sweeps evaluated in batches.
+
+Every combination of the swept parameters is laid out the way the simulator
+lays out its Linear/Curved arrays, and the array factors of a whole batch of
+configurations are computed in one broadcast NumPy expression.
+"""
+from dataclasses import dataclass
+import itertools
+
+import numpy as np
+
+import beam_engine
+from beam_metrics import VISIBLE_SECTOR, MetricsTable, beam_metrics
+
+SWEEP_DIMS = ("delay_deg", "distance_m", "num_antennas", "frequency")
+SWEEP_BYTES = 64 * 1024 * 1024  # Memory budget of one batch of (configs x antennas x angles) terms
+
+
+@dataclass
+class SweepResult:
+    """Complex beam patterns labelled by the swept parameter values.
+
+    ``Beam_Summation`` has one axis per entry of ``dims`` followed by the angle axis;
+    ``coords`` maps each dimension name to its values.
+    """
+
+    dims: tuple
+    coords: dict
+    azimuth_angles: np.ndarray
+    Beam_Summation: np.ndarray
+
+    @property
+    def magnitude(self):
+        return np.abs(self.Beam_Summation)
+
+    def index(self, **values):
+        """Return the index tuple of the given coordinate values (others are kept whole)."""
+        index = []
+        for dim in self.dims:
+            if dim not in values:
+                index.append(slice(None))
+                continue
+            matches = [i for i, v in enumerate(self.coords[dim]) if np.array_equal(v, values[dim])]
+            if not matches:
+                raise KeyError(f"{values[dim]!r} is not a swept value of {dim}")
+            index.append(matches[0])
+        return tuple(index)
+
+    def sel(self, **values):
+        """Return the patterns at the given coordinate values, e.g. ``sel(delay_deg=30)``."""
+        return self.Beam_Summation[self.index(**values)]
+
+    def metrics_table(self, sector=VISIBLE_SECTOR):
+        """Return the beam metrics of every swept combination as a ``MetricsTable``.
+
+        Per-antenna ``frequency`` entries are labelled by their position in ``coords``.
+        """
+        grids = np.indices(self.Beam_Summation.shape[:-1])
+        columns = {}
+        for dim, grid in zip(self.dims, grids):
+            values = self.coords[dim]
+            if all(np.ndim(v) == 0 for v in values):
+                columns[dim] = np.asarray(values)[grid.ravel()]
+            else:
+                columns[f"{dim}_index"] = grid.ravel()
+        num_angles = len(self.azimuth_angles)
+        metrics = beam_metrics(
+            self.azimuth_angles, self.Beam_Summation.reshape(-1, num_angles), sector
+        )
+        return MetricsTable({**columns, **metrics})
+
+    def configs(self):
+        """Iterate over ``(parameters, pattern)`` for every swept combination."""
+        for index in itertools.product(*(range(len(self.coords[dim])) for dim in self.dims)):
+            parameters = {dim: self.coords[dim][i] for dim, i in zip(self.dims, index)}
+            yield parameters, self.Beam_Summation[index]
+
+
+def _frequency_table(frequency_values, max_antennas):
+    # Scalars mean the same frequency on every antenna, sequences are per antenna
+    table = np.empty((len(frequency_values), max_antennas))
+    for i, value in enumerate(frequency_values):
+        value = np.asarray(value, dtype=float)
+        if value.ndim == 0:
+            table[i] = value
+        elif len(value) >= max_antennas:
+            table[i] = value[:max_antennas]
+        else:
+            raise ValueError(
+                f"per-antenna frequency entries need at least {max_antennas} values, got {len(value)}"
+            )
+    return table
+
+
+def sweep_beam_patterns(
+    delay_deg=(0,),
+    distance_m=(2,),
+    num_antennas=(10,),
+    frequency=(beam_engine.DEFAULT_FREQUENCY,),
+    array_geometry="Linear",
+    curvature=0.0,
+    propagation_speed=beam_engine.DEFAULT_PROPAGATION_SPEED,
+    num_angles=beam_engine.NUM_PROFILE_ANGLES,
+    y_max=beam_engine.GridSpec().y_extent[1],
+    max_bytes=SWEEP_BYTES,
+):
+    """Evaluate the beam pattern for the Cartesian product of the swept parameters.
+
+    Each argument of ``SWEEP_DIMS`` is a sequence of values to sweep.  ``frequency``
+    entries are either a scalar used for all antennas or a per-antenna sequence.
+    """
+    coords = {
+        "delay_deg": np.asarray(delay_deg, dtype=float),
+        "distance_m": np.asarray(distance_m, dtype=float),
+        "num_antennas": np.asarray(num_antennas, dtype=int),
+        "frequency": list(frequency),
+    }
+    shape = tuple(len(coords[dim]) for dim in SWEEP_DIMS)
+    if coords["num_antennas"].min(initial=1) < 1:
+        raise ValueError("num_antennas values must be at least 1")
+    max_antennas = int(coords["num_antennas"].max(initial=1))
+    frequency_table = _frequency_table(coords["frequency"], max_antennas)
+
+    # One row per configuration, in C order over SWEEP_DIMS
+    d_idx, s_idx, n_idx, f_idx = (a.ravel() for a in np.indices(shape))
+    delay = coords["delay_deg"][d_idx]
+    distance = coords["distance_m"][s_idx]
+    count = coords["num_antennas"][n_idx]
+    frequencies = frequency_table[f_idx]  # (configs, antennas)
+
+    element = np.arange(max_antennas)
+    active = element < count[:, None]
+    reference_frequency = np.where(active, frequencies, -np.inf).max(axis=1)
+    wavelength = propagation_speed / reference_frequency
+    with np.errstate(divide="ignore"):
+        distance_lambda = np.where(distance != 0, wavelength / distance, 0.0)
+
+    # Same layout as beam_engine.antenna_layout: evenly spaced and centered around 0
+    x_positions = (element - (count[:, None] - 1) / 2) * distance_lambda[:, None]
+    if array_geometry == "Curved":
+        y_positions = 0.01 * y_max + curvature * x_positions**2
+    else:
+        y_positions = np.zeros_like(x_positions)
+    wavenumbers = 2 * np.pi * frequencies / propagation_speed
+    phases = -element * np.deg2rad(delay)[:, None]
+
+    azimuth_angles = np.linspace(0, 2 * np.pi, num_angles)
+    num_configs = len(delay)
+    Beam_Summation = np.empty((num_configs, num_angles), dtype=complex)
+    # Configurations with the same antenna count are batched together, so no padding is summed
+    for n in np.unique(count):
+        rows = np.flatnonzero(count == n)
+        batch = max(1, max_bytes // (n * num_angles * 16 * 2))
+        for b0 in range(0, len(rows), batch):
+            b = rows[b0 : b0 + batch]
+            Beam_Summation[b] = beam_engine.array_factor(
+                x_positions[b, :n],
+                y_positions[b, :n],
+                wavenumbers[b, :n],
+                phases[b, :n],
+                azimuth_angles,
+            )
+
+    return SweepResult(
+        dims=SWEEP_DIMS,
+        coords=coords,
+        azimuth_angles=azimuth_angles,
+        Beam_Summation=Beam_Summation.reshape(shape + (num_angles,)),
+    )
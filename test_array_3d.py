@@ -0,0 +1,62 @@
+"""3-D patterns against naive per-element sums and the 2-D beam profile."""
+import numpy as np
+import pytest
+
+import array_3d
+import beam_engine
+
+
+def naive_pattern(array, directions):
+    projection = directions @ array.positions.T
+    terms = array.amplitudes * np.exp(1j * (-array.wavenumbers * projection + array.phase_offsets))
+    return terms.sum(axis=-1)
+
+
+def test_pattern_3d_matches_naive_sum():
+    rng = np.random.default_rng(1)
+    array = array_3d.Array3D(
+        rng.uniform(-2, 2, (20, 3)),
+        rng.uniform(80, 120, 20),
+        rng.uniform(-np.pi, np.pi, 20),
+        rng.uniform(0.2, 1.0, 20),
+    )
+    azimuth_angles = np.linspace(0, 2 * np.pi, 73)
+    elevation_angles = np.linspace(-np.pi / 2, np.pi / 2, 37)
+    _, _, pattern = array_3d.pattern_3d(array, azimuth_angles, elevation_angles, block_bytes=4096)
+    directions = array_3d.direction_cosines(azimuth_angles, elevation_angles)
+    np.testing.assert_allclose(pattern, naive_pattern(array, directions), atol=1e-10)
+
+
+def test_elevation_zero_cut_is_the_beam_profile():
+    config = beam_engine.ArrayConfig.from_layout(16, 2, np.linspace(80, 120, 16), delay_deg=20)
+    azimuth_angles, profile = beam_engine.compute_beam_pattern(config, num_angles=721)
+    _, _, pattern = array_3d.pattern_3d(array_3d.Array3D.from_config(config), azimuth_angles, [0.0])
+    assert np.abs(pattern[0] - profile).max() < 1e-12 * np.abs(profile).max()
+
+
+@pytest.mark.parametrize("spacing_wavelengths", [0.5, 0.8])
+def test_ura_pattern_fft_matches_naive_sum(spacing_wavelengths):
+    wavelength = beam_engine.DEFAULT_PROPAGATION_SPEED / beam_engine.DEFAULT_FREQUENCY
+    array = array_3d.Array3D.rectangular(6, 4, spacing_m=spacing_wavelengths * wavelength)
+    rng = np.random.default_rng(2)
+    array.phase_offsets = rng.uniform(-np.pi, np.pi, array.num_antennas)
+    array.amplitudes = rng.uniform(0.2, 1.0, array.num_antennas)
+    pattern = array_3d.ura_pattern_fft(array)
+    assert pattern.axes == "xz"
+
+    # u along x, v along z, and the visible hemisphere on the +y side
+    u, v = np.meshgrid(pattern.u, pattern.v)
+    visible = pattern.visible
+    directions = np.stack([u, np.sqrt(np.clip(1 - u**2 - v**2, 0, None)), v], axis=-1)
+    reference = naive_pattern(array, directions[visible])
+    np.testing.assert_allclose(pattern.Beam_Summation[visible], reference, atol=1e-9)
+    assert np.isnan(pattern.Beam_Summation[~visible]).all()
+
+
+def test_uniform_lattice_rejects_holes_and_mixed_frequencies():
+    array = array_3d.Array3D.rectangular(3, 3)
+    assert array_3d.uniform_lattice(array.positions[:-1]) is None
+    assert array_3d.uniform_lattice(np.random.default_rng(3).uniform(size=(8, 3))) is None
+    mixed = array_3d.Array3D(array.positions, np.linspace(90, 110, 9))
+    with pytest.raises(ValueError):
+        array_3d.ura_pattern_fft(mixed)
@@ -0,0 +1,198 @@
+"""Field and beam-profile paths of beam_engine against naive per-element sums."""
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+import beam_engine
+import wave_animation
+
+GRID = beam_engine.GridSpec(size=60)
+
+
+def naive_field(config):
+    X, Y = config.grid.meshgrid()
+    field = np.zeros(config.grid.shape)
+    for x, y, k, w, phase in zip(
+        config.x_positions, config.y_positions, config.wavenumbers, config.weights, config.phases
+    ):
+        field += w * np.sin(k * np.hypot(X - x, Y - y) + phase)
+    return field
+
+
+def naive_array_factor(config, azimuth_angles):
+    projection = np.outer(np.cos(azimuth_angles), config.x_positions) + np.outer(
+        np.sin(azimuth_angles), config.y_positions
+    )
+    terms = config.amplitudes * np.exp(1j * (-config.wavenumbers * projection + config.phases))
+    return terms.sum(axis=1)
+
+
+def mixed_config(num_antennas=12, delay_deg=25, grid=GRID):
+    rng = np.random.default_rng(0)
+    config = beam_engine.ArrayConfig.from_layout(
+        num_antennas, 1.5, np.linspace(80, 120, num_antennas), delay_deg=delay_deg, grid=grid
+    )
+    return replace(
+        config,
+        phase_offsets=rng.uniform(-np.pi, np.pi, num_antennas),
+        amplitudes=rng.uniform(0.2, 1.0, num_antennas),
+    )
+
+
+def relative_error(field, reference, config):
+    return np.abs(field - reference).max() / np.abs(config.weights).sum()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("block_bytes", [beam_engine.BLOCK_BYTES, 4096])
+def test_superpose_matches_naive_sum(workers, block_bytes):
+    config = mixed_config()
+    x_axis, y_axis = config.grid.axes()
+    field = beam_engine.superpose(
+        x_axis,
+        y_axis,
+        config.x_positions,
+        config.y_positions,
+        config.wavenumbers,
+        config.weights,
+        config.phases,
+        block_bytes=block_bytes,
+        workers=workers,
+    )
+    assert relative_error(field, naive_field(config), config) < 1e-12
+
+
+def test_superpose_distances_matches_superpose():
+    config = mixed_config()
+    x_axis, y_axis = config.grid.axes()
+    distances = np.empty((config.num_antennas,) + config.grid.shape)
+    beam_engine.distance_maps(x_axis, y_axis, config.x_positions, config.y_positions, distances)
+    field = beam_engine.superpose_distances(
+        distances, config.wavenumbers, config.weights, config.phases, np.empty(config.grid.shape)
+    )
+    assert relative_error(field, naive_field(config), config) < 1e-12
+
+
+def test_phasor_basis_holds_cos_and_sin_of_kr():
+    config = mixed_config(num_antennas=5)
+    x_axis, y_axis = config.grid.axes()
+    basis = np.empty((10,) + config.grid.shape)
+    beam_engine.phasor_basis(
+        x_axis, y_axis, config.x_positions, config.y_positions, config.wavenumbers, basis
+    )
+    X, Y = config.grid.meshgrid()
+    for i in range(5):
+        kR = config.wavenumbers[i] * np.hypot(X - config.x_positions[i], Y - config.y_positions[i])
+        np.testing.assert_allclose(basis[i], np.cos(kR), atol=1e-12)
+        np.testing.assert_allclose(basis[5 + i], np.sin(kR), atol=1e-12)
+
+
+def field_engine_sequence(config):
+    # Steering, a moved antenna, a retuned antenna, new amplitudes and a new grid: every path
+    moved = config.x_positions.copy()
+    moved[3] += 0.4
+    retuned = config.frequencies.copy()
+    retuned[5] = 95.0
+    yield config
+    yield replace(config, delay_deg=60)
+    yield replace(config, delay_deg=-30)
+    yield replace(config, delay_deg=-30, x_positions=moved)
+    yield replace(config, delay_deg=-30, x_positions=moved, frequencies=retuned)
+    yield replace(config, delay_deg=10, amplitudes=config.amplitudes[::-1].copy())
+    yield replace(config, grid=config.grid.with_size(45))
+
+
+@pytest.mark.parametrize(
+    "engine_args",
+    [
+        {},
+        {"phasor_bytes": 0},
+        {"phasor_bytes": 0, "contribution_bytes": 0},
+        {"phasor_bytes": 0, "contribution_bytes": 0, "distance_bytes": 0},
+        {"workers": 3},
+    ],
+)
+def test_field_engine_matches_naive_sum_along_edits(engine_args):
+    engine = beam_engine.FieldEngine(**engine_args)
+    for config in field_engine_sequence(mixed_config()):
+        field = engine.compute(config)
+        assert relative_error(field, naive_field(config), config) < 1e-9
+
+
+def test_field_engine_uses_the_phasor_basis_for_steering():
+    engine = beam_engine.FieldEngine()
+    config = mixed_config()
+    engine.compute(config)
+    assert engine.cached_basis(config) is None  # Only built once steering changes
+    steered = replace(config, delay_deg=70)
+    engine.compute(steered)
+    assert engine.cached_basis(steered) is not None
+    assert engine.cached_basis(replace(steered, frequencies=steered.frequencies + 1)) is None
+
+
+def test_compute_frame_is_naive_sum_and_profile():
+    config = mixed_config()
+    frame = beam_engine.compute_frame(config)
+    assert relative_error(frame.Waves_Sum, naive_field(config), config) < 1e-12
+    reference = naive_array_factor(config, frame.azimuth_angles)
+    assert np.abs(frame.Beam_Summation - reference).max() < 1e-9 * config.amplitudes.sum()
+
+
+@pytest.mark.parametrize("delay_deg", [0, 37, 180])
+@pytest.mark.parametrize("tapered", [False, True])
+def test_linear_array_factor_matches_naive_sum(delay_deg, tapered):
+    config = beam_engine.ArrayConfig.from_layout(16, 0.7, [100.0] * 16, delay_deg=delay_deg)
+    if tapered:
+        config = replace(config, amplitudes=np.hanning(18)[1:-1])
+    azimuth_angles = np.linspace(0, 2 * np.pi, 4001)  # Hits broadside and endfire exactly
+    factor = beam_engine.linear_array_factor(
+        config.x_positions,
+        config.y_positions,
+        config.wavenumbers,
+        config.phases,
+        azimuth_angles,
+        config.amplitudes,
+    )
+    reference = naive_array_factor(config, azimuth_angles)
+    assert np.abs(factor - reference).max() < 1e-9 * config.amplitudes.sum()
+
+
+def test_linear_array_factor_rejects_other_arrays():
+    angles = np.linspace(0, np.pi, 10)
+    mixed = mixed_config()
+    assert (
+        beam_engine.linear_array_factor(
+            mixed.x_positions, mixed.y_positions, mixed.wavenumbers, mixed.phases, angles
+        )
+        is None
+    )
+    curved = beam_engine.ArrayConfig.from_layout(8, 1, [100.0] * 8, array_geometry="Curved", curvature=0.5)
+    assert (
+        beam_engine.linear_array_factor(
+            curved.x_positions, curved.y_positions, curved.wavenumbers, curved.phases, angles
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("max_bytes", [wave_animation.ANIMATION_BYTES, 1])
+def test_wave_animation_frames_are_the_field_at_time_t(max_bytes):
+    config = mixed_config()
+    animation = wave_animation.WaveAnimation(config, max_bytes=max_bytes, coarsen=False)
+    assert animation.stored == (max_bytes > 1)
+    t = 0.0037
+    shifted = replace(
+        config, phase_offsets=config.phase_offsets - 2 * np.pi * config.frequencies * t
+    )
+    tolerance = 1e-6 if animation.stored else 1e-12  # Stored amplitudes are float32
+    assert relative_error(animation.frame(t), naive_field(shifted), config) < tolerance
+    assert relative_error(animation.frame(0.0), naive_field(config), config) < tolerance
+
+
+def test_wave_animation_coarsens_to_fit_its_budget():
+    config = mixed_config(grid=beam_engine.GridSpec(size=400))
+    max_bytes = 2 * len(np.unique(config.frequencies)) * 4 * 150**2
+    animation = wave_animation.WaveAnimation(config, max_bytes=max_bytes)
+    assert animation.stored and animation.grid.size == 150
+    assert animation.amplitudes.nbytes <= max_bytes
@@ -0,0 +1,104 @@
+"""Compute server framing, request validation and a round trip over HTTP."""
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import beam_engine
+import compute_server
+
+GRID = beam_engine.GridSpec(size=40)
+
+
+def config():
+    return beam_engine.ArrayConfig.from_layout(6, 1.5, np.linspace(90, 110, 6), delay_deg=30, grid=GRID)
+
+
+def assert_frames_equal(frame, expected):
+    for name in compute_server.FRAME_ARRAYS:
+        np.testing.assert_array_equal(getattr(frame, name), getattr(expected, name))
+
+
+def test_payload_round_trip():
+    expected = config()
+    actual = compute_server.payload_to_config(compute_server.config_to_payload(expected))
+    for name in ("x_positions", "y_positions", "frequencies", "phase_offsets", "amplitudes"):
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+    assert actual.grid == expected.grid and actual.delay_deg == expected.delay_deg
+
+
+def test_frame_encoding_round_trip():
+    frame = beam_engine.compute_frame(config())
+    buffers, length = compute_server.encode_frame(frame, cached=False)
+    body = np.frombuffer(b"".join(bytes(buffer) for buffer in buffers), dtype=np.uint8)
+    assert len(body) == length
+    decoded, header = compute_server.decode_frame(body)
+    assert header["cached"] is False
+    assert_frames_equal(decoded, frame)
+    for spec in header["arrays"]:
+        assert spec["offset"] % compute_server.FRAME_ALIGNMENT == 0
+    assert not decoded.Waves_Sum.flags.writeable
+
+
+def test_decode_rejects_other_bodies():
+    with pytest.raises(ValueError):
+        compute_server.decode_frame(np.zeros(64, dtype=np.uint8))
+
+
+def elements(**columns):
+    return {"elements": {"x": [0, 0.1], "y": [0, 0], "frequency": [100, 100], **columns}}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [],
+        elements(frequency=[-5, float("nan")]),
+        elements(frequency=[100, 0]),
+        elements(x=[0, float("inf")]),
+        elements(amplitude=[1, float("nan")]),
+        elements(phase_offset=[0, float("-inf")]),
+        elements(frequency=[100]),
+        {"elements": {"x": [0], "frequency": [100]}},
+        {**elements(), "grid": {"size": compute_server.MAX_GRID_SIZE + 1}},
+        {**elements(), "grid": {"size": 1}},
+        {**elements(), "grid": {"x_extent": [0, float("nan")]}},
+        {**elements(), "grid": {"shape": 10}},
+        {**elements(), "delay_deg": float("nan")},
+        {**elements(), "propagation_speed": 0},
+        {"num_antennas": 2},
+    ],
+)
+def test_invalid_requests_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        compute_server.payload_to_config(payload)
+
+
+@pytest.fixture
+def server():
+    batcher = compute_server.RequestBatcher()
+    server = compute_server.create_server("http://127.0.0.1:0", batcher)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    batcher.close()
+
+
+def test_client_gets_the_local_frame(server):
+    client = compute_server.ComputeClient(server)
+    try:
+        expected = beam_engine.compute_frame(config())
+        assert_frames_equal(client.frame(config()), expected)
+        with open(os.path.join(os.path.dirname(__file__), "scenarios", "5g_scenario.json")) as file:
+            scenario = json.load(file)
+        _, header = client.scenario_frame(scenario, grid=GRID)
+        _, header = client.scenario_frame(scenario, grid=GRID)
+        assert header["cached"]
+        with pytest.raises(ValueError):
+            client._frame(elements(frequency=[-5, float("nan")]))  # Answered with 400
+    finally:
+        client.close()
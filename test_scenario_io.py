@@ -0,0 +1,92 @@
+"""Scenario files: version 1/2 loading, round trips and validation."""
+import json
+import os
+
+import numpy as np
+import pytest
+
+import beam_engine
+from scenario_io import Scenario, load_scenario, save_scenario, scenario_from_dict
+
+SCENARIOS = os.path.join(os.path.dirname(__file__), "scenarios")
+LAYOUT = {"num_antennas": 4, "distance_m": 2, "delay_deg": 10, "array_geometry": "Linear", "curvature": 0}
+
+
+def v2(elements, **keys):
+    return {"format_version": 2, **LAYOUT, "elements": elements, **keys}
+
+
+def test_version_1_lists_are_padded_with_defaults():
+    scenario = scenario_from_dict({**LAYOUT, "frequencies": [90, 110], "amplitudes": [0.5]})
+    np.testing.assert_array_equal(
+        scenario.antenna_frequencies, [90, 110, beam_engine.DEFAULT_FREQUENCY, beam_engine.DEFAULT_FREQUENCY]
+    )
+    np.testing.assert_array_equal(scenario.antenna_amplitudes, [0.5, 1, 1, 1])
+    np.testing.assert_array_equal(scenario.antenna_phase_deg, [0, 0, 0, 0])
+
+
+def test_bundled_scenarios_load():
+    for name in ("5g_scenario", "tumor_ablation_scenario", "ultrasound_scenario"):
+        config = load_scenario(os.path.join(SCENARIOS, f"{name}.json")).to_config()
+        assert config.num_antennas >= 1
+
+
+@pytest.mark.parametrize("sidecar", [False, True])
+def test_version_2_round_trip(tmp_path, sidecar):
+    rng = np.random.default_rng(4)
+    scenario = Scenario(
+        num_antennas=4,
+        distance_m=2,
+        delay_deg=10,
+        frequencies=rng.uniform(80, 120, 4),
+        phase_deg=rng.uniform(-180, 180, 4),
+        amplitudes=rng.uniform(0.1, 1, 4),
+        x_positions=rng.uniform(-5, 5, 4),
+        y_positions=rng.uniform(0, 1, 4),
+        z_positions=rng.uniform(-1, 1, 4),
+    )
+    path = str(tmp_path / "panel.json")
+    written = save_scenario(scenario, path, sidecar=sidecar)
+    assert len(written) == (2 if sidecar else 1)
+    loaded = load_scenario(path)
+    for name, values in scenario.element_columns().items():
+        np.testing.assert_array_equal(loaded.element_columns()[name], values)
+    expected, actual = scenario.to_config(), loaded.to_config()
+    for name in ("x_positions", "y_positions", "frequencies", "phase_offsets", "amplitudes"):
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+
+
+def test_npz_sidecar(tmp_path):
+    np.savez(tmp_path / "panel.npz", frequency=np.full(4, 90.0), x=np.arange(4.0), y=np.zeros(4))
+    (tmp_path / "panel.json").write_text(json.dumps(v2({"file": "panel.npz"})))
+    config = load_scenario(str(tmp_path / "panel.json")).to_config()
+    np.testing.assert_array_equal(config.x_positions, np.arange(4.0))
+    np.testing.assert_array_equal(config.frequencies, np.full(4, 90.0))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        v2({"frequency": [100, 100, 100]}),  # Column shorter than num_antennas
+        v2({"frequency": [100, 100, 100, -1]}),
+        v2({"frequency": [100, 100, 100, 0]}),
+        v2({"amplitude": [1, 1, 1, float("nan")]}),
+        v2({"x": [0, 1, 2, float("inf")], "y": [0, 0, 0, 0]}),
+        v2({"x": [0, 1, 2, 3]}),  # x without y
+        v2({"colour": [1, 2, 3, 4]}),
+        v2({"frequency": [100] * 4}, frequencies=[100] * 4),  # Version 1 list in a version 2 file
+        {**LAYOUT, "elements": {"frequency": [100] * 4}},  # Element table without format_version 2
+        {**LAYOUT, "frequencies": [100, float("nan")]},
+        {**LAYOUT, "frequencies": [100, 0]},
+        {**LAYOUT, "phase_deg": [float("inf")]},
+        {**LAYOUT, "num_antennas": 0},
+        {**LAYOUT, "array_geometry": "Spiral"},
+        {**LAYOUT, "distance_m": "2"},
+        {key: value for key, value in LAYOUT.items() if key != "delay_deg"},
+        {**LAYOUT, "format_version": 3},
+        v2({"file": "panel.npy"}),  # Sidecars need a scenario file to resolve against
+    ],
+)
+def test_invalid_scenarios_raise_value_error(data):
+    with pytest.raises(ValueError):
+        scenario_from_dict(data)
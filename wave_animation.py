@@ -0,0 +1,241 @@
+"""Time-domain animation of the field from a precomputed complex amplitude.
+
+Each element radiates ``w sin(k R + phase - ω t)``, which at ``t = 0`` is the static
+heatmap.  Grouping the elements by frequency, the field of a group is
+``Re(A e^{-jωt})`` with the complex amplitude
+``A = sum w sin(k R + phase) - j sum w cos(k R + phase)``, so ``A`` is computed once
+per configuration and every animation frame is one matrix-vector product over the
+stored amplitudes.
+
+The amplitudes take two grids per distinct frequency, so they are kept within
+``ANIMATION_BYTES``, which also bounds the work per frame.  When they don't fit the
+animation grid is coarsened, or, if that would go below ``MIN_ANIMATION_GRID`` or
+is not allowed, every frame is superposed from scratch on the full grid.
+"""
+import os
+
+import numpy as np
+
+import beam_engine
+
+ANIMATION_FPS = 30
+PERIODS_PER_SECOND = 1.0  # Playback speed: periods of the highest frequency per wall-clock second
+ANIMATION_BYTES = 64 * 1024 * 1024  # Memory budget of the amplitudes, which bounds the work per frame
+ANIMATION_DTYPE = np.float32  # Storage of the amplitudes; frames are returned in float64
+MIN_ANIMATION_GRID = beam_engine.PREVIEW_GRID_SIZE  # Coarsest grid the amplitudes are stored on
+
+
+class WaveAnimation:
+    """Frames of the field of ``config`` over time, on ``grid``.
+
+    ``frame(t)`` returns the field at time ``t`` (s); ``normalized_frame(t)`` a
+    sign-preserving log scale in [-1, 1] with one fixed scale for all frames, so the
+    colours don't flicker as the wavefronts move.
+
+    ``grid`` is ``config.grid``, or a coarser one if the amplitudes don't fit
+    ``max_bytes`` and ``coarsen`` is set.  ``stored`` is False when frames are
+    superposed on demand instead.  A ``field_engine`` that has just computed
+    ``config`` lends its phasor basis or distance maps to the amplitudes.
+    """
+
+    def __init__(
+        self, config, workers=None, max_bytes=ANIMATION_BYTES, coarsen=True, field_engine=None
+    ):
+        self.config = config
+        self.frequencies, self._groups = np.unique(config.frequencies, return_inverse=True)
+        self.omegas = 2 * np.pi * self.frequencies
+        self._workers = beam_engine.default_workers() if workers is None else workers
+        num_groups = len(self.frequencies)
+        row_bytes = 2 * num_groups * np.dtype(ANIMATION_DTYPE).itemsize  # Per grid point
+
+        size = config.grid.size
+        if row_bytes * size**2 > max_bytes and coarsen:
+            size = int(np.sqrt(max_bytes / row_bytes))
+        self.stored = row_bytes * size**2 <= max_bytes and size >= min(
+            MIN_ANIMATION_GRID, config.grid.size
+        )
+        self.grid = config.grid.with_size(size) if self.stored else config.grid
+
+        if self.stored:
+            # Re(A) rows of every group followed by their Im(A) rows
+            self.amplitudes = np.empty((2 * num_groups,) + self.grid.shape, dtype=ANIMATION_DTYPE)
+            self._coefficients = np.empty(2 * num_groups, dtype=ANIMATION_DTYPE)
+            self._frame = np.empty(self.grid.shape, dtype=ANIMATION_DTYPE)
+            basis = None
+            if field_engine is not None and self.grid == config.grid:
+                basis = field_engine.cached_basis(config)
+            if basis is not None:
+                self._amplitudes_from_basis(basis)
+            else:
+                self._fill_groups(field_engine if self.grid == config.grid else None)
+            envelope = np.zeros(self.grid.shape)
+            for group in range(num_groups):
+                envelope += np.hypot(self.amplitudes[group], self.amplitudes[num_groups + group])
+        else:
+            self.amplitudes = None
+            envelope = np.zeros(self.grid.shape)
+            for real, imag in self._group_amplitudes(None):
+                envelope += np.hypot(real, imag)
+
+        # No frame can exceed the sum of the group envelopes
+        self.peak = max(float(envelope.max()), np.finfo(float).tiny)
+        self._log_peak = np.log1p(self.peak)
+
+    @property
+    def period(self):
+        """Period of the highest frequency (s)."""
+        return 1 / self.frequencies.max()
+
+    def _amplitudes_from_basis(self, basis):
+        # sin(k R + phase) = sin(phase) cos(k R) + cos(phase) sin(k R) and
+        # -cos(k R + phase) = -cos(phase) cos(k R) + sin(phase) sin(k R), per group
+        config = self.config
+        num_groups, num_antennas = len(self.frequencies), config.num_antennas
+        weighted_sin = config.weights * np.sin(config.phases)
+        weighted_cos = config.weights * np.cos(config.phases)
+        coefficients = np.zeros((2 * num_groups, 2 * num_antennas))
+        elements = np.arange(num_antennas)
+        coefficients[self._groups, elements] = weighted_sin
+        coefficients[self._groups, num_antennas + elements] = weighted_cos
+        coefficients[num_groups + self._groups, elements] = -weighted_cos
+        coefficients[num_groups + self._groups, num_antennas + elements] = weighted_sin
+        np.matmul(
+            coefficients.astype(basis.dtype),
+            basis.reshape(2 * num_antennas, -1),
+            out=self.amplitudes.reshape(2 * num_groups, -1),
+            casting="same_kind",
+        )
+
+    def _fill_groups(self, field_engine):
+        num_groups = len(self.frequencies)
+        for group, (real, imag) in enumerate(self._group_amplitudes(field_engine)):
+            self.amplitudes[group] = real
+            self.amplitudes[num_groups + group] = imag
+
+    def _group_amplitudes(self, field_engine):
+        # Yields Re(A) and Im(A) of each frequency group in turn; the arrays are reused
+        config = self.config
+        x_axis, y_axis = self.grid.axes()
+        wavenumbers, weights, phases = config.wavenumbers, config.weights, config.phases
+        distances = None
+        if field_engine is not None:
+            distances = field_engine.distances.lookup(
+                self.grid, config.x_positions, config.y_positions, build=False
+            )
+        real = np.empty(self.grid.shape)
+        imag = np.empty(self.grid.shape)
+        for group in range(len(self.frequencies)):
+            elements = np.flatnonzero(self._groups == group)
+            k, w, phase = wavenumbers[elements], weights[elements], phases[elements]
+            # sin(k R + phase) and, a quarter period ahead, cos(k R + phase)
+            for out, shift in ((real, 0.0), (imag, np.pi / 2)):
+                if distances is not None:
+                    beam_engine.superpose_distances(
+                        distances[elements], k, w, phase + shift, out, workers=self._workers
+                    )
+                else:
+                    beam_engine.superpose(
+                        x_axis, y_axis, config.x_positions[elements], config.y_positions[elements],
+                        k, w, phase + shift, out=out, workers=self._workers, backend=config.backend,
+                    )
+            imag *= -1
+            yield real, imag
+
+    def frame(self, t, out=None):
+        """Return ``sum Re(A e^{-jωt})`` at time ``t`` into ``out``."""
+        if out is None:
+            out = np.empty(self.grid.shape)
+        if not self.stored:
+            # Every element at its own ω: w sin(k R + phase - ω t)
+            config = self.config
+            beam_engine.superpose(
+                *self.grid.axes(), config.x_positions, config.y_positions, config.wavenumbers,
+                config.weights, config.phases - self.omegas[self._groups] * t,
+                out=out, workers=self._workers, backend=config.backend,
+            )
+            return out
+        # Re((a + jb)(cos ωt - j sin ωt)) = a cos ωt + b sin ωt, for all groups at once
+        num_groups = len(self.frequencies)
+        self._coefficients[:num_groups] = np.cos(self.omegas * t)
+        self._coefficients[num_groups:] = np.sin(self.omegas * t)
+        np.matmul(
+            self._coefficients,
+            self.amplitudes.reshape(2 * num_groups, -1),
+            out=self._frame.reshape(-1),
+        )
+        out[...] = self._frame
+        return out
+
+    def normalized_frame(self, t, out=None):
+        out = self.frame(t, out)
+        sign = np.sign(out)
+        np.abs(out, out=out)
+        np.log1p(out, out=out)
+        out *= sign
+        out /= self._log_peak
+        return out
+
+    def times(self, num_frames, fps=ANIMATION_FPS, periods_per_second=PERIODS_PER_SECOND):
+        """Simulation times of ``num_frames`` frames played back at ``fps``."""
+        return np.arange(num_frames) / fps * periods_per_second * self.period
+
+
+def export_animation(
+    config,
+    path,
+    num_frames,
+    fps=ANIMATION_FPS,
+    periods_per_second=PERIODS_PER_SECOND,
+    dpi=100,
+    progress=None,
+):
+    """Stream ``num_frames`` animation frames of ``config`` to ``path``; only one frame is in memory.
+
+    ``path`` is either a ``.npy`` file (raw fields, written through a memory map), a
+    video file (needs ffmpeg) or a directory that receives one PNG per frame.
+    ``progress(frames_written, num_frames)`` is called after every frame.
+    """
+    progress = progress or (lambda done, total: None)
+    animation = WaveAnimation(config, coarsen=False)  # Exported at the full resolution
+    times = animation.times(num_frames, fps, periods_per_second)
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".npy":
+        frames = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float64, shape=(num_frames,) + config.grid.shape
+        )
+        for number, t in enumerate(times):
+            animation.frame(t, out=frames[number])
+            progress(number + 1, num_frames)
+        frames.flush()
+        return path
+
+    from matplotlib import animation as mpl_animation
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from plot_renderer import HeatmapPlot
+
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    plot = HeatmapPlot(fig)
+    plot.update(beam_engine.compute_frame(config))  # Sets the extent and antenna markers
+    field = np.empty(config.grid.shape)
+
+    if extension:
+        if not mpl_animation.writers.is_available("ffmpeg"):
+            raise ValueError(f"Writing {extension} videos needs ffmpeg; export to .npy or a directory")
+        writer = mpl_animation.FFMpegWriter(fps=fps)
+        with writer.saving(fig, path, dpi):
+            for number, t in enumerate(times):
+                plot.image.set_data(animation.normalized_frame(t, out=field))
+                writer.grab_frame()
+                progress(number + 1, num_frames)
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    for number, t in enumerate(times):
+        plot.image.set_data(animation.normalized_frame(t, out=field))
+        fig.savefig(os.path.join(path, f"frame_{number:05d}.png"), dpi=dpi)
+        progress(number + 1, num_frames)
+    return path